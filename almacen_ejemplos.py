@@ -0,0 +1,331 @@
+# ==============================================================================
+#           ALMACENAMIENTO DE LOS PDF DE EJEMPLO DE LAS PLANTILLAS
+# ==============================================================================
+#  Cada plantilla puede tener un PDF de ejemplo en el bucket 'ejemplos-plantillas'
+#  de Supabase Storage ('ejemplo_plantilla_<id>.pdf'). La subida:
+#    - lee el archivo recibido por bloques (nunca entero en memoria) hacia un
+#      temporal, con un tamaño máximo configurable (EJEMPLO_PDF_MAX_MB);
+#    - comprueba la firma '%PDF-' de los primeros bytes (la extensión del nombre
+#      no garantiza nada);
+#    - calcula el SHA-256 mientras lee y lo guarda en los metadatos del objeto:
+#      si el PDF es idéntico al que ya está en el bucket, no se vuelve a subir.
+#
+#  Además se mantiene un manifiesto {plantilla_id: {tamano, actualizado}} con los
+#  ejemplos existentes, armado con un solo listado del bucket, guardado en memoria
+#  VIGENCIA_MANIFIESTO segundos, rearmado en segundo plano al vencer y actualizado
+#  en cada subida: la lista de plantillas sabe qué ejemplos existen sin pedir cada
+#  PDF a Storage ni esperar el listado.
+#
+#  El destino es intercambiable: AlmacenSupabase (producción) o AlmacenLocal, un
+#  directorio que imita el bucket para desarrollo y pruebas sin red
+#  (variable ALMACEN_EJEMPLOS_LOCAL=<directorio>).
+# ==============================================================================
+
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from contextlib import nullcontext
+from datetime import datetime, timezone
+
+BUCKET_EJEMPLOS = 'ejemplos-plantillas'
+FIRMA_PDF = b'%PDF-'
+TAMANO_BLOQUE = 64 * 1024
+TAMANO_MAXIMO = int(float(os.environ.get('EJEMPLO_PDF_MAX_MB', '10')) * 1024 * 1024)
+VIGENCIA_MANIFIESTO = 300
+PATRON_NOMBRE = re.compile(r'^ejemplo_plantilla_(\d+)\.pdf$')
+
+ArchivoRecibido = namedtuple('ArchivoRecibido', ['ruta', 'tamano', 'sha256'])
+
+
+class ErrorEjemplo(ValueError):
+    """El archivo recibido no es un PDF válido o supera el tamaño permitido."""
+
+
+def nombre_ejemplo(plantilla_id):
+    return f"ejemplo_plantilla_{plantilla_id}.pdf"
+
+
+def recibir_pdf(flujo, limite=TAMANO_MAXIMO, bloque=TAMANO_BLOQUE):
+    """Copia 'flujo' a un archivo temporal por bloques, validando firma y tamaño.
+
+    Devuelve un ArchivoRecibido; quien llama debe borrar 'ruta' al terminar.
+    """
+    huella = hashlib.sha256()
+    tamano = 0
+    descriptor, ruta = tempfile.mkstemp(suffix='.pdf')
+    try:
+        with os.fdopen(descriptor, 'wb') as destino:
+            while True:
+                parte = flujo.read(bloque)
+                if not parte:
+                    break
+                if tamano == 0 and not parte.startswith(FIRMA_PDF):
+                    raise ErrorEjemplo("El archivo no es un PDF (no empieza con la firma %PDF-).")
+                tamano += len(parte)
+                if tamano > limite:
+                    raise ErrorEjemplo(f"El archivo supera el tamaño máximo de {limite / (1024 * 1024):.0f} MB.")
+                huella.update(parte)
+                destino.write(parte)
+        if tamano == 0:
+            raise ErrorEjemplo("El archivo está vacío.")
+    except BaseException:
+        os.remove(ruta)
+        raise
+    return ArchivoRecibido(ruta, tamano, huella.hexdigest())
+
+
+# ==============================================================================
+#   Destinos de almacenamiento
+# ==============================================================================
+class AlmacenSupabase:
+    """Bucket de Supabase Storage. 'obtener_cliente' devuelve el cliente con la clave de servicio."""
+
+    def __init__(self, obtener_cliente, bucket=BUCKET_EJEMPLOS, medir=None):
+        self._obtener_cliente = obtener_cliente
+        self.bucket = bucket
+        # medir(operacion) -> context manager que cronometra cada llamada a Storage.
+        self._medir = medir or (lambda operacion: nullcontext())
+
+    def _bucket(self):
+        cliente = self._obtener_cliente()
+        if cliente is None:
+            raise RuntimeError("El cliente de Supabase con clave de servicio no está configurado.")
+        return cliente.storage.from_(self.bucket)
+
+    def subir(self, nombre, ruta, metadatos):
+        with open(ruta, 'rb') as archivo, self._medir('subir'):
+            # El cliente envía el archivo abierto como multipart sin leerlo entero.
+            self._bucket().upload(
+                path=nombre,
+                file=archivo,
+                file_options={"content-type": "application/pdf", "upsert": "true", "metadata": metadatos},
+            )
+
+    def metadatos(self, nombre):
+        """Metadatos propios del objeto, o None si no existe."""
+        try:
+            with self._medir('info'):
+                info = self._bucket().info(nombre)
+        except Exception:
+            return None
+        return info.get('metadata') or {}
+
+    def listar(self, tamano_pagina=1000):
+        """(nombre, tamano, actualizado ISO) de cada objeto del bucket, por páginas de 'tamano_pagina'."""
+        bucket = self._bucket()
+        desde = 0
+        while True:
+            with self._medir('listar'):
+                pagina = bucket.list(options={"limit": tamano_pagina, "offset": desde,
+                                              "sortBy": {"column": "name", "order": "asc"}})
+            for objeto in pagina:
+                sistema = objeto.get('metadata') or {}
+                yield objeto['name'], sistema.get('size'), objeto.get('updated_at') or sistema.get('lastModified')
+            if len(pagina) < tamano_pagina:
+                break
+            desde += tamano_pagina
+
+
+class AlmacenLocal:
+    """Directorio que imita el bucket: el PDF y, al lado, sus metadatos en '<nombre>.json'."""
+
+    def __init__(self, directorio):
+        self.directorio = directorio
+        os.makedirs(directorio, exist_ok=True)
+        self.subidas = 0
+
+    def subir(self, nombre, ruta, metadatos):
+        destino = os.path.join(self.directorio, nombre)
+        with open(ruta, 'rb') as origen, open(destino + '.tmp', 'wb') as copia:
+            while True:
+                parte = origen.read(TAMANO_BLOQUE)
+                if not parte:
+                    break
+                copia.write(parte)
+        os.replace(destino + '.tmp', destino)
+        with open(destino + '.json', 'w', encoding='utf-8') as f:
+            json.dump(metadatos, f)
+        self.subidas += 1
+
+    def metadatos(self, nombre):
+        try:
+            with open(os.path.join(self.directorio, nombre + '.json'), encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def listar(self):
+        with os.scandir(self.directorio) as entradas:
+            for entrada in entradas:
+                if entrada.name.endswith('.pdf'):
+                    estado = entrada.stat()
+                    yield entrada.name, estado.st_size, _iso(estado.st_mtime)
+
+
+def _iso(marca):
+    return datetime.fromtimestamp(marca, timezone.utc).isoformat()
+
+
+# ==============================================================================
+#   Subida con deduplicación por contenido
+# ==============================================================================
+class GestorEjemplos:
+    """Guarda el PDF de ejemplo de una plantilla si su contenido cambió."""
+
+    def __init__(self, almacen, limite=TAMANO_MAXIMO):
+        self.almacen = almacen
+        self.limite = limite
+        self._huellas = {}
+        self._lock = threading.Lock()
+        self._manifiesto = None
+        self._manifiesto_en = None
+        self._subidas = {}              # plantilla_id -> (entrada, momento): para no perderlas al rearmar
+        self._hilo_manifiesto = None
+
+    def huella(self, plantilla_id):
+        """SHA-256 del ejemplo que está hoy en el almacén (según los metadatos del objeto)."""
+        metadatos = self.almacen.metadatos(nombre_ejemplo(plantilla_id)) or {}
+        huella = metadatos.get('sha256')
+        with self._lock:
+            self._huellas[plantilla_id] = huella
+        return huella
+
+    def _hace_falta_subir(self, plantilla_id, sha256):
+        # La huella en memoria solo sirve para confirmar que hay que subir: otro
+        # worker pudo haber subido otra versión después, así que para omitir una
+        # subida siempre se consulta el almacén.
+        with self._lock:
+            en_memoria = self._huellas.get(plantilla_id)
+        if en_memoria is not None and en_memoria != sha256:
+            return True
+        return self.huella(plantilla_id) != sha256
+
+    def guardar(self, plantilla_id, flujo):
+        """Devuelve {'subido', 'tamano', 'sha256'}; 'subido' es False si el PDF ya estaba igual."""
+        recibido = recibir_pdf(flujo, self.limite)
+        try:
+            subido = self._hace_falta_subir(plantilla_id, recibido.sha256)
+            if subido:
+                self.almacen.subir(nombre_ejemplo(plantilla_id), recibido.ruta,
+                                   {"sha256": recibido.sha256, "tamano": str(recibido.tamano)})
+                with self._lock:
+                    self._huellas[plantilla_id] = recibido.sha256
+                    entrada = {"tamano": recibido.tamano, "actualizado": _iso(time.time())}
+                    self._subidas[plantilla_id] = (entrada, time.monotonic())
+                    if self._manifiesto is not None:
+                        self._manifiesto[plantilla_id] = entrada
+        finally:
+            os.remove(recibido.ruta)
+        return {"subido": subido, "tamano": recibido.tamano, "sha256": recibido.sha256}
+
+    def manifiesto(self, vigencia=VIGENCIA_MANIFIESTO, esperar=False):
+        """{plantilla_id: {'tamano', 'actualizado'}} de los ejemplos existentes.
+
+        Se arma con un listado del bucket y se reutiliza 'vigencia' segundos (entre
+        workers no hay aviso de subidas). Vencido, se rearma en un hilo aparte y
+        mientras tanto se devuelve el último conocido (None si todavía no hay
+        ninguno): la lista de plantillas no espera al listado de Storage. Con
+        'esperar' (calentamiento) se rearma en el momento.
+        """
+        if self._manifiesto is not None and time.monotonic() - self._manifiesto_en < vigencia:
+            return self._manifiesto
+        if esperar:
+            return self._actualizar_manifiesto()
+        self._actualizar_en_segundo_plano()
+        return self._manifiesto
+
+    def _actualizar_en_segundo_plano(self):
+        with self._lock:
+            if self._hilo_manifiesto is not None and self._hilo_manifiesto.is_alive():
+                return
+            self._hilo_manifiesto = threading.Thread(target=self._actualizar_manifiesto, daemon=True,
+                                                     name='manifiesto-ejemplos')
+            self._hilo_manifiesto.start()
+
+    def _actualizar_manifiesto(self):
+        """Lista el bucket y reemplaza el manifiesto. Si el listado falla, deja el anterior."""
+        inicio = time.monotonic()
+        try:
+            nuevo = {}
+            for nombre, tamano, actualizado in self.almacen.listar():
+                coincidencia = PATRON_NOMBRE.match(nombre)
+                if coincidencia:
+                    nuevo[int(coincidencia.group(1))] = {"tamano": tamano, "actualizado": actualizado}
+        except Exception as e:
+            print(f"ERROR: No se pudo listar el bucket de ejemplos: {e}")
+            return self._manifiesto
+        with self._lock:
+            # Las subidas hechas mientras se listaba pueden no estar en el listado.
+            for plantilla_id, (entrada, momento) in self._subidas.items():
+                if momento >= inicio:
+                    nuevo[plantilla_id] = entrada
+            self._subidas.clear()
+            self._manifiesto, self._manifiesto_en = nuevo, time.monotonic()
+        return nuevo
+
+if __name__ == '__main__':
+    # Comprobación contra el almacén local (sin red).
+    import io
+    import time
+
+    with tempfile.TemporaryDirectory() as directorio:
+        almacen = AlmacenLocal(directorio)
+        gestor = GestorEjemplos(almacen, limite=2 * 1024 * 1024)
+        pdf = FIRMA_PDF + b'1.7\n' + os.urandom(1024 * 1024)
+
+        inicio = time.perf_counter()
+        primero = gestor.guardar(7, io.BytesIO(pdf))
+        t_subida = time.perf_counter() - inicio
+        assert primero['subido'] and almacen.subidas == 1
+
+        # Un proceso nuevo (sin huellas en memoria) lee la huella de los metadatos.
+        gestor = GestorEjemplos(almacen, limite=2 * 1024 * 1024)
+        inicio = time.perf_counter()
+        repetido = gestor.guardar(7, io.BytesIO(pdf))
+        t_repetido = time.perf_counter() - inicio
+        assert not repetido['subido'] and almacen.subidas == 1
+
+        assert gestor.guardar(7, io.BytesIO(pdf + b'%%EOF'))['subido'] and almacen.subidas == 2
+
+        # Dos workers: A sube v1, B sube v2 y A vuelve a recibir v1. A no puede
+        # fiarse de su memoria (v1): el almacén tiene v2, así que debe subir.
+        worker_a, worker_b = GestorEjemplos(almacen), GestorEjemplos(almacen)
+        v1, v2 = pdf + b'%v1', pdf + b'%v2'
+        worker_a.guardar(7, io.BytesIO(v1))
+        worker_b.guardar(7, io.BytesIO(v2))
+        assert worker_a.guardar(7, io.BytesIO(v1))['subido'], "Se omitió una subida con la huella de otro worker"
+        assert worker_a.guardar(7, io.BytesIO(pdf + b'%%EOF'))['subido'] and almacen.subidas == 6
+        with open(os.path.join(directorio, nombre_ejemplo(7)), 'rb') as f:
+            assert f.read() == pdf + b'%%EOF'
+
+        for contenido, motivo in ((b'<html>no es pdf</html>', 'firma'),
+                                  (FIRMA_PDF + bytes(3 * 1024 * 1024), 'tamaño'),
+                                  (b'', 'vacío')):
+            try:
+                gestor.guardar(8, io.BytesIO(contenido))
+                raise AssertionError(f"Se aceptó un archivo inválido ({motivo}).")
+            except ErrorEjemplo as e:
+                print(f"Rechazado ({motivo}): {e}")
+        assert almacen.subidas == 6 and almacen.metadatos(nombre_ejemplo(8)) is None
+
+        # El manifiesto sale del listado y se actualiza con cada subida.
+        assert list(gestor.manifiesto(esperar=True)) == [7]
+        gestor.guardar(9, io.BytesIO(pdf))
+        assert sorted(gestor.manifiesto()) == [7, 9] and gestor.manifiesto()[9]['tamano'] == len(pdf)
+
+        # Sin esperar: la petición no lista el bucket; recibe el último conocido
+        # (None la primera vez) y el listado corre en segundo plano.
+        otro = GestorEjemplos(almacen)
+        assert otro.manifiesto() is None
+        otro._hilo_manifiesto.join()
+        assert sorted(otro.manifiesto()) == [7, 9]
+        assert otro.manifiesto(vigencia=0) is otro._manifiesto  # vencido: se sirve el anterior
+        otro._hilo_manifiesto.join()
+
+        print(f"Subida de 1 MiB: {t_subida * 1000:.1f} ms; repetida (sin transferencia): {t_repetido * 1000:.1f} ms")
+        print("OK")
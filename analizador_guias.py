@@ -0,0 +1,422 @@
+# ==============================================================================
+#           MOTOR DEL ANALIZADOR DE GUÍAS DE PRÁCTICA CLÍNICA
+# ==============================================================================
+#  Recorre el texto de una guía UNA SOLA VEZ y, en ese mismo recorrido:
+#    - detecta todos los códigos CIE-10 y los valida contra el catálogo,
+#    - detecta los nombres de medicamentos, insumos y procedimientos del
+#      catálogo con un autómata Aho-Corasick sobre palabras (tiempo lineal).
+#  Luego divide la guía en secciones por sus encabezados y arma un borrador con
+#  el mismo esquema que 'conocimiento_clinico.json'.
+# ==============================================================================
+
+import re
+import time
+from bisect import bisect_right
+from collections import Counter, deque
+from datetime import date
+
+from texto_clinico import PALABRAS_VACIAS, PATRON_PALABRA, quitar_tildes, tokenizar
+
+TIPO_ITEM = 'item'
+TIPO_PROCEDIMIENTO = 'procedimiento'
+
+# Forma de un código CIE-10: letra + 2 dígitos + subcategoría opcional (E11, E119, E11.9).
+PATRON_CIE10 = re.compile(r'[A-Z][0-9]{2}(?:\.?[0-9]{1,2})?')
+
+PATRON_NOMBRE_GUIA = re.compile(
+    r'Gu[ií]a\s+(?:T[ée]cnica\s*:?\s*)?(?:de\s+)?Pr[áa]ctica\s+Cl[íi]nica\s+(?:para|de|del|en|sobre)\s+[^\n.;]{5,160}',
+    re.IGNORECASE
+)
+
+# Encabezados numerados en mayúsculas ("4. TRATAMIENTO", "6.2 MANEJO FARMACOLOGICO")
+# o líneas completas con un título conocido en mayúsculas.
+PATRON_ENCABEZADO = re.compile(
+    r'(?:(?<![\w.,])(?:[IVX]{1,4}|\d{1,2}(?:\.\d{1,2}){0,2})\.?[ \t]+'
+    r'(?P<titulo>[A-ZÑ][A-ZÑ]{2,}(?:[ \t,/()-]+[A-ZÑ]{2,}){0,10}))'
+    r'|(?:^[ \t]*(?P<titulo_linea>(?:DEFINICION|ETIOLOGIA|EPIDEMIOLOGIA|FISIOPATOLOGIA|FACTORES DE RIESGO|'
+    r'CUADRO CLINICO|DIAGNOSTICO|EXAMENES AUXILIARES|TRATAMIENTO|MANEJO|COMPLICACIONES|PREVENCION|'
+    r'CRITERIOS DE REFERENCIA|CRITERIOS DE ALTA|PRONOSTICO|SEGUIMIENTO|RECOMENDACIONES)[A-ZÑ ,/()-]{0,60})[ \t]*$)',
+    re.MULTILINE
+)
+
+# Un título que se repite en muchas páginas es una cabecera de página, no una sección.
+MAX_REPETICIONES_ENCABEZADO = 3
+LIMITE_CONTENIDO = 1200
+LIMITE_RECOMENDACION = 400
+
+
+class AutomataPalabras:
+    """Autómata Aho-Corasick cuyo alfabeto son palabras en lugar de caracteres.
+
+    Trabajar por palabras respeta los límites de palabra (no encuentra "SAL"
+    dentro de "SALUD") y mantiene el autómata pequeño aunque el catálogo tenga
+    decenas de miles de nombres.
+    """
+
+    def __init__(self):
+        self._transiciones = [{}]
+        self._fallo = [0]
+        self._salidas = [[]]
+
+    def agregar(self, palabras, valor):
+        estado = 0
+        for palabra in palabras:
+            siguiente = self._transiciones[estado].get(palabra)
+            if siguiente is None:
+                siguiente = len(self._transiciones)
+                self._transiciones[estado][palabra] = siguiente
+                self._transiciones.append({})
+                self._fallo.append(0)
+                self._salidas.append([])
+            estado = siguiente
+        self._salidas[estado].append(valor)
+
+    def construir(self):
+        """Calcula los enlaces de fallo (recorrido en anchura) y hereda salidas."""
+        cola = deque(self._transiciones[0].values())
+        while cola:
+            estado = cola.popleft()
+            for palabra, siguiente in self._transiciones[estado].items():
+                fallo = self._fallo[estado]
+                while fallo and palabra not in self._transiciones[fallo]:
+                    fallo = self._fallo[fallo]
+                destino = self._transiciones[fallo].get(palabra, 0)
+                self._fallo[siguiente] = destino if destino != siguiente else 0
+                self._salidas[siguiente] = self._salidas[siguiente] + self._salidas[self._fallo[siguiente]]
+                cola.append(siguiente)
+        # La salida más larga primero, para quedarnos con el nombre más específico.
+        for salidas in self._salidas:
+            salidas.sort(key=lambda valor: -valor[3])
+
+    def avanzar(self, estado, palabra):
+        transiciones = self._transiciones
+        while estado and palabra not in transiciones[estado]:
+            estado = self._fallo[estado]
+        return transiciones[estado].get(palabra, 0)
+
+    def salidas(self, estado):
+        return self._salidas[estado]
+
+    def __len__(self):
+        return len(self._transiciones)
+
+
+def _palabras_de_nombre(nombre):
+    """Palabras con las que se reconocerá un nombre del catálogo (o None si es ambiguo)."""
+    palabras = tokenizar(nombre)
+    if not palabras:
+        return None
+    if all(p in PALABRAS_VACIAS or p.isdigit() for p in palabras):
+        return None
+    if len(palabras) == 1 and len(palabras[0]) < 4:
+        return None
+    return palabras
+
+
+def _nombre_generico(descripcion):
+    """'PARACETAMOL 500 mg TAB' -> 'PARACETAMOL' (las palabras antes de la concentración)."""
+    palabras = []
+    for palabra in descripcion.split():
+        if any(c.isdigit() for c in palabra):
+            break
+        palabras.append(palabra)
+    return ' '.join(palabras)
+
+
+def _codigo_normalizado(codigo):
+    return str(codigo or '').replace('.', '').strip().upper()
+
+
+def _plegar_caracter(caracter):
+    """(sin tildes, en mayúsculas) de un carácter, siempre de un solo carácter.
+
+    'quitar_tildes' y 'upper' pueden cambiar la longitud ('ß' -> 'SS'); en ese
+    caso se deja el carácter como estaba para que las posiciones sigan alineadas.
+    """
+    base = quitar_tildes(caracter)
+    if len(base) != 1:
+        base = caracter
+    mayuscula = base.upper()
+    return base, mayuscula if len(mayuscula) == 1 else base
+
+
+def plegar(texto):
+    """(sin_tildes, normalizado) con la misma longitud que 'texto', carácter a carácter."""
+    sin_tildes, normalizado = {}, {}
+    for caracter in set(texto):
+        base, mayuscula = _plegar_caracter(caracter)
+        sin_tildes[ord(caracter)] = base
+        normalizado[ord(caracter)] = mayuscula
+    return texto.translate(sin_tildes), texto.translate(normalizado)
+
+
+def _recortar(texto, limite):
+    texto = ' '.join(texto.split())
+    if len(texto) <= limite:
+        return texto
+    corte = texto.rfind('. ', 0, limite)
+    if corte < limite // 2:
+        return texto[:limite].rstrip() + '...'
+    return texto[:corte + 1]
+
+
+class AnalizadorGuias:
+    """Analizador compilado a partir de los catálogos en memoria.
+
+    - codigos_cie10: iterable de códigos CIE-10 válidos ("E119", "E11.9", ...).
+    - items: iterable de (codigo, descripcion) de medicamentos e insumos.
+    - procedimientos: iterable de (codigo, nombre) de procedimientos.
+    """
+
+    def __init__(self, codigos_cie10, items=(), procedimientos=()):
+        self.codigos_cie10 = frozenset(_codigo_normalizado(c) for c in codigos_cie10 if c)
+        self._automata = AutomataPalabras()
+        self.total_nombres = 0
+
+        vistos = set()
+        for codigo, descripcion in items:
+            if not descripcion:
+                continue
+            # Registramos la descripción completa y también el nombre genérico.
+            for nombre in {descripcion.strip(), _nombre_generico(descripcion)}:
+                self._registrar(TIPO_ITEM, nombre, codigo, vistos)
+        for codigo, nombre in procedimientos:
+            if nombre:
+                self._registrar(TIPO_PROCEDIMIENTO, nombre.strip(), codigo, vistos)
+        self._automata.construir()
+
+    def _registrar(self, tipo, nombre, codigo, vistos):
+        palabras = _palabras_de_nombre(nombre)
+        if not palabras:
+            return
+        clave = (tipo, tuple(palabras))
+        if clave in vistos:
+            return
+        vistos.add(clave)
+        self._automata.agregar(palabras, (tipo, nombre, str(codigo) if codigo is not None else None, len(palabras)))
+        self.total_nombres += 1
+
+    # --------------------------------------------------------------------------
+    #   Recorrido único del texto
+    # --------------------------------------------------------------------------
+    def _validar_cie10(self, token):
+        codigo = token.replace('.', '')
+        if codigo in self.codigos_cie10:
+            return codigo
+        # "E11.90" -> "E119": aceptamos el código si su forma de 4 caracteres existe.
+        if len(codigo) > 4 and codigo[:4] in self.codigos_cie10:
+            return codigo[:4]
+        return None
+
+    def escanear(self, normalizado):
+        """Devuelve (hallazgos_cie10, hallazgos_catalogo) en un solo recorrido.
+
+        hallazgos_cie10: lista de (posicion, codigo).
+        hallazgos_catalogo: lista de (inicio, fin, tipo, nombre, codigo).
+        """
+        automata = self._automata
+        hallazgos_cie10 = []
+        hallazgos_catalogo = []
+        inicios = deque(maxlen=64)
+        estado = 0
+
+        for match in PATRON_PALABRA.finditer(normalizado):
+            token = match.group(0)
+            if PATRON_CIE10.fullmatch(token):
+                codigo = self._validar_cie10(token)
+                if codigo:
+                    hallazgos_cie10.append((match.start(), codigo))
+
+            # Guardamos el inicio de las últimas palabras para ubicar nombres de varias palabras.
+            inicios.append(match.start())
+
+            estado = automata.avanzar(estado, token)
+            salidas = automata.salidas(estado)
+            if salidas:
+                tipo, nombre, codigo, largo = salidas[0]
+                inicio = inicios[-largo] if largo <= len(inicios) else inicios[0]
+                hallazgos_catalogo.append((inicio, match.end(), tipo, nombre, codigo))
+
+        return hallazgos_cie10, _sin_solapamientos(hallazgos_catalogo)
+
+    # --------------------------------------------------------------------------
+    #   Segmentación y armado del borrador
+    # --------------------------------------------------------------------------
+    def segmentar(self, sin_tildes):
+        """Lista de (inicio_titulo, inicio_cuerpo, titulo) con los encabezados de la guía."""
+        candidatos = []
+        for match in PATRON_ENCABEZADO.finditer(sin_tildes):
+            titulo = match.group('titulo') or match.group('titulo_linea')
+            titulo = ' '.join(titulo.split())
+            if len(titulo) < 5:
+                continue
+            candidatos.append((match.start(), match.end(), titulo))
+        repeticiones = Counter(titulo for _, _, titulo in candidatos)
+        return [c for c in candidatos if repeticiones[c[2]] <= MAX_REPETICIONES_ENCABEZADO]
+
+    def analizar(self, texto):
+        """Analiza el texto completo y devuelve (borrador, estadisticas)."""
+        inicio_reloj = time.perf_counter()
+        # Plegado carácter a carácter: las posiciones halladas en 'normalizado'
+        # sirven tal cual para recortar 'original'.
+        sin_tildes, normalizado = plegar(texto)
+        original = texto
+
+        hallazgos_cie10, hallazgos_catalogo = self.escanear(normalizado)
+        encabezados = self.segmentar(sin_tildes)
+
+        # --- Diagnóstico principal y referencias: por frecuencia de aparición ---
+        frecuencia = Counter(codigo for _, codigo in hallazgos_cie10)
+        primera_aparicion = {}
+        for posicion, codigo in hallazgos_cie10:
+            primera_aparicion.setdefault(codigo, posicion)
+        ordenados = sorted(frecuencia, key=lambda c: (-frecuencia[c], primera_aparicion[c]))
+        diagnostico = ordenados[0] if ordenados else "No encontrado"
+
+        # --- Secciones ---
+        # El texto antes del primer encabezado (o todo, si no hay) es una sección
+        # propia: sus códigos y nombres no se atribuyen a la primera sección.
+        if not encabezados or encabezados[0][0] > 0:
+            encabezados = [(0, 0, 'Contenido General')] + encabezados
+        limites = [inicio for inicio, _, _ in encabezados]
+        secciones = []
+        for indice, (inicio, inicio_cuerpo, titulo) in enumerate(encabezados):
+            fin = limites[indice + 1] if indice + 1 < len(limites) else len(original)
+            cuerpo = original[inicio_cuerpo:fin]
+            seccion = {"titulo": _titulo_legible(original[inicio:inicio_cuerpo], titulo)}
+            contenido = _recortar(cuerpo, LIMITE_CONTENIDO)
+            if contenido:
+                seccion["contenido"] = contenido
+            secciones.append(seccion)
+
+        for inicio, fin, tipo, nombre, codigo in hallazgos_catalogo:
+            indice = max(bisect_right(limites, inicio) - 1, 0)
+            seccion = secciones[indice]
+            items = seccion.setdefault("items", [])
+            if any(item["nombre"] == nombre for item in items):
+                continue
+            item = {"nombre": nombre}
+            if codigo:
+                item["codigo_item" if tipo == TIPO_ITEM else "codigo_procedimiento"] = codigo
+            item["recomendacion"] = _recortar(_oracion(original, inicio, fin), LIMITE_RECOMENDACION)
+            items.append(item)
+
+        secciones = [s for s in secciones if s.get("contenido") or s.get("items")]
+
+        match_guia = PATRON_NOMBRE_GUIA.search(texto)
+        nombres_hallados = Counter(nombre for _, _, _, nombre, _ in hallazgos_catalogo)
+        borrador = {
+            "nombre_guia": ' '.join(match_guia.group(0).split()) if match_guia else "Guía sin nombre",
+            "diagnostico_cie10": diagnostico,
+            "referencias_cie10": ordenados[1:],
+            "secciones": secciones,
+            "palabras_clave": [nombre.lower() for nombre, _ in nombres_hallados.most_common(10)],
+            "version_guia": "1.0",
+            "fecha_actualizacion": date.today().isoformat(),
+        }
+        estadisticas = {
+            "caracteres": len(texto),
+            "codigos_cie10_validos": len(hallazgos_cie10),
+            "codigos_cie10_distintos": len(frecuencia),
+            "nombres_catalogo": len(hallazgos_catalogo),
+            "secciones": len(secciones),
+            "segundos": round(time.perf_counter() - inicio_reloj, 4),
+        }
+        return borrador, estadisticas
+
+
+def _sin_solapamientos(hallazgos):
+    """Descarta nombres contenidos dentro de otro nombre más largo ya encontrado."""
+    resultado = []
+    for hallazgo in sorted(hallazgos, key=lambda h: (h[0], -(h[1] - h[0]))):
+        if resultado and hallazgo[1] <= resultado[-1][1]:
+            continue
+        resultado.append(hallazgo)
+    return resultado
+
+
+def _oracion(texto, inicio, fin):
+    """La oración del texto que contiene el rango [inicio, fin)."""
+    desde = max(texto.rfind('. ', 0, inicio), texto.rfind('\n', 0, inicio))
+    hasta_punto = texto.find('. ', fin)
+    hasta = hasta_punto + 1 if hasta_punto != -1 else len(texto)
+    return texto[desde + 1:hasta]
+
+
+def _titulo_legible(fragmento_original, titulo):
+    """Convierte 'TRATAMIENTO FARMACOLOGICO' en 'Tratamiento farmacologico' conservando tildes."""
+    palabras = fragmento_original.split()
+    numerado = palabras and (palabras[0].rstrip('.').replace('.', '').isdigit() or
+                             set(palabras[0].rstrip('.')) <= set('IVX'))
+    limpio = ' '.join(palabras[1:] if numerado else palabras) or titulo
+    return limpio[:1].upper() + limpio[1:].lower()
+
+
+# ==============================================================================
+#           BENCHMARK: guía sintética de 300 páginas
+# ==============================================================================
+#  Uso: python analizador_guias.py
+#  Arma una guía con el texto de 'conocimiento_clinico.json' y mide el análisis
+#  con un catálogo construido a partir de la misma base de conocimiento.
+
+if __name__ == '__main__':
+    import json
+
+    with open('conocimiento_clinico.json', 'r', encoding='utf-8') as f:
+        conocimiento = json.load(f)
+
+    codigos = set()
+    items = []
+    procedimientos = []
+    paginas_base = []
+    for regla in conocimiento:
+        codigos.add(regla['diagnostico_cie10'])
+        codigos.update(regla.get('referencias_cie10', []))
+        for numero, seccion in enumerate(regla['secciones'], 1):
+            bloques = [seccion] + seccion.get('subsecciones', [])
+            texto_seccion = [f"{numero}. {seccion['titulo'].upper()}", seccion.get('contenido', '')]
+            for bloque in bloques:
+                for item in bloque.get('items', []):
+                    if item.get('codigo_procedimiento'):
+                        procedimientos.append((item['codigo_procedimiento'], item['nombre']))
+                    else:
+                        items.append((item.get('codigo_item'), item['nombre']))
+                    texto_seccion.append(f"{item['nombre']}: {item.get('recomendacion', '')}")
+            paginas_base.append(f"Código {regla['diagnostico_cie10']}. " + ' '.join(texto_seccion))
+
+    inicio = time.perf_counter()
+    analizador = AnalizadorGuias(codigos, items, procedimientos)
+    tiempo_construccion = time.perf_counter() - inicio
+
+    # ~3,000 caracteres por página, 300 páginas. Cada página abre un capítulo con
+    # un título distinto ("1.1 CAPITULO AA"): los títulos de sección de las reglas
+    # se repiten entre páginas y se descartan como cabeceras de página.
+    paginas = []
+    indice = 0
+    while len(paginas) < 300:
+        numero = len(paginas)
+        pagina = [f"{numero // 20 + 1}.{numero % 20 + 1} CAPITULO {chr(65 + numero // 26)}{chr(65 + numero % 26)}"]
+        while sum(len(p) for p in pagina) < 3000:
+            pagina.append(paginas_base[indice % len(paginas_base)])
+            indice += 1
+        paginas.append('GUÍA DE PRÁCTICA CLÍNICA\n' + '\n'.join(pagina))
+    texto = 'Guía de Práctica Clínica para el manejo de la Diabetes Mellitus tipo 2\n' + '\n'.join(paginas)
+
+    borrador, estadisticas = analizador.analizar(texto)
+    mb = len(texto.encode('utf-8')) / 1_000_000
+    print(f"Catálogo: {len(analizador.codigos_cie10)} códigos CIE-10, {analizador.total_nombres} nombres "
+          f"({len(analizador._automata)} estados) construido en {tiempo_construccion:.3f}s")
+    print(f"Texto: {len(paginas)} páginas, {mb:.2f} MB")
+    print(f"Análisis: {estadisticas['segundos']:.3f}s ({mb / estadisticas['segundos']:.2f} MB/s)")
+    print(json.dumps(estadisticas, ensure_ascii=False))
+    assert estadisticas['secciones'] >= 300, "El benchmark no está segmentando la guía"
+
+    # Posiciones: 'ß' (-> 'SS' en mayúsculas) antes de un nombre no debe correr el extracto,
+    # y lo que va antes del primer encabezado queda en su propia sección.
+    mini = AnalizadorGuias({'E119'}, [('I001', 'METFORMINA 850 mg TAB')])
+    borrador, _ = mini.analizar("Straße ß E11.9 y metformina al inicio.\n1. TRATAMIENTO\nSe usa metformina. Fin.")
+    preambulo, tratamiento = borrador['secciones']
+    assert preambulo['titulo'] == 'Contenido general', preambulo
+    assert preambulo['items'][0]['recomendacion'].startswith('Straße ß E11.9 y metformina'), preambulo
+    assert tratamiento['titulo'] == 'Tratamiento' and tratamiento['items'][0]['recomendacion'] == 'Se usa metformina.', tratamiento
+    print("OK: extractos alineados con el original y preámbulo como sección propia.")
@@ -0,0 +1,172 @@
+# ==============================================================================
+#           BENCHMARK DE LAS RUTAS MÁS USADAS
+# ==============================================================================
+#  Ejecuta escenarios fijos (login, búsquedas, catálogo CIE-10 completo, PDF de
+#  plantilla, dashboard) contra la aplicación real conectada al entorno local de
+#  'entorno_benchmark.py', con varios hilos concurrentes (un cliente de prueba de
+#  Flask por hilo), y escribe p50/p95/p99 y rendimiento a un JSON comparable
+#  entre ejecuciones:
+#
+#      python benchmark_rutas.py --salida antes.json
+#      python benchmark_rutas.py --salida despues.json --comparar antes.json
+#
+#  Opciones útiles: --hilos, --peticiones (por escenario), --escenarios,
+#  --bd postgresql://... (PostgreSQL local en vez de SQLite), --latencia-supabase-ms.
+# ==============================================================================
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+# Cada escenario: (método, ruta o función(i) -> ruta, datos de formulario, rol de la sesión).
+# Los términos de búsqueda rotan para no medir siempre la misma consulta.
+_TERMINOS_DIAGNOSTICOS = ('diabetes', 'anemia', 'E11', 'hipertension', 'embarazo', 'J06', 'fractura', 'tuberculosis')
+_TERMINOS_ITEMS = ('paracetamol', 'jeringa', 'sulfato', '00123', 'cloruro', 'guante', 'amoxi', 'sonda')
+_TERMINOS_PROCEDIMIENTOS = ('SUERO', '9912', 'GASA', 'PARACETAMOL', 'VENDA', 'CATETER')
+
+ESCENARIOS = {
+    'login_admin': ('POST', lambda i: '/login', lambda i: {
+        'username': 'admin', 'password': 'clave-benchmark', 'fingerprint': 'huella-admin'}, None),
+    'login_usuario': ('POST', lambda i: '/login', lambda i: {
+        'username': f'usuario{1 + i % 199:03d}', 'password': 'clave-benchmark',
+        'fingerprint': f'huella-{i % 199}'}, None),
+    'search_diagnosticos': ('GET', lambda i: f'/api/search_diagnosticos?q={_TERMINOS_DIAGNOSTICOS[i % 8]}', None, 'usuario'),
+    'search_items': ('GET', lambda i: f'/api/search_items?q={_TERMINOS_ITEMS[i % 8]}', None, 'usuario'),
+    'search_procedimientos': ('GET', lambda i: f'/api/search_procedimientos?q={_TERMINOS_PROCEDIMIENTOS[i % 6]}', None, 'usuario'),
+    'get_all_diagnosticos': ('GET', lambda i: '/api/get_all_diagnosticos', None, 'usuario'),
+    'descargar_pdf': ('GET', lambda i: f'/plantilla/{1 + (i * 37) % 3000}/descargar_pdf', None, 'usuario'),
+    'dashboard_data': ('GET', lambda i: '/api/dashboard_data', None, 'administrador'),
+}
+
+# login_* dependen de bcrypt (costo fijo por diseño): por defecto hacen menos peticiones.
+FACTOR_PETICIONES = {'login_admin': 0.1, 'login_usuario': 0.1}
+
+
+def percentil(ordenados, p):
+    if not ordenados:
+        return None
+    posicion = (len(ordenados) - 1) * p / 100
+    bajo = int(posicion)
+    alto = min(bajo + 1, len(ordenados) - 1)
+    return ordenados[bajo] + (ordenados[alto] - ordenados[bajo]) * (posicion - bajo)
+
+
+def _cliente(app, rol):
+    cliente = app.test_client()
+    if rol:
+        with cliente.session_transaction() as sesion:
+            sesion['user_id'] = 1 if rol == 'administrador' else 2
+            sesion['username'] = 'admin' if rol == 'administrador' else 'usuario001'
+            sesion['role'] = rol
+    return cliente
+
+
+def ejecutar_escenario(app, nombre, peticiones, hilos, calentamiento=3):
+    metodo, ruta, datos, rol = ESCENARIOS[nombre]
+    locales = threading.local()
+
+    def una_peticion(i):
+        if not hasattr(locales, 'cliente'):
+            locales.cliente = _cliente(app, rol)
+        inicio = time.perf_counter()
+        respuesta = locales.cliente.open(ruta(i), method=metodo, data=datos(i) if datos else None)
+        respuesta.get_data()
+        duracion = time.perf_counter() - inicio
+        # El login correcto redirige al menú; un error vuelve a /login.
+        correcto = respuesta.status_code < 400 and not (nombre.startswith('login') and
+                                                         respuesta.headers.get('Location', '').endswith('/login'))
+        return duracion, correcto
+
+    for i in range(calentamiento):
+        una_peticion(i)
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=hilos) as ejecutor:
+        resultados = list(ejecutor.map(una_peticion, range(peticiones)))
+    total = time.perf_counter() - inicio
+
+    duraciones = sorted(d * 1000 for d, _ in resultados)
+    errores = sum(1 for _, correcto in resultados if not correcto)
+    return {
+        'peticiones': peticiones,
+        'errores': errores,
+        'p50_ms': round(percentil(duraciones, 50), 3),
+        'p95_ms': round(percentil(duraciones, 95), 3),
+        'p99_ms': round(percentil(duraciones, 99), 3),
+        'media_ms': round(sum(duraciones) / len(duraciones), 3),
+        'max_ms': round(duraciones[-1], 3),
+        'peticiones_por_segundo': round(peticiones / total, 1),
+    }
+
+
+def _commit_actual():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def comparar(actual, anterior):
+    """Imprime la variación de p50/p95/rendimiento respecto de otro reporte."""
+    print(f"\nComparación con {anterior.get('commit')} ({anterior.get('fecha')}):")
+    for nombre, datos in actual['escenarios'].items():
+        previo = anterior.get('escenarios', {}).get(nombre)
+        if not previo:
+            continue
+        variaciones = []
+        for campo in ('p50_ms', 'p95_ms', 'peticiones_por_segundo'):
+            if previo[campo]:
+                variaciones.append(f"{campo} {(datos[campo] - previo[campo]) / previo[campo] * 100:+.1f}%")
+        print(f"  {nombre:<24} " + "  ".join(variaciones))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de las rutas más usadas contra un entorno local.")
+    parser.add_argument('--escenarios', default=','.join(ESCENARIOS))
+    parser.add_argument('--peticiones', type=int, default=300, help="Peticiones por escenario.")
+    parser.add_argument('--hilos', type=int, default=8)
+    parser.add_argument('--bd', default=None, help="URL de BD (por defecto, SQLite temporal).")
+    parser.add_argument('--rondas-bcrypt', type=int, default=12)
+    parser.add_argument('--latencia-supabase-ms', type=float, default=0)
+    parser.add_argument('--salida', default='benchmark_rutas.json')
+    parser.add_argument('--comparar', default=None, help="Reporte JSON anterior para comparar.")
+    args = parser.parse_args()
+
+    from entorno_benchmark import VOLUMENES, preparar_app
+    index, motor, _ = preparar_app(args.bd, args.rondas_bcrypt, args.latencia_supabase_ms)
+    app = index.app
+
+    reporte = {
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'commit': _commit_actual(),
+        'entorno': {'python': platform.python_version(), 'bd': motor.dialect.name, 'cpus': os.cpu_count(),
+                    'hilos': args.hilos, 'rondas_bcrypt': args.rondas_bcrypt,
+                    'latencia_supabase_ms': args.latencia_supabase_ms, 'volumenes': VOLUMENES},
+        'escenarios': {},
+    }
+    for nombre in args.escenarios.split(','):
+        peticiones = max(args.hilos, int(args.peticiones * FACTOR_PETICIONES.get(nombre, 1)))
+        resultado = ejecutar_escenario(app, nombre, peticiones, args.hilos)
+        reporte['escenarios'][nombre] = resultado
+        print(f"{nombre:<24} p50 {resultado['p50_ms']:>9.2f} ms  p95 {resultado['p95_ms']:>9.2f} ms  "
+              f"p99 {resultado['p99_ms']:>9.2f} ms  {resultado['peticiones_por_segundo']:>8.1f} pet/s  "
+              f"errores {resultado['errores']}")
+
+    with open(args.salida, 'w', encoding='utf-8') as f:
+        json.dump(reporte, f, indent=2, ensure_ascii=False)
+    print(f"INFO: Reporte escrito en '{args.salida}'.")
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as f:
+            comparar(reporte, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+# ==============================================================================
+#           RELACIÓN CÓDIGO PRESTACIONAL <-> ACTIVIDADES COMO BITSETS
+# ==============================================================================
+#  RELACION_CODIGO_ACTIVIDADES es un dict de conjuntos de textos (muchos casi
+#  iguales). Aquí se compila a:
+#    - un vocabulario de actividades (cada actividad = un bit);
+#    - un entero por código prestacional con los bits de sus actividades;
+#    - un entero por actividad con los bits de los códigos que la permiten
+#      (para las consultas inversas: "¿qué códigos permiten la 407?").
+#  Intersección, unión y diferencia sobre cualquier número de códigos son
+#  operaciones &, | y & ~ entre enteros de Python.
+# ==============================================================================
+
+from functools import reduce
+
+
+def _bits(mascara):
+    """Posiciones de los bits encendidos de un entero."""
+    posiciones = []
+    while mascara:
+        bajo = mascara & -mascara
+        posiciones.append(bajo.bit_length() - 1)
+        mascara ^= bajo
+    return posiciones
+
+
+class RelacionActividades:
+    """Relación compilada; los códigos y actividades desconocidos producen KeyError."""
+
+    def __init__(self, relacion, descripciones=None):
+        self.descripciones = descripciones or {}
+        self.actividades = sorted({a for actividades in relacion.values() for a in actividades})
+        self.bit_actividad = {a: i for i, a in enumerate(self.actividades)}
+        self.codigos = sorted(relacion)
+        self.bit_codigo = {c: i for i, c in enumerate(self.codigos)}
+
+        self.mascara_codigo = {}
+        mascara_actividad = [0] * len(self.actividades)
+        for codigo, actividades in relacion.items():
+            mascara = 0
+            for actividad in actividades:
+                mascara |= 1 << self.bit_actividad[actividad]
+                mascara_actividad[self.bit_actividad[actividad]] |= 1 << self.bit_codigo[codigo]
+            self.mascara_codigo[codigo] = mascara
+        self.mascara_actividad = dict(zip(self.actividades, mascara_actividad))
+
+    # --------------------------------------------------------------------------
+    #   Conversión entre máscaras y listas
+    # --------------------------------------------------------------------------
+    def mascara(self, codigo):
+        return self.mascara_codigo[codigo]
+
+    def a_actividades(self, mascara):
+        return [self.actividades[i] for i in _bits(mascara)]
+
+    def a_codigos(self, mascara):
+        return [self.codigos[i] for i in _bits(mascara)]
+
+    def describir(self, actividades):
+        return [{'codigo': a, 'descripcion': self.descripciones.get(a, 'Desc no encontrada')} for a in actividades]
+
+    # --------------------------------------------------------------------------
+    #   Álgebra sobre códigos prestacionales
+    # --------------------------------------------------------------------------
+    def interseccion(self, codigos):
+        """Actividades permitidas en TODOS los códigos."""
+        return reduce(lambda a, b: a & b, (self.mascara_codigo[c] for c in codigos))
+
+    def union(self, codigos):
+        """Actividades permitidas en AL MENOS UNO de los códigos."""
+        return reduce(lambda a, b: a | b, (self.mascara_codigo[c] for c in codigos), 0)
+
+    def diferencia(self, codigos):
+        """Actividades del primer código que no permite ninguno de los demás."""
+        primero, *resto = codigos
+        return self.mascara_codigo[primero] & ~self.union(resto)
+
+    # --------------------------------------------------------------------------
+    #   Consultas inversas (actividad -> códigos)
+    # --------------------------------------------------------------------------
+    def codigos_con(self, actividades, todas=True):
+        """Códigos que permiten todas (o alguna, con todas=False) de las actividades."""
+        mascaras = [self.mascara_actividad[a] for a in actividades]
+        if todas:
+            return reduce(lambda a, b: a & b, mascaras)
+        return reduce(lambda a, b: a | b, mascaras, 0)
+
+
+if __name__ == '__main__':
+    # Comparación de memoria y tiempo contra el dict de conjuntos de textos.
+    import sys
+    import time
+    from index import ACTIVIDADES_PREVENTIVAS_MAP, RELACION_CODIGO_ACTIVIDADES
+
+    relacion = RELACION_CODIGO_ACTIVIDADES
+    compilada = RelacionActividades(relacion, ACTIVIDADES_PREVENTIVAS_MAP)
+
+    def tamano(objeto):
+        if isinstance(objeto, dict):
+            return sys.getsizeof(objeto) + sum(tamano(k) + tamano(v) for k, v in objeto.items())
+        if isinstance(objeto, (set, frozenset, list)):
+            return sys.getsizeof(objeto) + sum(tamano(v) for v in objeto)
+        return sys.getsizeof(objeto)
+
+    print(f"{len(compilada.codigos)} códigos, {len(compilada.actividades)} actividades")
+    print(f"Memoria conjuntos de textos: {tamano(relacion) / 1024:.1f} KiB")
+    memoria_bits = sum(tamano(parte) for parte in (compilada.mascara_codigo, compilada.mascara_actividad,
+                                                    compilada.bit_actividad, compilada.bit_codigo))
+    print(f"Memoria bitsets (ambos sentidos + vocabularios): {memoria_bits / 1024:.1f} KiB")
+
+    codigos = ['001', '002', '118']
+    repeticiones = 100_000
+
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        set.intersection(*(relacion[c] for c in codigos))
+    t_conjuntos = time.perf_counter() - inicio
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        compilada.interseccion(codigos)
+    t_bits = time.perf_counter() - inicio
+    print(f"Intersección de 3 códigos: conjuntos {t_conjuntos / repeticiones * 1e6:.2f} µs, bitsets {t_bits / repeticiones * 1e6:.2f} µs")
+
+    inicio = time.perf_counter()
+    for _ in range(repeticiones // 10):
+        [c for c, actividades in relacion.items() if '407' in actividades]
+    t_conjuntos = time.perf_counter() - inicio
+    inicio = time.perf_counter()
+    for _ in range(repeticiones // 10):
+        compilada.codigos_con(['407'])
+    t_bits = time.perf_counter() - inicio
+    print(f"Códigos que permiten la 407: recorrido {t_conjuntos / (repeticiones // 10) * 1e6:.2f} µs, bitsets {t_bits / (repeticiones // 10) * 1e6:.2f} µs")
+    assert sorted(set.intersection(*(relacion[c] for c in codigos))) == compilada.a_actividades(compilada.interseccion(codigos))
@@ -0,0 +1,149 @@
+# ==============================================================================
+#           BÚSQUEDA DE TEXTO COMPLETO (BM25) EN LA BASE DE CONOCIMIENTO
+# ==============================================================================
+#  Índice invertido construido al cargar 'conocimiento_clinico.json' sobre los
+#  títulos de sección, los campos de contenido y el nombre y la recomendación de
+#  cada item. Las palabras se comparan sin tildes y en mayúsculas, y los
+#  resultados se ordenan con BM25.
+# ==============================================================================
+
+import html
+import math
+import re
+from collections import Counter, defaultdict
+
+from texto_clinico import PALABRAS_VACIAS, normalizar_texto, quitar_tildes, tokenizar
+
+# Parámetros clásicos de BM25.
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Las palabras del título de la sección/guía cuentan más que las del cuerpo.
+PESO_TITULO = 2
+
+LARGO_FRAGMENTO = 180
+
+
+class IndiceConocimiento:
+    """Índice invertido con ranking BM25 sobre las guías de práctica clínica.
+
+    Cada documento es un bloque de texto de una guía (el contenido de una
+    sección o un item) junto con la ruta de secciones donde aparece.
+    """
+
+    def __init__(self, conocimiento):
+        self.documentos = []
+        self._postings = defaultdict(list)   # palabra -> [(doc_id, frecuencia)]
+        self._largos = []
+
+        for indice_guia, regla in enumerate(conocimiento):
+            for seccion in regla.get('secciones', []):
+                self._indexar_bloque(indice_guia, regla, [seccion.get('titulo', '')], seccion)
+                for subseccion in seccion.get('subsecciones', []):
+                    ruta = [seccion.get('titulo', ''), subseccion.get('titulo', '')]
+                    self._indexar_bloque(indice_guia, regla, ruta, subseccion)
+
+        total = len(self._largos)
+        self._largo_promedio = (sum(self._largos) / total) if total else 0.0
+        self._idf = {
+            palabra: math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+            for palabra, postings in self._postings.items()
+        }
+
+    def _indexar_bloque(self, indice_guia, regla, ruta, bloque):
+        contenido = bloque.get('contenido') or bloque.get('recomendacion')
+        if contenido:
+            self._agregar(indice_guia, regla, ruta, ruta[-1], contenido)
+        for item in bloque.get('items', []):
+            cuerpo = ' '.join(filter(None, [item.get('recomendacion'), item.get('dosis')]))
+            self._agregar(indice_guia, regla, ruta + [item.get('nombre', '')], item.get('nombre', ''), cuerpo)
+
+    def _agregar(self, indice_guia, regla, ruta, titulo, cuerpo):
+        frecuencias = Counter(tokenizar(cuerpo, quitar_vacias=True))
+        for palabra in tokenizar(' '.join(ruta), quitar_vacias=True):
+            frecuencias[palabra] += PESO_TITULO
+        if not frecuencias:
+            return
+        doc_id = len(self.documentos)
+        self.documentos.append({
+            'guia': indice_guia,
+            'nombre_guia': regla.get('nombre_guia'),
+            'diagnostico_cie10': regla.get('diagnostico_cie10'),
+            'ruta': [r for r in ruta if r],
+            'titulo': titulo,
+            'texto': cuerpo,
+        })
+        self._largos.append(sum(frecuencias.values()))
+        for palabra, frecuencia in frecuencias.items():
+            self._postings[palabra].append((doc_id, frecuencia))
+
+    def buscar(self, consulta, limite=10):
+        """Devuelve los documentos mejor puntuados para la consulta."""
+        palabras = [p for p in dict.fromkeys(tokenizar(consulta)) if p not in PALABRAS_VACIAS]
+        if not palabras:
+            return []
+
+        puntajes = defaultdict(float)
+        for palabra in palabras:
+            postings = self._postings.get(palabra)
+            if not postings:
+                continue
+            idf = self._idf[palabra]
+            for doc_id, frecuencia in postings:
+                normalizacion = BM25_K1 * (1 - BM25_B + BM25_B * self._largos[doc_id] / self._largo_promedio)
+                puntajes[doc_id] += idf * frecuencia * (BM25_K1 + 1) / (frecuencia + normalizacion)
+
+        mejores = sorted(puntajes.items(), key=lambda par: -par[1])[:limite]
+        resultados = []
+        for doc_id, puntaje in mejores:
+            documento = self.documentos[doc_id]
+            resultados.append({
+                'nombre_guia': documento['nombre_guia'],
+                'diagnostico_cie10': documento['diagnostico_cie10'],
+                'ruta': documento['ruta'],
+                'fragmento': resaltar_fragmento(documento['texto'] or documento['titulo'], palabras),
+                'puntaje': round(puntaje, 3),
+            })
+        return resultados
+
+    def __len__(self):
+        return len(self.documentos)
+
+
+def resaltar_fragmento(texto, palabras, largo=LARGO_FRAGMENTO):
+    """Recorta el texto alrededor de la primera coincidencia y la marca con <mark>.
+
+    El resultado es HTML seguro: el texto se escapa antes de insertar las marcas.
+    """
+    texto = ' '.join(texto.split())
+    # quitar_tildes conserva la posición de cada letra, así que las coincidencias
+    # encontradas en la forma normalizada sirven para recortar el original.
+    comparable = normalizar_texto(texto)
+    if len(comparable) != len(texto):
+        texto = quitar_tildes(texto)
+        comparable = texto.upper()
+
+    patron = re.compile(r'\b(?:' + '|'.join(re.escape(p) for p in palabras) + r')\b')
+    coincidencias = list(patron.finditer(comparable))
+
+    inicio = 0
+    if coincidencias and coincidencias[0].start() > largo // 3:
+        inicio = coincidencias[0].start() - largo // 3
+    fin = min(len(texto), inicio + largo)
+
+    partes = []
+    cursor = inicio
+    for match in coincidencias:
+        if match.start() < inicio or match.end() > fin:
+            continue
+        partes.append(html.escape(texto[cursor:match.start()]))
+        partes.append('<mark>' + html.escape(texto[match.start():match.end()]) + '</mark>')
+        cursor = match.end()
+    partes.append(html.escape(texto[cursor:fin]))
+
+    fragmento = ''.join(partes)
+    if inicio > 0:
+        fragmento = '...' + fragmento
+    if fin < len(texto):
+        fragmento += '...'
+    return fragmento
@@ -0,0 +1,245 @@
+# ==============================================================================
+#           BÚSQUEDA DE TEXTO COMPLETO EN LAS PLANTILLAS
+# ==============================================================================
+#  Busca palabras en todos los campos de la plantilla (tipo de atención, código,
+#  descripción, listas de actividades/diagnósticos/items/procedimientos y
+#  observaciones), sin importar tildes ni mayúsculas, ordena por relevancia y
+#  devuelve un fragmento con las coincidencias resaltadas.
+#
+#  PostgreSQL: columna generada 'busqueda' (tsvector) con índice GIN. Usa una
+#  configuración 'es_sin_tildes' (español + unaccent), así que "anemia" encuentra
+#  "anémia" y el fragmento conserva el texto original. Al ser una columna
+#  generada, cada INSERT/UPDATE de 'guardar_plantilla' la mantiene al día.
+#  Pesos: tipo y código (A) > descripción (B) > listas (C) > observaciones (D).
+#
+#  SQLite (entorno de benchmark): tabla FTS5 equivalente mantenida por triggers.
+#
+#  El esquema se crea una vez, de forma idempotente:
+#
+#      python busqueda_plantillas.py --migrar          (usa DATABASE_URL)
+#      python busqueda_plantillas.py                   (benchmark local)
+# ==============================================================================
+
+import html
+import re
+
+from sqlalchemy import text
+
+from texto_clinico import tokenizar
+
+CAMPOS_LISTA = ('actividades_preventivas', 'diagnostico_principal', 'diagnosticos_excluyentes',
+                'diagnosticos_complementarios', 'medicamentos_relacionados', 'insumos_relacionados',
+                'procedimientos_obligatorios', 'procedimientos_excluyentes', 'otros_procedimientos')
+# Columnas de datos de la plantilla (sin la columna de búsqueda).
+COLUMNAS_PLANTILLA = ('id', 'tipo_atencion', 'codigo_prestacional', 'descripcion_prestacional') + CAMPOS_LISTA + ('observaciones',)
+
+LIMITE = 20
+MAXIMO_TERMINOS = 8
+# Marcas del fragmento: caracteres de control que no aparecen en el texto escrito
+# por los usuarios; se reemplazan por <mark> después de escapar el HTML.
+INICIO_MARCA, FIN_MARCA = '\x02', '\x03'
+
+_ETIQUETA = re.compile(r'<[^>]*>|<[^>]*$|^[^<]*>')
+_ESPACIOS = re.compile(r'\s+')
+
+_LISTAS_PG = ' || '.join(CAMPOS_LISTA)
+_LISTAS_PG_P = ' || '.join(f'p.{c}' for c in CAMPOS_LISTA)
+_DDL_POSTGRES = [
+    "CREATE EXTENSION IF NOT EXISTS unaccent",
+    """DO $$ BEGIN
+        IF NOT EXISTS (SELECT 1 FROM pg_ts_config WHERE cfgname = 'es_sin_tildes') THEN
+            CREATE TEXT SEARCH CONFIGURATION public.es_sin_tildes (COPY = pg_catalog.spanish);
+            ALTER TEXT SEARCH CONFIGURATION public.es_sin_tildes
+                ALTER MAPPING FOR hword, hword_part, word WITH unaccent, spanish_stem;
+        END IF;
+    END $$""",
+    # array_to_string no es IMMUTABLE; una columna generada solo admite funciones inmutables.
+    """CREATE OR REPLACE FUNCTION public.plantilla_listas_texto(text[]) RETURNS text
+        LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$ SELECT coalesce(array_to_string($1, ' '), '') $$""",
+    f"""ALTER TABLE plantillas ADD COLUMN IF NOT EXISTS busqueda tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('public.es_sin_tildes', coalesce(tipo_atencion, '') || ' ' || coalesce(codigo_prestacional, '')), 'A') ||
+        setweight(to_tsvector('public.es_sin_tildes', coalesce(descripcion_prestacional, '')), 'B') ||
+        setweight(to_tsvector('public.es_sin_tildes', public.plantilla_listas_texto({_LISTAS_PG})), 'C') ||
+        setweight(to_tsvector('public.es_sin_tildes', coalesce(observaciones, '')), 'D')
+    ) STORED""",
+    "CREATE INDEX IF NOT EXISTS plantillas_busqueda_gin ON plantillas USING GIN (busqueda)",
+    "ANALYZE plantillas",
+]
+
+_SQL_POSTGRES = text(f"""
+    WITH q AS (SELECT to_tsquery('public.es_sin_tildes', :consulta) AS consulta),
+    mejores AS (
+        SELECT p.id, p.tipo_atencion, p.codigo_prestacional, p.descripcion_prestacional, p.observaciones,
+               public.plantilla_listas_texto({_LISTAS_PG_P}) AS listas,
+               ts_rank_cd(p.busqueda, q.consulta) AS rango,
+               count(*) OVER () AS total
+        FROM plantillas p, q
+        WHERE p.busqueda @@ q.consulta
+        ORDER BY rango DESC, p.id
+        LIMIT :limite
+    )
+    SELECT m.id, m.tipo_atencion, m.codigo_prestacional, m.descripcion_prestacional, m.rango, m.total,
+           ts_headline('public.es_sin_tildes',
+                       concat_ws(' · ', m.descripcion_prestacional, m.listas,
+                                 regexp_replace(m.observaciones, '<[^>]*>', ' ', 'g')),
+                       q.consulta, :opciones) AS fragmento
+    FROM mejores m, q
+    ORDER BY m.rango DESC, m.id
+""")
+_OPCIONES_FRAGMENTO = (f"StartSel={INICIO_MARCA}, StopSel={FIN_MARCA}, MaxWords=25, MinWords=8, "
+                       "MaxFragments=2, FragmentDelimiter=\" … \"")
+
+
+def _columnas_fts(fila):
+    # En SQLite las listas se guardan como JSON: se concatena su texto sin corchetes ni comillas.
+    listas = " || ' ' || ".join(
+        f"""replace(replace(replace(replace(coalesce({fila}.{c}, ''), '[', ''), ']', ''), '", "', ' · '), '"', '')"""
+        for c in CAMPOS_LISTA)
+    return (f"{fila}.id, {fila}.tipo_atencion, {fila}.codigo_prestacional, "
+            f"{fila}.descripcion_prestacional, {listas}, {fila}.observaciones")
+
+
+_COLUMNAS_FTS = "plantillas_fts (rowid, tipo_atencion, codigo_prestacional, descripcion_prestacional, listas, observaciones)"
+_DDL_SQLITE = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS plantillas_fts USING fts5(
+        tipo_atencion, codigo_prestacional, descripcion_prestacional, listas, observaciones,
+        tokenize = 'unicode61 remove_diacritics 2')""",
+    f"""CREATE TRIGGER IF NOT EXISTS plantillas_fts_insertar AFTER INSERT ON plantillas BEGIN
+        INSERT INTO {_COLUMNAS_FTS} VALUES ({_columnas_fts('new')});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS plantillas_fts_actualizar AFTER UPDATE ON plantillas BEGIN
+        DELETE FROM plantillas_fts WHERE rowid = old.id;
+        INSERT INTO {_COLUMNAS_FTS} VALUES ({_columnas_fts('new')});
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS plantillas_fts_eliminar AFTER DELETE ON plantillas BEGIN
+        DELETE FROM plantillas_fts WHERE rowid = old.id;
+    END""",
+    "DELETE FROM plantillas_fts",
+    f"INSERT INTO {_COLUMNAS_FTS} SELECT {_columnas_fts('p')} FROM plantillas p",
+]
+_SQL_SQLITE = text(f"""
+    SELECT p.id, p.tipo_atencion, p.codigo_prestacional, p.descripcion_prestacional,
+           -bm25(plantillas_fts, 10.0, 10.0, 4.0, 2.0, 1.0) AS rango,
+           snippet(plantillas_fts, -1, char(2), char(3), ' … ', 20) AS fragmento,
+           (SELECT count(*) FROM plantillas_fts WHERE plantillas_fts MATCH :consulta) AS total
+    FROM plantillas_fts JOIN plantillas p ON p.id = plantillas_fts.rowid
+    WHERE plantillas_fts MATCH :consulta
+    ORDER BY rango DESC, p.id
+    LIMIT :limite
+""")
+
+
+def migrar(motor):
+    """Crea (si no existen) la columna/tabla de búsqueda, su índice y su mantenimiento."""
+    sentencias = _DDL_POSTGRES if motor.dialect.name == 'postgresql' else _DDL_SQLITE
+    with motor.begin() as conexion:
+        for sentencia in sentencias:
+            conexion.exec_driver_sql(sentencia)
+    print(f"INFO: Búsqueda de texto completo de plantillas lista ({motor.dialect.name}).")
+
+
+def consulta_texto(texto, dialecto):
+    """Texto del usuario -> consulta de prefijos con todas las palabras (None si no hay palabras).
+
+    Solo pasan letras y dígitos (ya sin tildes), así que la sintaxis de tsquery/FTS5
+    no puede inyectarse desde la caja de búsqueda.
+    """
+    terminos = [t.lower() for t in tokenizar(texto, quitar_vacias=True)][:MAXIMO_TERMINOS]
+    if not terminos:
+        return None
+    if dialecto == 'postgresql':
+        return ' & '.join(f"{t}:*" for t in terminos)
+    return ' '.join(f'"{t}"*' for t in terminos)
+
+
+def marcar_fragmento(fragmento):
+    """Fragmento con marcas de control -> HTML seguro con <mark>."""
+    limpio = _ESPACIOS.sub(' ', _ETIQUETA.sub(' ', fragmento or '')).strip()
+    return html.escape(limpio).replace(INICIO_MARCA, '<mark>').replace(FIN_MARCA, '</mark>')
+
+
+def buscar(conexion, texto, limite=LIMITE):
+    """Plantillas que contienen todas las palabras, de la más a la menos relevante."""
+    dialecto = conexion.dialect.name
+    consulta = consulta_texto(texto, dialecto)
+    if consulta is None:
+        return {'resultados': [], 'total': 0}
+    if dialecto == 'postgresql':
+        filas = conexion.execute(_SQL_POSTGRES, {'consulta': consulta, 'limite': limite,
+                                                 'opciones': _OPCIONES_FRAGMENTO})
+    else:
+        filas = conexion.execute(_SQL_SQLITE, {'consulta': consulta, 'limite': limite})
+    resultados, total = [], 0
+    for fila in filas:
+        total = fila.total
+        resultados.append({
+            'id': fila.id,
+            'tipo_atencion': fila.tipo_atencion,
+            'codigo_prestacional': fila.codigo_prestacional,
+            'descripcion_prestacional': fila.descripcion_prestacional,
+            'rango': round(float(fila.rango), 4),
+            'fragmento': marcar_fragmento(fila.fragmento),
+        })
+    return {'resultados': resultados, 'total': total}
+
+
+if __name__ == '__main__':
+    import argparse
+    import os
+    import time
+
+    parser = argparse.ArgumentParser(description="Búsqueda de texto completo en plantillas.")
+    parser.add_argument('--migrar', action='store_true', help="Aplica el esquema en DATABASE_URL y termina.")
+    parser.add_argument('--plantillas', type=int, default=5000, help="Plantillas del benchmark local.")
+    args = parser.parse_args()
+
+    if args.migrar:
+        from dotenv import load_dotenv
+        from sqlalchemy import create_engine
+        load_dotenv()
+        migrar(create_engine(os.environ['DATABASE_URL']))
+        raise SystemExit(0)
+
+    # Benchmark: índice de texto completo contra un ILIKE sobre todas las columnas
+    # (lo único posible sin índice), y mantenimiento a través de /guardar_plantilla.
+    from entorno_benchmark import VOLUMENES, preparar_app
+    VOLUMENES['plantillas'] = args.plantillas
+    index, motor, _ = preparar_app(rondas_bcrypt=4)
+
+    columnas_texto = ('tipo_atencion', 'codigo_prestacional', 'descripcion_prestacional', 'observaciones') + CAMPOS_LISTA
+    condicion = ' AND '.join(
+        '(' + ' OR '.join(f"CAST({c} AS TEXT) ILIKE :t{i}" for c in columnas_texto) + ')' for i in range(3))
+    terminos = ('control crecimiento', 'E11', 'paracetamol tab', 'hemoglobina', 'gestante prenatal', 'sulfato')
+
+    def medir(funcion, repeticiones=20):
+        inicio = time.perf_counter()
+        for _ in range(repeticiones):
+            resultado = funcion()
+        return (time.perf_counter() - inicio) / repeticiones * 1000, resultado
+
+    print(f"{args.plantillas} plantillas ({motor.dialect.name})")
+    with motor.connect() as conexion:
+        for termino in terminos:
+            palabras = termino.split()
+            t_fts, resultado = medir(lambda: buscar(conexion, termino))
+            parametros = {f't{i}': f'%{palabras[min(i, len(palabras) - 1)]}%' for i in range(3)}
+            # Para ordenar por relevancia, el ILIKE tendría que traer todas las coincidencias.
+            t_ilike, filas = medir(lambda: conexion.execute(
+                text(f"SELECT id FROM plantillas WHERE {condicion}"), parametros).fetchall())
+            print(f"  {termino:<20} texto completo {t_fts:7.2f} ms ({resultado['total']} coincidencias)"
+                  f"   ILIKE en todas las columnas {t_ilike:7.2f} ms ({len(filas)} coincidencias)")
+
+    cliente = index.app.test_client()
+    with cliente.session_transaction() as sesion:
+        sesion['username'], sesion['role'] = 'admin', 'administrador'
+    nueva = {'tipo_atencion': 'Consejería nutricional', 'codigo_prestacional': '99403',
+             'observaciones': '<p>Evaluar <b>anémia</b> ferropénica y xerodermia.</p>'}
+    creada = cliente.post('/guardar_plantilla', json=nueva)
+    assert creada.status_code == 201, creada.json
+    encontrada = cliente.get('/api/buscar_plantillas?q=xerodermia anemia').json
+    print(f"  tras guardar: {encontrada['resultados'][0]['fragmento']}")
+    assert encontrada['total'] == 1
+    plantilla_id = encontrada['resultados'][0]['id']
+    cliente.post('/guardar_plantilla', json=dict(nueva, plantilla_id=plantilla_id, observaciones='Sin hallazgos.'))
+    assert cliente.get('/api/buscar_plantillas?q=xerodermia').json['total'] == 0
+    print("OK: búsqueda mantenida al crear y al editar plantillas.")
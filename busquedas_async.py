@@ -0,0 +1,334 @@
+# ==============================================================================
+#           MODO ASÍNCRONO (ASGI) PARA LAS APIS DE BÚSQUEDA
+# ==============================================================================
+#  Las búsquedas de autocompletado (diagnósticos, items, procedimientos) solo
+#  esperan E/S. Con workers síncronos cada consulta en curso ocupa un hilo
+#  entero, así que unas pocas respuestas lentas de Supabase bastan para frenar
+#  los logins. Este módulo atiende esas tres rutas desde un event loop:
+#    - PostgreSQL con el driver asíncrono de psycopg 3 (pool propio);
+#    - la API REST de Supabase con httpx.AsyncClient;
+#    - un semáforo por servicio limita la concurrencia; si no hay cupo en
+#      ESPERA_MAXIMA segundos se responde 503 en vez de acumular peticiones.
+#
+#  Es opcional: 'gunicorn index:app' y Vercel siguen igual. Para usarlo:
+#
+#      uvicorn --factory busquedas_async:crear_app --workers 2
+#
+#  'crear_app' monta este sub-app para las tres rutas y entrega el resto a la
+#  aplicación Flask de siempre (a2wsgi). La sesión se lee de la misma cookie
+#  firmada de Flask. Con otra BD que no sea PostgreSQL (p. ej. el SQLite de
+#  'entorno_benchmark.py') la consulta se ejecuta con el motor síncrono en un
+#  hilo, con el mismo límite de concurrencia.
+#
+#  'python busquedas_async.py' compara ambos modos con la misma carga.
+# ==============================================================================
+
+import asyncio
+import json
+import os
+import time
+from http.cookies import SimpleCookie
+from urllib.parse import parse_qs
+
+import consultas
+
+LIMITE_BD = int(os.environ.get('ASYNC_LIMITE_BD', '10'))
+LIMITE_SUPABASE = int(os.environ.get('ASYNC_LIMITE_SUPABASE', '20'))
+ESPERA_MAXIMA = float(os.environ.get('ASYNC_ESPERA_MAXIMA_S', '2'))
+
+# Las consultas son las mismas sentencias de 'consultas.py' que usan las rutas
+# síncronas de index.py; aquí no se repite el SQL.
+COLUMNAS_PROCEDIMIENTOS = 'cod_cpms,nombre_prest,tarifa_sis'
+
+
+class _Ocupado(Exception):
+    """No hubo cupo en el semáforo del servicio dentro de ESPERA_MAXIMA."""
+
+
+def normalizar_busqueda_procedimiento(query):
+    """Mayúsculas y sin tildes ni símbolos, como las columnas ya normalizadas de Supabase."""
+    return ''.join(c for c in query.upper() if c in 'ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789 ')
+
+
+class BusquedasAsync:
+    """Aplicación ASGI con las tres rutas de búsqueda."""
+
+    RUTAS = {
+        '/api/search_diagnosticos': 'search_diagnosticos',
+        '/api/search_items': 'search_items',
+        '/api/search_procedimientos': 'api_search_procedimientos',
+    }
+
+    def __init__(self, app_flask, motor, supabase_url=None, supabase_key=None, transporte_http=None,
+                 limite_bd=LIMITE_BD, limite_supabase=LIMITE_SUPABASE, metricas=None):
+        self._serializador = app_flask.session_interface.get_signing_serializer(app_flask)
+        self._cookie = app_flask.config['SESSION_COOKIE_NAME']
+        self._vigencia = app_flask.permanent_session_lifetime.total_seconds()
+        self._motor = motor
+        self._supabase_url = supabase_url
+        self._supabase_key = supabase_key
+        self._transporte_http = transporte_http
+        self.limite_bd = limite_bd
+        self.limite_supabase = limite_supabase
+        self._semaforo_bd = asyncio.Semaphore(limite_bd)
+        self._semaforo_supabase = asyncio.Semaphore(limite_supabase)
+        self._metricas = metricas
+        self._pool = None
+        self._http = None
+        self._lock_recursos = asyncio.Lock()
+
+    # --------------------------------------------------------------------------
+    #   Protocolo ASGI
+    # --------------------------------------------------------------------------
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._ciclo_de_vida(receive, send)
+            return
+        if scope['type'] != 'http':
+            return
+        endpoint = self.RUTAS.get(scope['path'])
+        if endpoint is None:
+            await self._enviar(send, 404, {'error': 'No encontrado'})
+            return
+
+        inicio = time.perf_counter()
+        estado, cuerpo, segundos_bd = await self._atender(endpoint, scope)
+        await self._enviar(send, estado, cuerpo)
+        if self._metricas is not None:
+            self._metricas.observar_peticion(f'async.{endpoint}', scope['method'], estado,
+                                             time.perf_counter() - inicio,
+                                             1 if segundos_bd else 0, segundos_bd or 0.0)
+
+    async def _ciclo_de_vida(self, receive, send):
+        while True:
+            mensaje = await receive()
+            if mensaje['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif mensaje['type'] == 'lifespan.shutdown':
+                await self.cerrar()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    @staticmethod
+    async def _enviar(send, estado, cuerpo):
+        datos = json.dumps(cuerpo, ensure_ascii=False, default=str).encode('utf-8')
+        await send({'type': 'http.response.start', 'status': estado, 'headers': [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(datos)).encode('ascii')),
+        ]})
+        await send({'type': 'http.response.body', 'body': datos})
+
+    def _sesion(self, scope):
+        """Sesión de Flask leída de su cookie firmada ({} si no hay o no es válida)."""
+        for nombre, valor in scope.get('headers', ()):
+            if nombre == b'cookie':
+                galleta = SimpleCookie(valor.decode('latin-1')).get(self._cookie)
+                if galleta is None:
+                    continue
+                try:
+                    return self._serializador.loads(galleta.value, max_age=self._vigencia)
+                except Exception:
+                    return {}
+        return {}
+
+    # --------------------------------------------------------------------------
+    #   Rutas
+    # --------------------------------------------------------------------------
+    async def _atender(self, endpoint, scope):
+        """Devuelve (estado, cuerpo, segundos en BD)."""
+        if 'username' not in self._sesion(scope):
+            return 401, {'error': 'No autorizado'}, None
+        query = parse_qs(scope.get('query_string', b'').decode('utf-8')).get('q', [''])[0]
+
+        if endpoint == 'api_search_procedimientos':
+            if len(query) < 2:
+                return 200, [], None
+            if not (self._supabase_url and self._supabase_key):
+                return 503, {'error': 'El servidor no pudo conectar con la base de datos de procedimientos.'}, None
+            try:
+                return 200, await self._con_limite(self._semaforo_supabase, self._buscar_procedimientos(query)), None
+            except _Ocupado:
+                return 503, {'error': 'Servidor ocupado, inténtalo de nuevo.'}, None
+            except Exception as e:
+                print(f"Error en la búsqueda de procedimientos (async): {e}")
+                return 500, {'error': 'Error en el servidor al buscar procedimientos.'}, None
+
+        if len(query) < 3:
+            return 200, [], None
+        sentencia = consultas.DIAGNOSTICOS_BUSCAR if endpoint == 'search_diagnosticos' else consultas.ITEMS_BUSCAR
+        inicio = time.perf_counter()
+        try:
+            filas = await self._con_limite(self._semaforo_bd, self._consultar(sentencia, {'query': f'%{query}%'}))
+            return 200, filas, time.perf_counter() - inicio
+        except _Ocupado:
+            return 503, {'error': 'Servidor ocupado, inténtalo de nuevo.'}, None
+        except Exception as e:
+            print(f"Error en búsqueda asíncrona ({endpoint}): {e}")
+            return 500, {'error': 'Error en el servidor'}, None
+
+    @staticmethod
+    async def _con_limite(semaforo, corrutina):
+        try:
+            await asyncio.wait_for(semaforo.acquire(), ESPERA_MAXIMA)
+        except asyncio.TimeoutError:
+            corrutina.close()
+            raise _Ocupado()
+        try:
+            return await corrutina
+        finally:
+            semaforo.release()
+
+    # --------------------------------------------------------------------------
+    #   Base de datos
+    # --------------------------------------------------------------------------
+    async def _consultar(self, sentencia, parametros):
+        if self._motor.dialect.name != 'postgresql':
+            return await asyncio.to_thread(self._consultar_sincrono, sentencia, parametros)
+        pool = await self._obtener_pool()
+        from psycopg.rows import dict_row
+        async with pool.connection() as conexion:
+            async with conexion.cursor(row_factory=dict_row) as cursor:
+                await cursor.execute(sentencia.sql.text.replace(':query', '%(query)s'), parametros)
+                return await cursor.fetchall()
+
+    def _consultar_sincrono(self, sentencia, parametros):
+        with self._motor.connect() as connection:
+            return sentencia.dicts(connection, **parametros)
+
+    async def _obtener_pool(self):
+        if self._pool is None:
+            async with self._lock_recursos:
+                if self._pool is None:
+                    from psycopg_pool import AsyncConnectionPool
+                    url = self._motor.url.set(drivername='postgresql').render_as_string(hide_password=False)
+                    # prepare_threshold=None: psycopg 3 prepara en el servidor las consultas
+                    # repetidas (el autocompletado lo es), y el pooler de Supabase en modo
+                    # transacción (puerto 6543) no admite sentencias preparadas.
+                    pool = AsyncConnectionPool(url, min_size=1, max_size=self.limite_bd, open=False,
+                                               kwargs={'client_encoding': 'utf8', 'prepare_threshold': None})
+                    await pool.open()
+                    self._pool = pool
+                    print(f"INFO: Pool asíncrono de PostgreSQL abierto (máx. {self.limite_bd} conexiones).")
+        return self._pool
+
+    # --------------------------------------------------------------------------
+    #   Supabase (API REST)
+    # --------------------------------------------------------------------------
+    def _cliente_http(self):
+        if self._http is None:
+            import httpx
+            self._http = httpx.AsyncClient(
+                base_url=f"{self._supabase_url.rstrip('/')}/rest/v1",
+                headers={'apikey': self._supabase_key, 'Authorization': f'Bearer {self._supabase_key}'},
+                timeout=10,
+                limits=httpx.Limits(max_connections=self.limite_supabase),
+                transport=self._transporte_http,
+            )
+        return self._http
+
+    async def _buscar_procedimientos(self, query):
+        patron = f'%{normalizar_busqueda_procedimiento(query)}%'
+        parametros = {
+            'select': COLUMNAS_PROCEDIMIENTOS,
+            'or': f'(nombre_prest.ilike.{patron},cod_cpms.ilike.{patron})',
+            'limit': '50',
+        }
+        if self._metricas is None:
+            respuesta = await self._cliente_http().get('/procedimientos', params=parametros)
+        else:
+            with self._metricas.medir_llamada('supabase', 'buscar_procedimientos_async'):
+                respuesta = await self._cliente_http().get('/procedimientos', params=parametros)
+        respuesta.raise_for_status()
+        return respuesta.json()
+
+    async def cerrar(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+
+
+def montar(busquedas, app_flask):
+    """App ASGI completa: las rutas de búsqueda en el event loop, el resto en Flask."""
+    from a2wsgi import WSGIMiddleware
+    resto = WSGIMiddleware(app_flask)
+
+    async def app(scope, receive, send):
+        if scope['type'] == 'lifespan' or (scope['type'] == 'http' and scope['path'] in busquedas.RUTAS):
+            await busquedas(scope, receive, send)
+        else:
+            await resto(scope, receive, send)
+    return app
+
+
+def crear_app():
+    """Fábrica para 'uvicorn --factory busquedas_async:crear_app'."""
+    import index
+    busquedas = BusquedasAsync(index.app, index.engine, os.environ.get('SUPABASE_URL'),
+                               os.environ.get('SUPABASE_ANON_KEY'), metricas=index.METRICAS)
+    return montar(busquedas, index.app)
+
+
+if __name__ == '__main__':
+    # Prueba de carga: las mismas búsquedas con muchos clientes concurrentes,
+    # en modo síncrono (un worker con --hilos hilos, como gunicorn gthread) y en
+    # modo asíncrono (un worker con un solo event loop), con latencia simulada
+    # de Supabase.
+    import argparse
+
+    import httpx
+
+    from benchmark_rutas import ESCENARIOS, ejecutar_escenario, percentil
+    from entorno_benchmark import preparar_app, transporte_supabase_async
+
+    parser = argparse.ArgumentParser(description="Carga concurrente: búsquedas síncronas vs. asíncronas.")
+    parser.add_argument('--peticiones', type=int, default=400)
+    parser.add_argument('--hilos', type=int, default=8, help="Hilos del worker síncrono.")
+    parser.add_argument('--clientes', type=int, default=64, help="Clientes concurrentes del modo asíncrono.")
+    parser.add_argument('--latencia-supabase-ms', type=float, default=50)
+    args = parser.parse_args()
+
+    index, motor, supabase = preparar_app(rondas_bcrypt=4, latencia_supabase_ms=args.latencia_supabase_ms)
+    busquedas = BusquedasAsync(index.app, motor, 'http://supabase.local', 'clave',
+                               transporte_http=transporte_supabase_async(supabase, args.latencia_supabase_ms))
+    galleta = busquedas._serializador.dumps({'user_id': 2, 'username': 'usuario001', 'role': 'usuario'})
+
+    async def carga_async(nombre):
+        metodo, ruta, _, _ = ESCENARIOS[nombre]
+        duraciones, errores = [], 0
+        siguiente = iter(range(args.peticiones))
+
+        async def cliente():
+            nonlocal errores
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=busquedas), base_url='http://local',
+                                         cookies={busquedas._cookie: galleta}) as http:
+                for i in siguiente:
+                    inicio = time.perf_counter()
+                    respuesta = await http.request(metodo, ruta(i))
+                    duraciones.append((time.perf_counter() - inicio) * 1000)
+                    errores += respuesta.status_code >= 400
+
+        inicio = time.perf_counter()
+        await asyncio.gather(*(cliente() for _ in range(args.clientes)))
+        total = time.perf_counter() - inicio
+        duraciones.sort()
+        return {'p50_ms': round(percentil(duraciones, 50), 3), 'p95_ms': round(percentil(duraciones, 95), 3),
+                'peticiones_por_segundo': round(args.peticiones / total, 1), 'errores': errores}
+
+    async def todas_async(nombres):
+        # Un solo event loop: el pool, el cliente HTTP y los semáforos viven en él.
+        resultados = {nombre: await carga_async(nombre) for nombre in nombres}
+        await busquedas.cerrar()
+        return resultados
+
+    nombres = ('search_procedimientos', 'search_items', 'search_diagnosticos')
+    print(f"Latencia simulada de Supabase: {args.latencia_supabase_ms:.0f} ms, {args.peticiones} peticiones por escenario")
+    sincronos = {nombre: ejecutar_escenario(index.app, nombre, args.peticiones, args.hilos) for nombre in nombres}
+    asincronos = asyncio.run(todas_async(nombres))
+    for nombre in nombres:
+        for modo, r in ((f'síncrono ({args.hilos} hilos)', sincronos[nombre]),
+                        (f'async ({args.clientes} clientes)', asincronos[nombre])):
+            print(f"{nombre:<22} {modo:<22} p50 {r['p50_ms']:>8.2f} ms  p95 {r['p95_ms']:>8.2f} ms  "
+                  f"{r['peticiones_por_segundo']:>7.1f} pet/s  errores {r['errores']}")
@@ -0,0 +1,270 @@
+# ==============================================================================
+#           CÁLCULOS CLÍNICOS EN LOTE (IMC, EDAD GESTACIONAL Y FPP)
+# ==============================================================================
+#  Las mismas fórmulas que usan 'calculadora_imc.html' y
+#  'calculadora_gestacional.html' en el navegador, pero para todo un padrón a la
+#  vez (operaciones vectorizadas con NumPy sobre fechas y números).
+#
+#  Paridad con el JavaScript:
+#    - El IMC se redondea a 1 decimal como toFixed(1) (los empates suben) y las
+#      categorías se deciden con el valor ya redondeado, igual que en la página.
+#    - EG = días entre la FUR (FPP - 280 días) y la fecha de atención.
+#    - FPP = fecha de atención - semanas x 7 + 280 días (semanas enteras, 0 a 42).
+#
+#  'python calculos_clinicos.py --paridad' (y tests/test_calculos_clinicos.py)
+#  ejecuta las funciones de las plantillas HTML con Node.js y las compara con
+#  este módulo.
+# ==============================================================================
+
+import os
+from decimal import Decimal, ROUND_HALF_UP
+
+import numpy as np
+
+DIAS_EMBARAZO = 280
+SEMANAS_MAXIMAS = 42
+
+# Categorías y colores de 'generarInterpretacionAdulto' / 'generarInterpretacionGestante'.
+CORTES_IMC_ADULTO = np.array([18.5, 25.0, 30.0])
+CATEGORIAS_ADULTO = np.array(['Bajo Peso', 'Peso Normal', 'Sobrepeso', 'Obesidad'])
+CATEGORIAS_PREGESTACIONAL = np.array(['Bajo Peso Pregestacional', 'Peso Normal Pregestacional',
+                                      'Sobrepeso Pregestacional', 'Obesidad Pregestacional'])
+GANANCIA_RECOMENDADA = np.array(['12.5 - 18 kg', '11.5 - 16 kg', '7 - 11.5 kg', '5 - 9 kg'])
+
+# Rangos normales aproximados de 'generarInterpretacionInfantil' (edad en años -> mín, máx).
+RANGOS_IMC_INFANTIL = {5: (14, 17.5), 10: (15, 20), 15: (17, 23)}
+CATEGORIAS_INFANTIL = np.array(['Bajo Peso', 'Peso Normal', 'Sobrepeso', 'Obesidad'])
+
+MESES = ('enero', 'febrero', 'marzo', 'abril', 'mayo', 'junio', 'julio',
+         'agosto', 'septiembre', 'octubre', 'noviembre', 'diciembre')
+
+
+# ------------------------------------------------------------------------------
+#   IMC
+# ------------------------------------------------------------------------------
+def redondear_como_js(valores, decimales=1):
+    """Equivalente a Number.prototype.toFixed: redondeo del valor binario exacto, empates hacia arriba."""
+    valores = np.asarray(valores, dtype=float)
+    escala = 10.0 ** decimales
+    resultado = np.floor(valores * escala + 0.5) / escala
+    # Solo los casi-empates (p. ej. 0.35, que en binario es 0.34999...) necesitan el cálculo exacto.
+    fraccion = valores * escala - np.floor(valores * escala)
+    dudosos = np.flatnonzero(np.abs(fraccion - 0.5) < 1e-6)
+    paso = Decimal(1).scaleb(-decimales)
+    for i in dudosos:
+        resultado[i] = float(Decimal(float(valores[i])).quantize(paso, rounding=ROUND_HALF_UP))
+    return resultado
+
+
+def calcular_imc(peso, talla_cm):
+    """IMC redondeado a 1 decimal; NaN si el peso o la talla faltan o no son positivos."""
+    peso = np.asarray(peso, dtype=float)
+    talla_m = np.asarray(talla_cm, dtype=float) / 100
+    with np.errstate(divide='ignore', invalid='ignore'):
+        imc = peso / (talla_m * talla_m)
+    imc[~((peso > 0) & (talla_m > 0))] = np.nan
+    return redondear_como_js(imc)
+
+
+def clasificar_imc_adulto(imc):
+    """Índice de categoría OMS (0 bajo peso ... 3 obesidad); -1 si no hay IMC."""
+    categoria = np.searchsorted(CORTES_IMC_ADULTO, imc, side='right')
+    return np.where(np.isnan(imc), -1, categoria)
+
+
+def clasificar_imc_infantil(imc, edad_anios):
+    """Categoría para las edades de referencia de la calculadora (5, 10 y 15 años); -1 en otro caso."""
+    edad_anios = np.asarray(edad_anios, dtype=float)
+    categoria = np.full(len(imc), -1)
+    for edad, (minimo, maximo) in RANGOS_IMC_INFANTIL.items():
+        filas = (edad_anios == edad) & ~np.isnan(imc)
+        valores = imc[filas]
+        categoria[filas] = np.select([valores < minimo, valores <= maximo, valores <= maximo + 2], [0, 1, 2], 3)
+    return categoria
+
+
+# ------------------------------------------------------------------------------
+#   Edad gestacional y FPP
+# ------------------------------------------------------------------------------
+def edad_gestacional_dias(fpp, fecha_atencion):
+    """Días de gestación a la fecha de atención (NaN si falta una fecha o el resultado es negativo)."""
+    fur = fpp - np.timedelta64(DIAS_EMBARAZO, 'D')
+    dias = (fecha_atencion - fur).astype('timedelta64[D]').astype(float)
+    dias[np.isnat(fpp) | np.isnat(fecha_atencion)] = np.nan
+    dias[dias < 0] = np.nan
+    return dias
+
+
+def fpp_desde_semanas(semanas, fecha_atencion):
+    """FPP a partir de las semanas de gestación (enteras, 0 a 42). NaT si el dato no es válido."""
+    semanas = np.trunc(np.asarray(semanas, dtype=float))  # parseInt
+    validas = (semanas >= 0) & (semanas <= SEMANAS_MAXIMAS) & ~np.isnat(fecha_atencion)
+    dias = np.where(validas, DIAS_EMBARAZO - semanas * 7, 0).astype(int)
+    fpp = fecha_atencion + dias.astype('timedelta64[D]')
+    fpp[~validas] = np.datetime64('NaT')
+    return fpp
+
+
+def texto_edad_gestacional(dias):
+    if np.isnan(dias):
+        return ''
+    return f"{int(dias) // 7} semanas y {int(dias) % 7} días"
+
+
+def texto_fecha(fecha):
+    """'15 de marzo de 2025', como toLocaleDateString('es-ES', {year, month: 'long', day})."""
+    if np.isnat(fecha):
+        return ''
+    anio, mes, dia = (int(p) for p in str(fecha).split('-'))
+    return f"{dia} de {MESES[mes - 1]} de {anio}"
+
+
+# ------------------------------------------------------------------------------
+#   Lote completo
+# ------------------------------------------------------------------------------
+COLUMNAS_RESULTADO = ['imc', 'categoria_imc', 'categoria_infantil', 'categoria_pregestacional',
+                      'ganancia_recomendada', 'eg_semanas', 'eg_dias', 'edad_gestacional', 'fpp_calculada']
+
+
+def calcular_lote(filas, hoy):
+    """Columnas de resultado (COLUMNAS_RESULTADO) para filas con peso, talla, edad (años),
+    fecha_atencion (por defecto 'hoy'), fpp o, si no hay FPP, semanas_gestacion."""
+    from lotes import a_fechas, a_numeros, columna
+
+    imc = calcular_imc(a_numeros(columna(filas, 'peso')), a_numeros(columna(filas, 'talla')))
+    adulto = clasificar_imc_adulto(imc)
+    infantil = clasificar_imc_infantil(imc, a_numeros(columna(filas, 'edad')))
+
+    atencion = a_fechas(columna(filas, 'fecha_atencion', 'fecha'))
+    atencion[np.isnat(atencion)] = np.datetime64(hoy, 'D')
+    fpp = a_fechas(columna(filas, 'fpp'))
+    sin_fpp = np.isnat(fpp)
+    fpp[sin_fpp] = fpp_desde_semanas(a_numeros(columna(filas, 'semanas_gestacion', 'semanas')), atencion)[sin_fpp]
+    eg = edad_gestacional_dias(fpp, atencion)
+
+    def etiqueta(tabla, indices):
+        return np.where(indices >= 0, tabla[np.maximum(indices, 0)], '')
+
+    con_eg = ~np.isnan(eg)
+    semanas = (np.nan_to_num(eg) // 7).astype(int).tolist()
+    dias = (np.nan_to_num(eg) % 7).astype(int).tolist()
+    return [
+        [f"{v:.1f}" if v == v else '' for v in imc.tolist()],
+        etiqueta(CATEGORIAS_ADULTO, adulto),
+        etiqueta(CATEGORIAS_INFANTIL, infantil),
+        etiqueta(CATEGORIAS_PREGESTACIONAL, adulto),
+        etiqueta(GANANCIA_RECOMENDADA, adulto),
+        [s if ok else '' for s, ok in zip(semanas, con_eg.tolist())],
+        [d if ok else '' for d, ok in zip(dias, con_eg.tolist())],
+        [f"{s} semanas y {d} días" if ok else '' for s, d, ok in zip(semanas, dias, con_eg.tolist())],
+        np.where(np.isnat(fpp), '', np.datetime_as_string(fpp, unit='D')),
+    ]
+
+
+# ------------------------------------------------------------------------------
+#   Verificación de paridad con las calculadoras del navegador
+# ------------------------------------------------------------------------------
+def _extraer_funcion(fuente, nombre):
+    """Texto completo de 'function nombre(...) { ... }' dentro de una plantilla."""
+    inicio = fuente.index(f"function {nombre}(")
+    profundidad, i = 0, fuente.index('{', inicio)
+    while True:
+        if fuente[i] == '{':
+            profundidad += 1
+        elif fuente[i] == '}':
+            profundidad -= 1
+            if profundidad == 0:
+                return fuente[inicio:i + 1]
+        i += 1
+
+
+def verificar_paridad(casos=2000, semilla=34):
+    """Corre las funciones JS de las plantillas con Node.js y compara resultados. Devuelve nº de diferencias."""
+    import json
+    import subprocess
+
+    plantillas = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')
+    with open(os.path.join(plantillas, 'calculadora_imc.html'), encoding='utf-8') as f:
+        imc_html = f.read()
+    with open(os.path.join(plantillas, 'calculadora_gestacional.html'), encoding='utf-8') as f:
+        gestacional_html = f.read()
+
+    generador = np.random.default_rng(semilla)
+    pesos = np.round(generador.uniform(2, 150, casos), 2)
+    tallas = np.round(generador.uniform(45, 200, casos), 1)
+    edades = generador.choice([5, 10, 15], casos)
+    atencion = np.datetime64('2024-01-01') + generador.integers(0, 730, casos).astype('timedelta64[D]')
+    fpp = atencion + generador.integers(-30, 300, casos).astype('timedelta64[D]')
+    semanas = generador.integers(-2, 45, casos)
+
+    programa = "\n".join([
+        "const crearItemAcordeon = (titulo, imc, categoria) => categoria;",
+        _extraer_funcion(imc_html, 'generarInterpretacionAdulto'),
+        _extraer_funcion(imc_html, 'generarInterpretacionInfantil'),
+        _extraer_funcion(imc_html, 'generarInterpretacionGestante'),
+        _extraer_funcion(gestacional_html, 'parseDate'),
+        "const toggleResultado = () => {};",
+        "const clase = { add() {}, remove() {} };",
+        "const inputFechaAtencion = {}, inputFPP1 = {}, inputEG2 = { classList: clase };",
+        "const egValor = {}, fppValor = {}, resultadoEG = {}, resultadoFPP = {};",
+        _extraer_funcion(gestacional_html, 'calcularEG'),
+        _extraer_funcion(gestacional_html, 'calcularFPP'),
+        "const casos = JSON.parse(require('fs').readFileSync(0, 'utf-8'));",
+        "const salida = casos.map(c => {",
+        "  const imc = (c.peso / ((c.talla / 100) * (c.talla / 100))).toFixed(1);",
+        "  inputFechaAtencion.value = c.atencion; inputFPP1.value = c.fpp; egValor.innerText = '';",
+        "  calcularEG(); const eg = egValor.innerText;",
+        "  inputFechaAtencion.value = c.atencion; inputEG2.value = String(c.semanas); fppValor.innerText = '';",
+        "  calcularFPP();",
+        "  return [imc, generarInterpretacionAdulto(imc), generarInterpretacionInfantil(imc, c.edad),",
+        "          generarInterpretacionGestante(imc), eg, fppValor.innerText];",
+        "});",
+        "console.log(JSON.stringify(salida));",
+    ])
+    entrada = json.dumps([
+        {"peso": float(p), "talla": float(t), "edad": int(e), "atencion": str(a), "fpp": str(f), "semanas": int(s)}
+        for p, t, e, a, f, s in zip(pesos, tallas, edades, atencion, fpp, semanas)
+    ])
+    proceso = subprocess.run(['node', '-e', programa], input=entrada, capture_output=True, text=True,
+                             env={'TZ': 'America/Lima', 'PATH': os.environ.get('PATH', '')})
+    if proceso.returncode != 0:
+        raise RuntimeError(proceso.stderr)
+    esperado = json.loads(proceso.stdout)
+
+    imc = calcular_imc(pesos, tallas)
+    adulto = clasificar_imc_adulto(imc)
+    infantil = clasificar_imc_infantil(imc, edades)
+    eg = edad_gestacional_dias(fpp, atencion)
+    fpp_calculada = fpp_desde_semanas(semanas, atencion)
+
+    diferencias = 0
+    for i, js in enumerate(esperado):
+        eg_js = js[4] if js[4] != 'Fecha inválida.' else ''
+        python = [f"{imc[i]:.1f}", CATEGORIAS_ADULTO[adulto[i]], CATEGORIAS_INFANTIL[infantil[i]],
+                  CATEGORIAS_PREGESTACIONAL[adulto[i]], texto_edad_gestacional(eg[i]), texto_fecha(fpp_calculada[i])]
+        if [js[0], js[1], js[2], js[3], eg_js, js[5]] != python:
+            diferencias += 1
+            if diferencias <= 5:
+                print(f"DIFERENCIA caso {i}: JS={js} Python={python}")
+    return diferencias
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+    from datetime import date
+
+    if '--paridad' in sys.argv:
+        diferencias = verificar_paridad()
+        print("OK: Python y JavaScript coinciden." if not diferencias else f"ERROR: {diferencias} casos distintos.")
+        sys.exit(1 if diferencias else 0)
+
+    # Referencia de rendimiento: padrón sintético de 100 000 gestantes.
+    generador = np.random.default_rng(34)
+    n = 100_000
+    filas = [{"peso": f"{p:.1f}", "talla": f"{t:.0f}", "fecha_atencion": "2025-03-01", "semanas_gestacion": str(s)}
+             for p, t, s in zip(generador.uniform(40, 110, n), generador.uniform(140, 185, n), generador.integers(4, 41, n))]
+    inicio = time.perf_counter()
+    calcular_lote(filas, date.today())
+    segundos = time.perf_counter() - inicio
+    print(f"{n} filas en {segundos * 1000:.1f} ms ({n / segundos:,.0f} filas/s)")
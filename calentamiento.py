@@ -0,0 +1,75 @@
+# ==============================================================================
+#           CALENTAMIENTO DE UNA INSTANCIA TRAS UN ARRANQUE EN FRÍO
+# ==============================================================================
+#  Todo lo costoso de la aplicación se crea de forma perezosa (motor de BD,
+#  clientes de Supabase, índices, plantillas Jinja...), así que lo paga la primera
+#  petición que lo necesita. '/readyz?warm=1' ejecuta estos pasos de antemano
+#  para que un ping programado o el hook de despliegue los pague en su lugar.
+#
+#  Cada paso se registra con el decorador 'paso' y se mide por separado; un paso
+#  que falla no detiene a los demás.
+#
+#  El endpoint no requiere sesión, así que los pasos corren una sola vez por
+#  proceso: las llamadas siguientes reciben el reporte guardado. Si la instancia
+#  no quedó lista, se reintenta como mucho cada REINTENTO_S segundos.
+# ==============================================================================
+
+import os
+import threading
+import time
+
+REINTENTO_S = float(os.environ.get('CALENTAMIENTO_REINTENTO_S', 30))
+
+
+class Calentamiento:
+    """Lista ordenada de pasos de calentamiento con su tiempo y resultado."""
+
+    def __init__(self):
+        self._pasos = []
+        self._lock = threading.Lock()
+        self.ultimo = None
+
+    def paso(self, nombre, requerido=False):
+        """Registra una función como paso. Si 'requerido' falla, la instancia no está lista."""
+        def registrar(funcion):
+            self._pasos.append((nombre, funcion, requerido))
+            return funcion
+        return registrar
+
+    def ejecutar(self, forzar=False):
+        """Ejecuta los pasos (una vez por proceso) y devuelve el reporte.
+
+        Si ya corrieron y la instancia quedó lista (o falló hace menos de
+        REINTENTO_S segundos), devuelve el último reporte sin repetir nada.
+        'forzar' los vuelve a ejecutar (solo para un administrador).
+        """
+        with self._lock:
+            if self.ultimo is not None and not forzar:
+                if self.ultimo["listo"] or time.time() - self.ultimo["momento"] < REINTENTO_S:
+                    return self.ultimo
+            inicio_total = time.perf_counter()
+            pasos = []
+            listo = True
+            for nombre, funcion, requerido in self._pasos:
+                inicio = time.perf_counter()
+                resultado = {"paso": nombre}
+                try:
+                    detalle = funcion()
+                    resultado["ok"] = True
+                    if detalle is not None:
+                        resultado["detalle"] = detalle
+                except Exception as e:
+                    # Solo el tipo de error: este endpoint no requiere sesión.
+                    print(f"ERROR: Falló el paso de calentamiento '{nombre}': {e}")
+                    resultado["ok"] = False
+                    resultado["error"] = type(e).__name__
+                    listo = listo and not requerido
+                resultado["ms"] = round((time.perf_counter() - inicio) * 1000, 1)
+                pasos.append(resultado)
+            self.ultimo = {
+                "listo": listo,
+                "total_ms": round((time.perf_counter() - inicio_total) * 1000, 1),
+                "pasos": pasos,
+                "momento": time.time(),
+            }
+            return self.ultimo
@@ -0,0 +1,240 @@
+# ==============================================================================
+#           CATÁLOGOS SIN CONEXIÓN (paquetes versionados + deltas)
+# ==============================================================================
+#  Las páginas de búsqueda (diagnósticos, items médicos, procedimientos) hacían
+#  una petición por cada tecla. Aquí se arma, por catálogo, un paquete NDJSON
+#  comprimido con gzip y con versión, que el navegador guarda en IndexedDB para
+#  buscar localmente; al volver solo pide las filas que cambiaron desde su versión.
+#
+#  Generación incremental:
+#    - las filas se reparten en NUM_SEGMENTOS segmentos por crc32 de su clave;
+#    - cada segmento se serializa y se comprime por separado como un bloque
+#      deflate cerrado con Z_FULL_FLUSH, así los bloques se pueden concatenar;
+#    - al reconstruir, solo se vuelven a comprimir los segmentos cuyo contenido
+#      cambió, y el gzip final se arma pegando cabecera + bloques + cola;
+#    - la versión es una huella del contenido: si nada cambió, no cambia.
+#
+#  Los deltas salen de comparar fila por fila los segmentos que cambiaron. Se
+#  guarda un historial corto por proceso; si el cliente trae una versión que ya
+#  no está en él, se le responde 'completo' y descarga el paquete entero.
+# ==============================================================================
+
+import hashlib
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+from collections import deque
+
+NUM_SEGMENTOS = 64
+VIGENCIA = int(os.environ.get('CATALOGOS_VIGENCIA_S', 600))
+HISTORIAL = 20
+NIVEL_COMPRESION = 6
+
+_CABECERA_GZIP = b'\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\xff'
+_FIN_DEFLATE = zlib.compressobj(NIVEL_COMPRESION, zlib.DEFLATED, -15).flush(zlib.Z_FINISH)
+
+
+def _bloque_deflate(crudo):
+    """Bloque deflate crudo, terminado en un límite de byte para poder concatenarlo."""
+    compresor = zlib.compressobj(NIVEL_COMPRESION, zlib.DEFLATED, -15)
+    return compresor.compress(crudo) + compresor.flush(zlib.Z_FULL_FLUSH)
+
+
+def _linea(valor):
+    return (json.dumps(valor, ensure_ascii=False, separators=(',', ':'), default=str) + '\n').encode('utf-8')
+
+
+def _segmento_de(clave):
+    return zlib.crc32(clave.encode('utf-8')) % NUM_SEGMENTOS
+
+
+class _Segmento:
+    __slots__ = ('huella', 'crudo', 'bloque', 'filas')
+
+    def __init__(self, filas_por_clave):
+        self.filas = filas_por_clave
+        self.crudo = b''.join(_linea(self.filas[clave]) for clave in sorted(self.filas))
+        self.huella = hashlib.sha1(self.crudo).digest()
+        self.bloque = None  # se comprime solo si el segmento cambió
+
+
+class Catalogo:
+    """Un catálogo: columnas, cómo leer sus filas y su último paquete construido."""
+
+    def __init__(self, nombre, columnas, leer, clave=0):
+        self.nombre = nombre
+        self.columnas = list(columnas)
+        self.clave = clave
+        self._leer = leer
+        self._segmentos = [None] * NUM_SEGMENTOS
+        self._historial = deque(maxlen=HISTORIAL)
+        self._paquete = None
+        self._lock = threading.Lock()
+        self.version = None
+        self.filas = 0
+        self.construido = 0.0
+        self.ultima_reconstruccion = {}
+
+    def vigente(self, vigencia):
+        return self.version is not None and time.monotonic() - self.construido < vigencia
+
+    def actualizar(self, vigencia=None):
+        """Relee las filas y reconstruye solo los segmentos que cambiaron.
+
+        Con 'vigencia', no hace nada si otro hilo ya lo reconstruyó hace menos de eso.
+        """
+        with self._lock:
+            if vigencia is not None and self.vigente(vigencia):
+                return self.version
+            inicio = time.perf_counter()
+            por_segmento = [{} for _ in range(NUM_SEGMENTOS)]
+            total = 0
+            for fila in self._leer():
+                fila = list(fila)
+                clave = str(fila[self.clave])
+                por_segmento[_segmento_de(clave)][clave] = fila
+                total += 1
+
+            nuevos, cambiadas, eliminadas, recomprimidos = [], set(), set(), 0
+            for anterior, filas in zip(self._segmentos, por_segmento):
+                segmento = _Segmento(filas)
+                if anterior is not None and anterior.huella == segmento.huella:
+                    nuevos.append(anterior)
+                    continue
+                segmento.bloque = _bloque_deflate(segmento.crudo)
+                recomprimidos += 1
+                if anterior is not None:
+                    cambiadas.update(c for c, f in filas.items() if anterior.filas.get(c) != f)
+                    eliminadas.update(c for c in anterior.filas if c not in filas)
+                nuevos.append(segmento)
+
+            version = hashlib.sha1(b''.join(s.huella for s in nuevos)).hexdigest()[:16]
+            if self.version is not None and version != self.version:
+                self._historial.append((self.version, version, frozenset(cambiadas), frozenset(eliminadas)))
+            if version != self.version:
+                self._paquete = None
+            self._segmentos = nuevos
+            self.version = version
+            self.filas = total
+            self.construido = time.monotonic()
+            self.ultima_reconstruccion = {
+                'segmentos_recomprimidos': recomprimidos,
+                'ms': round((time.perf_counter() - inicio) * 1000, 1),
+            }
+            return version
+
+    def paquete(self):
+        """(bytes gzip, versión) del catálogo: cabecera JSON y luego una fila por línea."""
+        with self._lock:
+            if self._paquete is None:
+                cabecera = _linea({'catalogo': self.nombre, 'version': self.version,
+                                   'columnas': self.columnas, 'clave': self.clave, 'filas': self.filas})
+                crc, longitud = zlib.crc32(cabecera), len(cabecera)
+                for segmento in self._segmentos:
+                    crc = zlib.crc32(segmento.crudo, crc)
+                    longitud += len(segmento.crudo)
+                self._paquete = b''.join([
+                    _CABECERA_GZIP, _bloque_deflate(cabecera),
+                    *(s.bloque for s in self._segmentos),
+                    _FIN_DEFLATE, struct.pack('<II', crc, longitud & 0xFFFFFFFF),
+                ])
+            return self._paquete, self.version
+
+    def delta(self, desde):
+        """Filas nuevas/modificadas y claves eliminadas desde la versión 'desde'."""
+        with self._lock:
+            if desde == self.version:
+                return {'version': self.version, 'filas': [], 'eliminados': []}
+            historial = list(self._historial)
+            inicio = next((i for i, (de, _, _, _) in enumerate(historial) if de == desde), None)
+            if inicio is None:
+                return {'version': self.version, 'completo': True}
+            claves = set()
+            for _, _, cambiadas, eliminadas in historial[inicio:]:
+                claves |= cambiadas | eliminadas
+            filas, eliminados = [], []
+            for clave in sorted(claves):
+                fila = self._segmentos[_segmento_de(clave)].filas.get(clave)
+                if fila is None:
+                    eliminados.append(clave)
+                else:
+                    filas.append(fila)
+            return {'version': self.version, 'filas': filas, 'eliminados': eliminados}
+
+    def resumen(self):
+        return {'version': self.version, 'filas': self.filas, 'columnas': self.columnas}
+
+
+class CatalogosOffline:
+    """Registro de catálogos; cada uno se reconstruye (si hace falta) al pedirlo vencido."""
+
+    def __init__(self, vigencia=VIGENCIA):
+        self.vigencia = vigencia
+        self._catalogos = {}
+
+    def registrar(self, nombre, columnas, clave=0):
+        """Decorador: registra la función que devuelve las filas del catálogo 'nombre'."""
+        def registrar(leer):
+            self._catalogos[nombre] = Catalogo(nombre, columnas, leer, clave)
+            return leer
+        return registrar
+
+    def obtener(self, nombre):
+        """El catálogo 'nombre' ya actualizado, o None si no existe."""
+        catalogo = self._catalogos.get(nombre)
+        if catalogo is not None and not catalogo.vigente(self.vigencia):
+            catalogo.actualizar(self.vigencia)
+        return catalogo
+
+    def manifiesto(self, nombres=None):
+        """Versión y tamaño de cada catálogo (o solo de 'nombres'). Los que no se pueden leer se omiten."""
+        resultado = {}
+        for nombre in nombres or self._catalogos:
+            if nombre not in self._catalogos:
+                continue
+            try:
+                resultado[nombre] = self.obtener(nombre).resumen()
+            except Exception as e:
+                print(f"ERROR: No se pudo construir el catálogo '{nombre}': {e}")
+        return resultado
+
+
+if __name__ == '__main__':
+    # Verificación y medición: construcción completa, cambios pequeños, reconstrucción
+    # incremental, delta y que el gzip armado por bloques se descomprima bien.
+    import gzip
+    import random
+
+    azar = random.Random(7)
+    datos = {f"I{n:05d}": [f"I{n:05d}", f"Item de prueba número {n} — ñandú", azar.choice(['MEDICAMENTO', 'INSUMO'])]
+             for n in range(30000)}
+    catalogos = CatalogosOffline(vigencia=0)
+    catalogos.registrar('items', ('codigo', 'descripcion', 'tipo'))(lambda: list(datos.values()))
+
+    catalogo = catalogos.obtener('items')
+    print(f"Construcción completa: {catalogo.ultima_reconstruccion}")
+    paquete, version_inicial = catalogo.paquete()
+    lineas = gzip.decompress(paquete).decode('utf-8').splitlines()
+    assert json.loads(lineas[0])['version'] == version_inicial and len(lineas) == len(datos) + 1
+    print(f"Paquete: {len(paquete)} B gzip, {sum(len(l) + 1 for l in lineas)} B sin comprimir")
+
+    sin_cambios = catalogos.obtener('items')
+    assert sin_cambios.version == version_inicial
+    print(f"Reconstrucción sin cambios: {sin_cambios.ultima_reconstruccion}")
+
+    datos['I00010'][1] = 'Descripción corregida'
+    del datos['I00020']
+    datos['N00001'] = ['N00001', 'Item nuevo', 'INSUMO']
+    catalogo = catalogos.obtener('items')
+    print(f"Reconstrucción con 3 cambios: {catalogo.ultima_reconstruccion}")
+
+    delta = catalogo.delta(version_inicial)
+    assert [f[0] for f in delta['filas']] == ['I00010', 'N00001'] and delta['eliminados'] == ['I00020'], delta
+    assert catalogo.delta('desconocida') == {'version': catalogo.version, 'completo': True}
+    paquete, _ = catalogo.paquete()
+    filas = [json.loads(l) for l in gzip.decompress(paquete).decode('utf-8').splitlines()[1:]]
+    assert sorted(map(tuple, filas)) == sorted(map(tuple, datos.values()))
+    print("OK: delta y paquete incremental coinciden con los datos.")
@@ -0,0 +1,322 @@
+# ==============================================================================
+#           COMPILADOR DEL PAQUETE DE DATOS (paso de construcción)
+# ==============================================================================
+#  Valida 'cie10.json' y 'conocimiento_clinico.json' y los compila en
+#  'datos_compilados.bin' (ver paquete_datos.py para el formato).
+#
+#  Uso:
+#    python compilar_datos.py            -> valida y compila
+#    python compilar_datos.py --validar  -> solo valida (no escribe nada)
+#    python compilar_datos.py --medir    -> compara arranque y memoria JSON vs paquete
+#
+#  Vuelva a ejecutarlo (y suba el .bin) cada vez que cambie uno de los JSON.
+# ==============================================================================
+
+import hashlib
+import json
+import os
+import subprocess
+import sys
+from array import array
+from datetime import datetime
+
+from paquete_datos import (CABECERA, ENTRADA_DIRECTORIO, FORMATO_PAQUETE, MAGIA, ORDEN_BYTES,
+                           RUTA_PAQUETE, SIN_CADENA)
+
+RUTA_CIE10 = 'cie10.json'
+RUTA_CONOCIMIENTO = 'conocimiento_clinico.json'
+
+CAMPOS_CIE10 = ('codigo_cie10', 'descripcion_oficial', 'capitulo', 'grupo', 'notas_inclusion', 'notas_exclusion')
+CAMPOS_GUIA = ('nombre_guia', 'diagnostico_cie10', 'referencias_cie10', 'secciones')
+
+
+class ErrorDatos(Exception):
+    """Error de validación con la ubicación exacta en el archivo fuente."""
+
+
+# ==============================================================================
+#           VALIDACIÓN DE LOS ARCHIVOS FUENTE
+# ==============================================================================
+
+def _contexto(texto, linea, columna):
+    lineas = texto.split('\n')
+    contenido = lineas[linea - 1] if 0 < linea <= len(lineas) else ''
+    return f"    {linea:>6} | {contenido}\n           | {' ' * (columna - 1)}^"
+
+
+def _diagnosticar_estructura(texto):
+    """Busca el primer corchete o llave que quedó abierto en un JSON indentado.
+
+    json.JSONDecodeError suele reportar el final del archivo cuando falta un
+    cierre. En un JSON con sangría, un corchete que se abre en una línea con la
+    misma (o menor) sangría que el contenedor abierto más interno indica que ese
+    contenedor nunca se cerró; ese es el punto real del error.
+    """
+    pila = []   # (caracter, linea, columna, sangria)
+    linea, inicio_linea = 1, 0
+    en_cadena = escape = False
+    for posicion, caracter in enumerate(texto):
+        if en_cadena:
+            if escape:
+                escape = False
+            elif caracter == '\\':
+                escape = True
+            elif caracter == '"':
+                en_cadena = False
+            continue
+        if caracter == '\n':
+            linea += 1
+            inicio_linea = posicion + 1
+        elif caracter == '"':
+            en_cadena = True
+        elif caracter in '[{':
+            columna = posicion - inicio_linea + 1
+            prefijo = texto[inicio_linea:posicion]
+            sangria = len(prefijo) - len(prefijo.lstrip(' \t'))
+            inicia_linea = not prefijo.strip()
+            if pila and inicia_linea and sangria <= pila[-1][3] and pila[-1][1] != linea:
+                abierto = pila[-1]
+                return (linea, columna,
+                        f"'{caracter}' inesperado: el '{abierto[0]}' abierto en la línea {abierto[1]}, "
+                        f"columna {abierto[2]} no se cerró antes de esta línea (falta un cierre o sobra esta apertura)")
+            pila.append((caracter, linea, columna, sangria))
+        elif caracter in ']}':
+            if pila:
+                pila.pop()
+    return None
+
+
+def cargar_json_validado(ruta):
+    """Lee un JSON fuente; si está mal formado lanza ErrorDatos con línea, columna y contexto."""
+    try:
+        with open(ruta, 'r', encoding='utf-8') as f:
+            texto = f.read()
+    except FileNotFoundError:
+        raise ErrorDatos(f"{ruta}: no existe el archivo.")
+    except UnicodeDecodeError as e:
+        raise ErrorDatos(f"{ruta}: el archivo no está en UTF-8 (byte {e.start}).")
+
+    try:
+        return json.loads(texto)
+    except json.JSONDecodeError as e:
+        diagnostico = _diagnosticar_estructura(texto)
+        if diagnostico:
+            linea, columna, mensaje = diagnostico
+        else:
+            linea, columna, mensaje = e.lineno, e.colno, e.msg
+        raise ErrorDatos(f"{ruta}:{linea}:{columna}: JSON inválido: {mensaje}\n{_contexto(texto, linea, columna)}")
+
+
+def validar_cie10(registros):
+    if not isinstance(registros, list):
+        raise ErrorDatos(f"{RUTA_CIE10}: se esperaba una lista de registros.")
+    vistos = set()
+    for numero, registro in enumerate(registros, 1):
+        if not isinstance(registro, dict):
+            raise ErrorDatos(f"{RUTA_CIE10}: el registro #{numero} no es un objeto.")
+        faltantes = [c for c in CAMPOS_CIE10 if c not in registro]
+        if faltantes:
+            raise ErrorDatos(f"{RUTA_CIE10}: el registro #{numero} ({registro.get('codigo_cie10')}) no tiene {', '.join(faltantes)}.")
+        codigo = registro['codigo_cie10']
+        if codigo in vistos:
+            raise ErrorDatos(f"{RUTA_CIE10}: el código {codigo} (registro #{numero}) está duplicado.")
+        vistos.add(codigo)
+        for nota in registro['notas_exclusion']:
+            if isinstance(nota, dict) and set(nota) != {'codigo', 'descripcion'}:
+                raise ErrorDatos(f"{RUTA_CIE10}: nota de exclusión inválida en {codigo}: {nota}")
+
+
+def validar_conocimiento(guias):
+    if not isinstance(guias, list):
+        raise ErrorDatos(f"{RUTA_CONOCIMIENTO}: se esperaba una lista de guías.")
+    for numero, guia in enumerate(guias, 1):
+        faltantes = [c for c in CAMPOS_GUIA if c not in guia]
+        if faltantes:
+            raise ErrorDatos(f"{RUTA_CONOCIMIENTO}: la guía #{numero} ({guia.get('nombre_guia')}) no tiene {', '.join(faltantes)}.")
+        for seccion in guia['secciones']:
+            if 'titulo' not in seccion:
+                raise ErrorDatos(f"{RUTA_CONOCIMIENTO}: la guía #{numero} tiene una sección sin 'titulo'.")
+
+
+# ==============================================================================
+#           COMPILACIÓN
+# ==============================================================================
+
+class _TablaCadenas:
+    """Interna cada cadena una sola vez y devuelve su índice."""
+
+    def __init__(self):
+        self._indices = {}
+        self._datos = bytearray()
+        self.desplazamientos = array('I', [0])
+
+    def indice(self, cadena):
+        if cadena is None:
+            return SIN_CADENA
+        indice = self._indices.get(cadena)
+        if indice is None:
+            indice = len(self._indices)
+            self._indices[cadena] = indice
+            self._datos += cadena.encode('utf-8')
+            self.desplazamientos.append(len(self._datos))
+        return indice
+
+    @property
+    def datos(self):
+        return bytes(self._datos)
+
+
+def compilar(cie10, guias, version_datos):
+    """Devuelve el contenido binario del paquete."""
+    cadenas = _TablaCadenas()
+
+    # --- Catálogo CIE-10: columnas ordenadas por código para búsqueda binaria ---
+    cie10 = sorted(cie10, key=lambda r: r['codigo_cie10'])
+    columnas = {nombre: array('I') for nombre in ('cie10_codigo', 'cie10_desc', 'cie10_capitulo', 'cie10_grupo',
+                                                 'cie10_incl_off', 'cie10_incl', 'cie10_excl_off', 'cie10_excl')}
+    columnas['cie10_incl_off'].append(0)
+    columnas['cie10_excl_off'].append(0)
+    for registro in cie10:
+        columnas['cie10_codigo'].append(cadenas.indice(registro['codigo_cie10']))
+        columnas['cie10_desc'].append(cadenas.indice(registro['descripcion_oficial']))
+        columnas['cie10_capitulo'].append(cadenas.indice(registro['capitulo']))
+        columnas['cie10_grupo'].append(cadenas.indice(registro['grupo']))
+        for nota in registro['notas_inclusion']:
+            columnas['cie10_incl'].append(cadenas.indice(nota))
+        columnas['cie10_incl_off'].append(len(columnas['cie10_incl']))
+        for nota in registro['notas_exclusion']:
+            if isinstance(nota, dict):
+                columnas['cie10_excl'].extend((cadenas.indice(nota['codigo']), cadenas.indice(nota['descripcion'])))
+            else:
+                columnas['cie10_excl'].extend((SIN_CADENA, cadenas.indice(nota)))
+        columnas['cie10_excl_off'].append(len(columnas['cie10_excl']) // 2)
+
+    # --- Guías: un bloque JSON compacto por guía + índice CIE-10 -> guía ---
+    bloque_guias = bytearray()
+    guias_off = array('I', [0])
+    primera_guia = {}
+    for indice, guia in enumerate(guias):
+        bloque_guias += json.dumps(guia, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        guias_off.append(len(bloque_guias))
+        # Misma prioridad que el recorrido lineal: gana la primera guía que menciona el código.
+        for codigo in [guia.get('diagnostico_cie10')] + list(guia.get('referencias_cie10', [])):
+            if codigo:
+                primera_guia.setdefault(codigo, indice)
+    codigos_guia = sorted(primera_guia)
+    columnas['guia_idx_codigo'] = array('I', (cadenas.indice(c) for c in codigos_guia))
+    columnas['guia_idx_guia'] = array('I', (primera_guia[c] for c in codigos_guia))
+
+    meta = {
+        "version_datos": version_datos,
+        "huella_conocimiento": huella_de_archivo(RUTA_CONOCIMIENTO),
+        "generado": datetime.now().isoformat(timespec='seconds'),
+        "total_cie10": len(cie10),
+        "total_guias": len(guias),
+        "total_cadenas": len(cadenas.desplazamientos) - 1,
+    }
+
+    secciones = {
+        'meta': json.dumps(meta, ensure_ascii=False).encode('utf-8'),
+        'cadenas_off': cadenas.desplazamientos.tobytes(),
+        'cadenas': cadenas.datos,
+        'guias_off': guias_off.tobytes(),
+        'guias': bytes(bloque_guias),
+    }
+    for nombre, columna in columnas.items():
+        secciones[nombre] = columna.tobytes()
+
+    # --- Cabecera + directorio + secciones alineadas a 8 bytes ---
+    desplazamiento = CABECERA.size + ENTRADA_DIRECTORIO.size * len(secciones)
+    directorio = bytearray()
+    cuerpo = bytearray()
+    for nombre, datos in secciones.items():
+        assert len(nombre) <= 16, f"Nombre de sección demasiado largo: {nombre}"
+        relleno = (-(desplazamiento + len(cuerpo))) % 8
+        cuerpo += b'\0' * relleno
+        directorio += ENTRADA_DIRECTORIO.pack(nombre.encode('ascii'), desplazamiento + len(cuerpo), len(datos))
+        cuerpo += datos
+    cabecera = CABECERA.pack(MAGIA, FORMATO_PAQUETE, ORDEN_BYTES[sys.byteorder], len(secciones))
+    return bytes(cabecera + directorio + cuerpo), meta
+
+
+def huella_de_archivo(ruta):
+    with open(ruta, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()[:16]
+
+
+def version_de_fuentes(*rutas):
+    """Huella corta del contenido de los archivos fuente (cambia si cambia cualquiera)."""
+    huella = hashlib.sha256()
+    for ruta in rutas:
+        with open(ruta, 'rb') as f:
+            huella.update(f.read())
+    return huella.hexdigest()[:16]
+
+
+def construir_paquete(ruta_salida=RUTA_PAQUETE, escribir=True):
+    cie10 = cargar_json_validado(RUTA_CIE10)
+    validar_cie10(cie10)
+    guias = cargar_json_validado(RUTA_CONOCIMIENTO)
+    validar_conocimiento(guias)
+
+    contenido, meta = compilar(cie10, guias, version_de_fuentes(RUTA_CIE10, RUTA_CONOCIMIENTO))
+    if escribir:
+        temporal = ruta_salida + '.tmp'
+        with open(temporal, 'wb') as f:
+            f.write(contenido)
+        os.replace(temporal, ruta_salida)
+    return contenido, meta
+
+
+# ==============================================================================
+#           MEDICIÓN: ARRANQUE EN FRÍO Y MEMORIA (JSON vs PAQUETE)
+# ==============================================================================
+
+_SCRIPT_MEDICION = r'''
+import resource, sys, time, json
+inicio = time.perf_counter()
+if sys.argv[1] == 'json':
+    with open('cie10.json', encoding='utf-8') as f:
+        cie10 = {r['codigo_cie10']: r for r in json.load(f)}
+    with open('conocimiento_clinico.json', encoding='utf-8') as f:
+        guias = json.load(f)
+    registro = cie10.get('E119')
+else:
+    from paquete_datos import abrir_paquete
+    paquete = abrir_paquete()
+    registro = paquete.buscar_cie10('E119')
+    guias = paquete.guias()
+transcurrido = time.perf_counter() - inicio
+rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({'segundos': transcurrido, 'rss_max_mb': rss_kb / 1024}))
+'''
+
+
+def medir():
+    base = subprocess.run([sys.executable, '-c', 'import resource, json, mmap, struct;'
+                           'print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024)'],
+                          capture_output=True, text=True, check=True)
+    print(f"Intérprete vacío: RSS máx {float(base.stdout):.1f} MB")
+    for modo in ('json', 'paquete'):
+        muestras = []
+        for _ in range(5):
+            salida = subprocess.run([sys.executable, '-c', _SCRIPT_MEDICION, modo], capture_output=True, text=True, check=True)
+            muestras.append(json.loads(salida.stdout))
+        mejor = min(muestras, key=lambda m: m['segundos'])
+        print(f"{modo:>8}: carga {mejor['segundos'] * 1000:7.1f} ms, RSS máx {mejor['rss_max_mb']:.1f} MB")
+
+
+if __name__ == '__main__':
+    try:
+        if '--medir' in sys.argv:
+            medir()
+        elif '--validar' in sys.argv:
+            construir_paquete(escribir=False)
+            print("OK: los archivos fuente son válidos.")
+        else:
+            contenido, meta = construir_paquete()
+            print(f"OK: '{RUTA_PAQUETE}' generado ({len(contenido) / 1024:.0f} KB, versión {meta['version_datos']}): "
+                  f"{meta['total_cie10']} códigos CIE-10, {meta['total_guias']} guías, {meta['total_cadenas']} cadenas únicas.")
+    except ErrorDatos as e:
+        print(f"ERROR: {e}")
+        sys.exit(1)
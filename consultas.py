@@ -0,0 +1,335 @@
+# ==============================================================================
+#           REPOSITORIO CENTRAL DE CONSULTAS SQL
+# ==============================================================================
+#  Cada sentencia de la aplicación se define aquí una sola vez, con nombre:
+#    - el objeto 'text()' se construye al importar el módulo (antes se armaba,
+#      y se volvía a analizar en busca de ':parametros', en cada petición) y es
+#      siempre el mismo, así que SQLAlchemy reutiliza su forma compilada;
+#    - columnas explícitas: nada de 'SELECT *';
+#    - 'dicts()' arma los diccionarios para JSON con las claves del resultado
+#      leídas una vez, en lugar de 'dict(row._mapping)' fila por fila;
+#    - cada ejecución se mide por sentencia (llamadas, tiempo total y máximo) y
+#      se avisa a los observadores registrados con 'observar()' (métricas).
+#
+#  Sentencias preparadas en el servidor: psycopg2 no las ofrece; con
+#  BD_SENTENCIAS_PREPARADAS=1 el motor usa psycopg 3, que prepara cada sentencia
+#  después de BD_UMBRAL_PREPARACION ejecuciones en la misma conexión. Como el
+#  texto de cada sentencia es fijo, todas se benefician. El pooler de Supabase en
+#  modo transacción (puerto 6543) no las admite; ahí se desactivan.
+# ==============================================================================
+
+import os
+import threading
+import time
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import make_url
+
+import busqueda_plantillas
+from indice_plantillas import CAMPOS_INDEXADOS
+
+SENTENCIAS = {}
+_OBSERVADORES = []
+_lock = threading.Lock()
+
+
+class Sentencia:
+    """Una sentencia SQL con nombre, compilada una vez y medida en cada ejecución."""
+
+    __slots__ = ('nombre', 'sql', 'llamadas', 'segundos', 'maximo')
+
+    def __init__(self, nombre, sql):
+        if nombre in SENTENCIAS:
+            raise ValueError(f"Sentencia duplicada: {nombre}")
+        self.nombre = nombre
+        self.sql = text(sql)
+        self.llamadas = 0
+        self.segundos = 0.0
+        self.maximo = 0.0
+        SENTENCIAS[nombre] = self
+
+    def _registrar(self, inicio):
+        segundos = time.perf_counter() - inicio
+        with _lock:
+            self.llamadas += 1
+            self.segundos += segundos
+            if segundos > self.maximo:
+                self.maximo = segundos
+        for observador in _OBSERVADORES:
+            observador(self.nombre, segundos)
+
+    def ejecutar(self, conexion, **parametros):
+        """Ejecuta y devuelve el resultado tal cual (para INSERT/UPDATE/DELETE y rowcount)."""
+        inicio = time.perf_counter()
+        try:
+            return conexion.execute(self.sql, parametros)
+        finally:
+            self._registrar(inicio)
+
+    def filas(self, conexion, **parametros):
+        """Todas las filas (acceso por atributo: fila.codigo)."""
+        inicio = time.perf_counter()
+        try:
+            return conexion.execute(self.sql, parametros).all()
+        finally:
+            self._registrar(inicio)
+
+    def primera(self, conexion, **parametros):
+        inicio = time.perf_counter()
+        try:
+            return conexion.execute(self.sql, parametros).first()
+        finally:
+            self._registrar(inicio)
+
+    def escalar(self, conexion, **parametros):
+        inicio = time.perf_counter()
+        try:
+            return conexion.execute(self.sql, parametros).scalar()
+        finally:
+            self._registrar(inicio)
+
+    def dicts(self, conexion, **parametros):
+        """Lista de diccionarios, lista para jsonify."""
+        inicio = time.perf_counter()
+        try:
+            resultado = conexion.execute(self.sql, parametros)
+            claves = tuple(resultado.keys())
+            return [dict(zip(claves, fila)) for fila in resultado.all()]
+        finally:
+            self._registrar(inicio)
+
+    def dict(self, conexion, **parametros):
+        """La primera fila como diccionario, o None."""
+        inicio = time.perf_counter()
+        try:
+            resultado = conexion.execute(self.sql, parametros)
+            fila = resultado.first()
+            return dict(zip(resultado.keys(), fila)) if fila is not None else None
+        finally:
+            self._registrar(inicio)
+
+
+def observar(funcion):
+    """Registra 'funcion(nombre, segundos)', que se llama después de cada ejecución."""
+    _OBSERVADORES.append(funcion)
+    return funcion
+
+
+def estadisticas():
+    """Llamadas, tiempo total, medio y máximo por sentencia, de la más costosa a la menos."""
+    with _lock:
+        datos = [{
+            "sentencia": s.nombre,
+            "llamadas": s.llamadas,
+            "total_ms": round(s.segundos * 1000, 2),
+            "medio_ms": round(s.segundos * 1000 / s.llamadas, 3) if s.llamadas else 0.0,
+            "maximo_ms": round(s.maximo * 1000, 2),
+        } for s in SENTENCIAS.values()]
+    return sorted(datos, key=lambda d: d["total_ms"], reverse=True)
+
+
+def configurar_url(url, connect_args):
+    """(url, connect_args) para create_engine, con sentencias preparadas si se pidieron."""
+    if os.environ.get('BD_SENTENCIAS_PREPARADAS', '0').lower() not in ('1', 'si', 'true'):
+        return url, connect_args
+    url_bd = make_url(url)
+    if url_bd.get_backend_name() != 'postgresql':
+        return url, connect_args
+    if url_bd.port == 6543:
+        print("ADVERTENCIA: BD_SENTENCIAS_PREPARADAS ignorado: el pooler en modo transacción (puerto 6543) no admite sentencias preparadas.")
+        return url, connect_args
+    umbral = int(os.environ.get('BD_UMBRAL_PREPARACION', 2))
+    print(f"INFO: Sentencias preparadas en el servidor con psycopg 3 (después de {umbral} ejecuciones).")
+    return url_bd.set(drivername='postgresql+psycopg'), dict(connect_args, prepare_threshold=umbral)
+
+
+def crear_motor(url, connect_args):
+    """Engine de SQLAlchemy para `url`; connect_args son de libpq y solo se pasan a PostgreSQL."""
+    if make_url(url).get_backend_name() != 'postgresql':
+        return create_engine(url)
+    url, connect_args = configurar_url(url, connect_args)
+    return create_engine(url, connect_args=connect_args)
+
+
+# ==============================================================================
+#   Usuarios y acceso
+# ==============================================================================
+USUARIO_POR_NOMBRE = Sentencia('usuario_por_nombre', """
+    SELECT id, username, password_hash, role FROM usuarios WHERE LOWER(username) = LOWER(:username)
+""")
+USUARIO_ID_POR_NOMBRE = Sentencia('usuario_id_por_nombre', """
+    SELECT id FROM usuarios WHERE LOWER(username) = LOWER(:username)
+""")
+USUARIO_POR_ID = Sentencia('usuario_por_id', "SELECT id, username FROM usuarios WHERE id = :id")
+USUARIO_NOMBRE_POR_ID = Sentencia('usuario_nombre_por_id', "SELECT username FROM usuarios WHERE id = :id")
+USUARIOS_LISTADO = Sentencia('usuarios_listado', "SELECT id, username, role FROM usuarios ORDER BY username ASC")
+USUARIOS_OPCIONES = Sentencia('usuarios_opciones', "SELECT id, username FROM usuarios ORDER BY username")
+USUARIO_INSERTAR = Sentencia('usuario_insertar', """
+    INSERT INTO usuarios (username, password_hash, role) VALUES (:username, :password_hash, :role)
+""")
+USUARIO_ELIMINAR = Sentencia('usuario_eliminar', "DELETE FROM usuarios WHERE id = :id")
+
+DISPOSITIVO_AUTORIZADO = Sentencia('dispositivo_autorizado', """
+    SELECT id FROM dispositivos_autorizados WHERE usuario_id = :user_id AND huella_dispositivo = :fingerprint
+""")
+DISPOSITIVOS_DE_USUARIO = Sentencia('dispositivos_de_usuario', """
+    SELECT id, usuario_id, huella_dispositivo, descripcion, created_at
+    FROM dispositivos_autorizados WHERE usuario_id = :id ORDER BY created_at DESC
+""")
+DISPOSITIVO_INSERTAR = Sentencia('dispositivo_insertar', """
+    INSERT INTO dispositivos_autorizados (usuario_id, huella_dispositivo, descripcion) VALUES (:uid, :huella, :desc)
+""")
+DISPOSITIVO_ELIMINAR = Sentencia('dispositivo_eliminar', "DELETE FROM dispositivos_autorizados WHERE id = :did")
+
+SOLICITUD_PENDIENTE = Sentencia('solicitud_pendiente', """
+    SELECT id FROM solicitudes_acceso
+    WHERE usuario_id = :user_id AND huella_dispositivo = :fingerprint AND estado = 'pendiente'
+""")
+SOLICITUDES_PENDIENTES_DE_USUARIO = Sentencia('solicitudes_pendientes_de_usuario', """
+    SELECT id, usuario_id, huella_dispositivo, user_agent_info, estado, created_at
+    FROM solicitudes_acceso WHERE usuario_id = :id AND estado = 'pendiente' ORDER BY created_at DESC
+""")
+SOLICITUDES_PENDIENTES_TOTAL = Sentencia('solicitudes_pendientes_total', """
+    SELECT COUNT(id) FROM solicitudes_acceso WHERE estado = 'pendiente'
+""")
+SOLICITUDES_HISTORIAL = Sentencia('solicitudes_historial', """
+    SELECT s.id, s.estado, s.huella_dispositivo, s.user_agent_info, s.created_at, u.username
+    FROM solicitudes_acceso s
+    JOIN usuarios u ON s.usuario_id = u.id
+    ORDER BY s.created_at DESC
+""")
+SOLICITUD_APROBAR = Sentencia('solicitud_aprobar', "UPDATE solicitudes_acceso SET estado = 'aprobada' WHERE id = :sid")
+SOLICITUD_RECHAZAR = Sentencia('solicitud_rechazar', "UPDATE solicitudes_acceso SET estado = 'rechazada' WHERE id = :sid")
+SOLICITUD_ELIMINAR = Sentencia('solicitud_eliminar', "DELETE FROM solicitudes_acceso WHERE id = :sid")
+
+# ==============================================================================
+#   Dashboard
+# ==============================================================================
+USUARIOS_TOTAL = Sentencia('usuarios_total', "SELECT COUNT(id) FROM usuarios")
+DISPOSITIVOS_TOTAL = Sentencia('dispositivos_total', "SELECT COUNT(id) FROM dispositivos_autorizados")
+USUARIOS_POR_ROL = Sentencia('usuarios_por_rol', "SELECT role, COUNT(id) as count FROM usuarios GROUP BY role")
+ACTIVIDAD_RECIENTE = Sentencia('actividad_reciente', """
+    SELECT u.username, s.estado, s.created_at
+    FROM solicitudes_acceso s
+    JOIN usuarios u ON s.usuario_id = u.id
+    ORDER BY s.created_at DESC
+    LIMIT 5
+""")
+
+# ==============================================================================
+#   Plantillas
+# ==============================================================================
+# 'plantillas' también tiene la columna de búsqueda (tsvector), que no debe llegar
+# a las respuestas JSON ni al PDF.
+_COLUMNAS_PLANTILLA = ', '.join(busqueda_plantillas.COLUMNAS_PLANTILLA)
+
+PLANTILLA_POR_ID = Sentencia('plantilla_por_id', f"SELECT {_COLUMNAS_PLANTILLA} FROM plantillas WHERE id = :id")
+PLANTILLAS_TODAS = Sentencia('plantillas_todas', f"SELECT {_COLUMNAS_PLANTILLA} FROM plantillas ORDER BY id ASC")
+PLANTILLAS_REGISTROS = Sentencia('plantillas_registros', """
+    SELECT id, tipo_atencion, codigo_prestacional FROM plantillas ORDER BY id ASC
+""")
+PLANTILLAS_INDICE = Sentencia('plantillas_indice', f"""
+    SELECT {', '.join(('id', 'tipo_atencion', 'codigo_prestacional') + CAMPOS_INDEXADOS)} FROM plantillas
+""")
+PLANTILLA_RESUMEN = Sentencia('plantilla_resumen', "SELECT id, tipo_atencion FROM plantillas WHERE id = :id")
+PLANTILLA_ACTUALIZAR = Sentencia('plantilla_actualizar', """
+    UPDATE plantillas SET
+        tipo_atencion = :tipo_atencion, codigo_prestacional = :codigo_prestacional,
+        descripcion_prestacional = :descripcion_prestacional, actividades_preventivas = :actividades_preventivas,
+        diagnostico_principal = :diagnostico_principal, diagnosticos_excluyentes = :diagnosticos_excluyentes,
+        diagnosticos_complementarios = :diagnosticos_complementarios, medicamentos_relacionados = :medicamentos_relacionados,
+        insumos_relacionados = :insumos_relacionados, procedimientos_obligatorios = :procedimientos_obligatorios,
+        procedimientos_excluyentes = :procedimientos_excluyentes, otros_procedimientos = :otros_procedimientos,
+        observaciones = :observaciones
+    WHERE id = :id
+""")
+PLANTILLA_INSERTAR = Sentencia('plantilla_insertar', """
+    INSERT INTO plantillas (tipo_atencion, codigo_prestacional, descripcion_prestacional, actividades_preventivas,
+                            diagnostico_principal, diagnosticos_excluyentes, diagnosticos_complementarios,
+                            medicamentos_relacionados, insumos_relacionados, procedimientos_obligatorios,
+                            procedimientos_excluyentes, otros_procedimientos, observaciones)
+    VALUES (:tipo_atencion, :codigo_prestacional, :descripcion_prestacional, :actividades_preventivas,
+            :diagnostico_principal, :diagnosticos_excluyentes, :diagnosticos_complementarios,
+            :medicamentos_relacionados, :insumos_relacionados, :procedimientos_obligatorios,
+            :procedimientos_excluyentes, :otros_procedimientos, :observaciones)
+    RETURNING id
+""")
+PLANTILLA_ELIMINAR = Sentencia('plantilla_eliminar', "DELETE FROM plantillas WHERE id = :id")
+
+# ==============================================================================
+#   Catálogos (diagnósticos, items médicos) y sugerencias
+# ==============================================================================
+DIAGNOSTICOS_BUSCAR = Sentencia('diagnosticos_buscar', """
+    SELECT codigo, descripcion FROM diagnosticos WHERE codigo ILIKE :query OR descripcion ILIKE :query LIMIT 50
+""")
+DIAGNOSTICOS_TODOS = Sentencia('diagnosticos_todos', "SELECT codigo, descripcion FROM diagnosticos ORDER BY codigo")
+ITEMS_BUSCAR = Sentencia('items_buscar', """
+    SELECT codigo, descripcion, tipo FROM items_medicos WHERE descripcion ILIKE :query OR codigo ILIKE :query LIMIT 50
+""")
+ITEMS_TODOS = Sentencia('items_todos', "SELECT codigo, descripcion, tipo FROM items_medicos ORDER BY codigo")
+
+SUGERENCIAS_LISTADO = Sentencia('sugerencias_listado', """
+    SELECT s.id, s.contenido, s.estado, s.created_at, u.username
+    FROM sugerencias s
+    JOIN usuarios u ON s.usuario_id = u.id
+    ORDER BY s.created_at DESC
+""")
+
+PING = Sentencia('ping', "SELECT 1")
+
+
+if __name__ == '__main__':
+    # Benchmark de las sentencias más usadas: 'text()' armado en cada llamada con
+    # 'dict(row._mapping)' por fila (como antes) contra la sentencia del repositorio.
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark del repositorio de consultas.")
+    parser.add_argument('--bd', default=None, help="URL de BD (por defecto, SQLite temporal).")
+    parser.add_argument('--repeticiones', type=int, default=2000)
+    args = parser.parse_args()
+
+    from entorno_benchmark import preparar_app
+    _, motor, _ = preparar_app(args.bd, rondas_bcrypt=4)
+
+    casos = [
+        (USUARIO_POR_NOMBRE, {'username': 'usuario042'}),
+        (DISPOSITIVO_AUTORIZADO, {'user_id': 42, 'fingerprint': 'huella-x'}),
+        (DIAGNOSTICOS_BUSCAR, {'query': '%diabetes%'}),
+        (ITEMS_BUSCAR, {'query': '%paracetamol%'}),
+        (PLANTILLA_POR_ID, {'id': 7}),
+        (SOLICITUDES_PENDIENTES_TOTAL, {}),
+        (PLANTILLAS_REGISTROS, {}),
+    ]
+
+    def como_antes(conexion, sql, parametros):
+        return [dict(fila._mapping) for fila in conexion.execute(text(sql), parametros)]
+
+    print(f"{'sentencia':<32}{'antes (ms)':>12}{'repositorio (ms)':>18}{'mejora':>9}")
+    with motor.connect() as conexion:
+        for sentencia, parametros in casos:
+            repeticiones = max(20, args.repeticiones // 20) if sentencia is PLANTILLAS_REGISTROS else args.repeticiones
+            assert como_antes(conexion, sentencia.sql.text, parametros) == sentencia.dicts(conexion, **parametros)
+            inicio = time.perf_counter()
+            for _ in range(repeticiones):
+                como_antes(conexion, sentencia.sql.text, parametros)
+            antes = (time.perf_counter() - inicio) / repeticiones * 1000
+            inicio = time.perf_counter()
+            for _ in range(repeticiones):
+                sentencia.dicts(conexion, **parametros)
+            ahora = (time.perf_counter() - inicio) / repeticiones * 1000
+            print(f"{sentencia.nombre:<32}{antes:>12.3f}{ahora:>18.3f}{antes / ahora:>8.2f}x")
+
+    print()
+    for fila in estadisticas()[:len(casos)]:
+        print(f"{fila['sentencia']:<32} llamadas={fila['llamadas']:<6} medio={fila['medio_ms']:.3f} ms  máximo={fila['maximo_ms']:.2f} ms")
+
+    # Los motores reales de index.py se arman con 'crear_motor': tiene que aceptar
+    # las URL de producción (con y sin sentencias preparadas) y conectar a SQLite.
+    for preparadas in ('0', '1'):
+        os.environ['BD_SENTENCIAS_PREPARADAS'] = preparadas
+        motor_pg = crear_motor('postgresql://u:p@localhost:5432/bd', {'client_encoding': 'utf8', 'connect_timeout': 3})
+        assert motor_pg.dialect.name == 'postgresql'
+    motor_sqlite = crear_motor(str(motor.url), {'client_encoding': 'utf8'})
+    with motor_sqlite.connect() as conexion:
+        assert conexion.execute(text("SELECT 1")).scalar() == 1
+    print("OK: crear_motor arma los motores de PostgreSQL y SQLite.")
@@ -0,0 +1,239 @@
+# ==============================================================================
+#           REGISTRO DE CONSULTAS LENTAS (CON PLAN DE EJECUCIÓN)
+# ==============================================================================
+#  Se engancha a todos los motores de SQLAlchemy. Cada consulta que supera el
+#  umbral (UMBRAL_CONSULTA_LENTA_MS) se guarda en un buffer circular acotado con:
+#    - el SQL normalizado (literales -> ?, espacios colapsados) y su huella;
+#    - la forma de los parámetros (nombre -> tipo, largo de textos y listas),
+#      nunca sus valores: pueden ser contraseñas o datos de pacientes;
+#    - la duración y la ruta de Flask que la ejecutó.
+#
+#  El plan de las lecturas (SELECT/WITH) se obtiene fuera de la petición, en un
+#  hilo aparte y con otra conexión: EXPLAIN (ANALYZE, BUFFERS) en PostgreSQL
+#  (ANALYZE vuelve a ejecutar la sentencia, por eso nunca se aplica a escrituras
+#  y la transacción se descarta) o EXPLAIN QUERY PLAN en SQLite. Cada huella se
+#  explica como máximo una vez cada INTERVALO_EXPLAIN segundos.
+#
+#  El driver interpola los parámetros antes de EXPLAIN, así que el plan trae los
+#  valores como literales; antes de guardarlo se reemplazan por '?' los textos
+#  entre comillas y los números de las líneas de condición (Filter, Index Cond...).
+#  Los tiempos, filas y costos del plan se conservan.
+# ==============================================================================
+
+import hashlib
+import os
+import queue
+import re
+import threading
+import time
+from collections import deque
+
+from flask import has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+UMBRAL_MS = float(os.environ.get('UMBRAL_CONSULTA_LENTA_MS', '200'))
+CAPACIDAD = int(os.environ.get('CONSULTAS_LENTAS_CAPACIDAD', '500'))
+EXPLICAR = os.environ.get('EXPLAIN_CONSULTAS_LENTAS', '1') == '1'
+INTERVALO_EXPLAIN = 600
+
+_TEXTO = re.compile(r"'(?:[^']|'')*'")
+_NUMERO = re.compile(r'\b\d+(?:\.\d+)?\b')
+_LISTA_IN = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_ESPACIOS = re.compile(r'\s+')
+_ES_LECTURA = re.compile(r'^\s*(SELECT|WITH)\b', re.IGNORECASE)
+# Líneas del plan de PostgreSQL que repiten expresiones de la consulta (con sus valores).
+_LINEA_CONDICION = re.compile(
+    r'^(\s*(?:Filter|Join Filter|One-Time Filter|Index Cond|Recheck Cond|Hash Cond|Merge Cond|TID Cond'
+    r'|Run Condition|Order By|Sort Key|Presorted Key|Group Key|Cache Key|Output):)(.*)$'
+)
+
+
+def normalizar_sql(sentencia):
+    """SQL sin literales ni espacios repetidos: consultas iguales salvo valores comparten huella."""
+    sql = _TEXTO.sub('?', sentencia)
+    sql = _NUMERO.sub('?', sql)
+    sql = _LISTA_IN.sub('(?...)', sql)
+    return _ESPACIOS.sub(' ', sql).strip().rstrip(';')
+
+
+def redactar_plan(plan):
+    """Plan sin los valores de la consulta: textos -> ?, y números -> ? en las condiciones."""
+    lineas = []
+    for linea in _TEXTO.sub('?', plan).split('\n'):
+        condicion = _LINEA_CONDICION.match(linea)
+        if condicion:
+            linea = condicion.group(1) + _NUMERO.sub('?', condicion.group(2))
+        lineas.append(linea)
+    return '\n'.join(lineas)
+
+
+def huella_sql(sql_normalizado):
+    return hashlib.sha1(sql_normalizado.encode('utf-8')).hexdigest()[:12]
+
+
+def _forma_valor(valor):
+    if isinstance(valor, (str, bytes)):
+        return f"{type(valor).__name__}[{len(valor)}]"
+    if isinstance(valor, (list, tuple)):
+        return f"list[{len(valor)}]"
+    return type(valor).__name__
+
+
+def forma_parametros(parametros, varias=False):
+    """Tipos (no valores) de los parámetros enlazados."""
+    if varias:
+        parametros = list(parametros or ())
+        return {'filas': len(parametros), 'primera': forma_parametros(parametros[0]) if parametros else None}
+    if isinstance(parametros, dict):
+        return {nombre: _forma_valor(valor) for nombre, valor in parametros.items()}
+    if isinstance(parametros, (list, tuple)):
+        return [_forma_valor(valor) for valor in parametros]
+    return None
+
+
+class RegistroConsultasLentas:
+    """Buffer circular de consultas lentas y cola de planes pendientes."""
+
+    def __init__(self, umbral_ms=UMBRAL_MS, capacidad=CAPACIDAD, explicar=EXPLICAR):
+        self.umbral = umbral_ms / 1000
+        self.explicar = explicar
+        self._registros = deque(maxlen=capacidad)
+        self._planes = {}               # huella -> (texto del plan, momento)
+        self._lock = threading.Lock()
+        self._pendientes = queue.Queue(maxsize=20)
+        self._trabajador = None
+
+    # --------------------------------------------------------------------------
+    #   Enganche con SQLAlchemy
+    # --------------------------------------------------------------------------
+    def instalar(self):
+        event.listen(Engine, 'before_cursor_execute', self._antes)
+        event.listen(Engine, 'after_cursor_execute', self._despues)
+        event.listen(Engine, 'handle_error', self._fallida)
+
+    def _antes(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('lentas_inicios', []).append(time.perf_counter())
+
+    def _fallida(self, contexto):
+        if contexto.connection is not None and contexto.connection.info.get('lentas_inicios'):
+            contexto.connection.info['lentas_inicios'].pop()
+
+    def _despues(self, conn, cursor, statement, parameters, context, executemany):
+        inicios = conn.info.get('lentas_inicios')
+        if not inicios:
+            return
+        segundos = time.perf_counter() - inicios.pop()
+        if segundos < self.umbral or conn.info.get('lentas_explicando'):
+            return
+        self.registrar(conn.engine, statement, parameters, executemany, segundos,
+                       request.url_rule.rule if has_request_context() and request.url_rule else None)
+
+    # --------------------------------------------------------------------------
+    #   Registro y planes
+    # --------------------------------------------------------------------------
+    def registrar(self, motor, sentencia, parametros, varias, segundos, ruta):
+        sql = normalizar_sql(sentencia)
+        huella = huella_sql(sql)
+        with self._lock:
+            self._registros.append({
+                'huella': huella,
+                'sql': sql,
+                'parametros': forma_parametros(parametros, varias),
+                'ms': round(segundos * 1000, 2),
+                'ruta': ruta,
+                'momento': time.time(),
+            })
+            plan = self._planes.get(huella)
+            necesita_plan = (self.explicar and not varias
+                             and (plan is None or time.time() - plan[1] > INTERVALO_EXPLAIN))
+            if necesita_plan:
+                # Se reserva la huella para no encolar el mismo plan varias veces.
+                self._planes[huella] = (plan[0] if plan else None, time.time())
+        print(f"ADVERTENCIA: Consulta lenta ({segundos * 1000:.0f} ms) en {ruta or 'sin ruta'}: {sql[:120]}")
+        if necesita_plan:
+            self._encolar_plan(motor, huella, sentencia, parametros)
+
+    def _encolar_plan(self, motor, huella, sentencia, parametros):
+        if self._trabajador is None:
+            with self._lock:
+                if self._trabajador is None:
+                    self._trabajador = threading.Thread(target=self._explicar_pendientes, daemon=True,
+                                                        name='explain-consultas-lentas')
+                    self._trabajador.start()
+        try:
+            self._pendientes.put_nowait((motor, huella, sentencia, parametros))
+        except queue.Full:
+            # Se libera la reserva: el plan se intentará en la próxima consulta lenta.
+            with self._lock:
+                if self._planes.get(huella, (None,))[0] is None:
+                    self._planes.pop(huella, None)
+
+    def _explicar_pendientes(self):
+        while True:
+            motor, huella, sentencia, parametros = self._pendientes.get()
+            try:
+                plan = self.obtener_plan(motor, sentencia, parametros)
+            except Exception as e:
+                # Solo el tipo: el mensaje del driver puede citar valores de la consulta.
+                plan = f"No se pudo obtener el plan ({type(e).__name__})."
+            with self._lock:
+                self._planes[huella] = (plan, time.time())
+
+    @staticmethod
+    def obtener_plan(motor, sentencia, parametros):
+        """Plan de ejecución de una sentencia ya compilada por el driver (None si no aplica)."""
+        if not _ES_LECTURA.match(sentencia):
+            return None
+        if motor.dialect.name == 'postgresql':
+            prefijo = 'EXPLAIN (ANALYZE, BUFFERS) '
+        elif motor.dialect.name == 'sqlite':
+            prefijo = 'EXPLAIN QUERY PLAN '
+        else:
+            return None
+        with motor.connect() as conexion:
+            conexion.info['lentas_explicando'] = True
+            try:
+                filas = conexion.exec_driver_sql(prefijo + sentencia, parametros).fetchall()
+            finally:
+                conexion.info['lentas_explicando'] = False
+                conexion.rollback()
+        return redactar_plan('\n'.join(' | '.join(str(c) for c in fila) if len(fila) > 1 else str(fila[0])
+                                        for fila in filas))
+
+    # --------------------------------------------------------------------------
+    #   Consulta del registro
+    # --------------------------------------------------------------------------
+    def agrupado(self):
+        """Consultas del buffer agrupadas por huella, de mayor a menor tiempo total."""
+        with self._lock:
+            registros = list(self._registros)
+            planes = {huella: plan for huella, (plan, _) in self._planes.items()}
+        grupos = {}
+        for r in registros:
+            grupo = grupos.get(r['huella'])
+            if grupo is None:
+                grupo = grupos[r['huella']] = {
+                    'huella': r['huella'], 'sql': r['sql'], 'conteo': 0, 'total_ms': 0.0, 'max_ms': 0.0,
+                    'rutas': {}, 'parametros': r['parametros'], 'ultima': 0,
+                }
+            grupo['conteo'] += 1
+            grupo['total_ms'] += r['ms']
+            grupo['max_ms'] = max(grupo['max_ms'], r['ms'])
+            grupo['rutas'][r['ruta'] or 'sin ruta'] = grupo['rutas'].get(r['ruta'] or 'sin ruta', 0) + 1
+            grupo['ultima'] = max(grupo['ultima'], r['momento'])
+        for grupo in grupos.values():
+            grupo['total_ms'] = round(grupo['total_ms'], 2)
+            grupo['media_ms'] = round(grupo['total_ms'] / grupo['conteo'], 2)
+            grupo['plan'] = planes.get(grupo['huella'])
+        return sorted(grupos.values(), key=lambda g: g['total_ms'], reverse=True)
+
+    def vaciar(self):
+        with self._lock:
+            self._registros.clear()
+
+    def total(self):
+        return len(self._registros)
+
+    def capacidad(self):
+        return self._registros.maxlen
@@ -0,0 +1,162 @@
+# ==============================================================================
+#           ENRUTAMIENTO DE LECTURAS A UNA RÉPLICA (DATABASE_REPLICA_URL)
+# ==============================================================================
+#  Las lecturas pesadas (listados, dashboard, búsquedas) competían con el login
+#  y las escrituras en el primario. Si hay una réplica configurada:
+#    - las rutas marcadas con '@ENRUTADOR_BD.lectura' usan la réplica al llamar
+#      a 'ENRUTADOR_BD.connect()'; '.connect(lectura=True/False)' decide por
+#      consulta, sin importar la ruta;
+#    - las rutas marcadas con '@ENRUTADOR_BD.escritura' usan el primario y, si
+#      responden bien, dejan a la sesión "pegada" al primario durante
+#      VENTANA_LECTURA_PROPIA segundos: quien acaba de guardar algo lo ve aunque
+#      la réplica todavía no lo tenga;
+#    - la réplica se verifica cada INTERVALO_VERIFICACION segundos (conexión y,
+#      en PostgreSQL, retraso de replicación). Si falla o va muy atrasada, todas
+#      las lecturas vuelven al primario durante REINTENTO_REPLICA segundos.
+#
+#  Sin réplica, todo va al primario y los decoradores no cambian nada.
+# ==============================================================================
+
+import os
+import threading
+import time
+from functools import wraps
+
+from flask import g, has_request_context, session
+from sqlalchemy import text
+
+VENTANA_LECTURA_PROPIA = float(os.environ.get('REPLICA_VENTANA_LECTURA_PROPIA_S', 5))
+INTERVALO_VERIFICACION = float(os.environ.get('REPLICA_INTERVALO_VERIFICACION_S', 10))
+REINTENTO_REPLICA = float(os.environ.get('REPLICA_REINTENTO_S', 30))
+RETRASO_MAXIMO = float(os.environ.get('REPLICA_RETRASO_MAXIMO_S', 10))
+
+_CLAVE_SESION = '_escritura_bd'
+
+# Segundos de retraso de una réplica física; 0 si está al día o no es réplica.
+_SQL_RETRASO_POSTGRES = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+
+class EnrutadorBD:
+    """Elige primario o réplica para cada conexión según la ruta, la sesión y la salud."""
+
+    def __init__(self, obtener_primario, obtener_replica):
+        # Funciones, no motores: los motores se crean de forma perezosa (y el
+        # benchmark reemplaza 'index.engine').
+        self._obtener_primario = obtener_primario
+        self._obtener_replica = obtener_replica
+        self._lock = threading.Lock()
+        self._caida_hasta = 0.0
+        self._ultima_verificacion = 0.0
+        self.ultimo_error = None
+        self.retraso_s = None
+        self.lecturas_replica = 0
+        self.lecturas_primario = 0
+        self.caidas = 0
+
+    # --- Decoradores de ruta ---
+
+    def lectura(self, vista):
+        """La ruta solo lee: sus 'ENRUTADOR_BD.connect()' pueden ir a la réplica."""
+        @wraps(vista)
+        def envoltura(*args, **kwargs):
+            g.bd_lectura = True
+            return vista(*args, **kwargs)
+        return envoltura
+
+    def escritura(self, vista):
+        """La ruta escribe: usa el primario y, si responde bien, pega la sesión a él."""
+        @wraps(vista)
+        def envoltura(*args, **kwargs):
+            g.bd_lectura = False
+            respuesta = vista(*args, **kwargs)
+            estado = respuesta[1] if isinstance(respuesta, tuple) and len(respuesta) > 1 else getattr(respuesta, 'status_code', 200)
+            if isinstance(estado, int) and estado < 400:
+                self.marcar_escritura()
+            return respuesta
+        return envoltura
+
+    def marcar_escritura(self):
+        """Las lecturas de esta sesión irán al primario durante la ventana."""
+        if has_request_context():
+            session[_CLAVE_SESION] = time.time()
+
+    # --- Conexiones ---
+
+    def connect(self, lectura=None):
+        """Conexión al motor que corresponde. 'lectura=None' sigue al decorador de la ruta."""
+        if lectura is None:
+            lectura = has_request_context() and g.get('bd_lectura', False)
+        if lectura and not self._sesion_pegada():
+            replica = self._replica_sana()
+            if replica is not None:
+                try:
+                    conexion = replica.connect()
+                    self.lecturas_replica += 1
+                    return conexion
+                except Exception as e:
+                    self._marcar_caida(e)
+        self.lecturas_primario += 1
+        return self._obtener_primario().connect()
+
+    def _sesion_pegada(self):
+        if not has_request_context():
+            return False
+        return time.time() - session.get(_CLAVE_SESION, 0) < VENTANA_LECTURA_PROPIA
+
+    def _replica_sana(self):
+        replica = self._obtener_replica()
+        if replica is None:
+            return None
+        ahora = time.monotonic()
+        if ahora < self._caida_hasta:
+            return None
+        if ahora - self._ultima_verificacion >= INTERVALO_VERIFICACION and self._lock.acquire(blocking=False):
+            # Un solo hilo verifica; los demás siguen con el último resultado.
+            try:
+                self._ultima_verificacion = ahora
+                self._verificar(replica)
+            finally:
+                self._lock.release()
+        return replica if time.monotonic() >= self._caida_hasta else None
+
+    def _verificar(self, replica):
+        try:
+            with replica.connect() as conexion:
+                if replica.dialect.name == 'postgresql':
+                    self.retraso_s = float(conexion.execute(_SQL_RETRASO_POSTGRES).scalar() or 0)
+                else:
+                    conexion.execute(text("SELECT 1"))
+                    self.retraso_s = 0.0
+        except Exception as e:
+            self._marcar_caida(e)
+            return
+        if self.retraso_s > RETRASO_MAXIMO:
+            self._marcar_caida(f"retraso de replicación de {self.retraso_s:.1f} s")
+
+    def _marcar_caida(self, motivo):
+        avisar = time.monotonic() >= self._caida_hasta
+        self._caida_hasta = time.monotonic() + REINTENTO_REPLICA
+        self._ultima_verificacion = 0.0  # al terminar la pausa se verifica de nuevo
+        # Solo el tipo de error: el estado se publica en /readyz, que no requiere sesión.
+        self.ultimo_error = motivo if isinstance(motivo, str) else type(motivo).__name__
+        self.caidas += 1
+        if avisar:
+            print(f"ADVERTENCIA: Réplica de lectura no disponible ({motivo}). "
+                  f"Se usa el primario durante {REINTENTO_REPLICA:.0f} s.")
+
+    def estado(self):
+        configurada = self._obtener_replica() is not None
+        return {
+            "configurada": configurada,
+            "disponible": configurada and time.monotonic() >= self._caida_hasta,
+            "retraso_s": self.retraso_s,
+            "lecturas_replica": self.lecturas_replica,
+            "lecturas_primario": self.lecturas_primario,
+            "caidas": self.caidas,
+            "ultimo_error": self.ultimo_error,
+        }
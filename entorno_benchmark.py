@@ -0,0 +1,366 @@
+# ==============================================================================
+#           ENTORNO LOCAL PARA BENCHMARKS (BD SEMBRADA + SUPABASE FALSO)
+# ==============================================================================
+#  Reproduce, sin red, lo que la aplicación encuentra en producción:
+#    - una base de datos con volúmenes realistas: el catálogo CIE-10 completo
+#      (cie10.json, ~12k diagnósticos), decenas de miles de items médicos, miles
+#      de plantillas, usuarios, dispositivos, solicitudes de acceso y sugerencias.
+#      Por defecto es un archivo SQLite; con una URL postgresql:// se siembra un
+#      PostgreSQL local con el mismo contenido;
+#    - un cliente de Supabase falso (tabla 'procedimientos' y Storage) con una
+#      latencia de red simulada opcional.
+#
+#  La semilla es fija: dos ejecuciones generan exactamente los mismos datos.
+#  'preparar_app()' importa index.py y le conecta estas piezas.
+# ==============================================================================
+
+import json
+import os
+import random
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from itertools import islice
+from types import SimpleNamespace
+
+import bcrypt
+from sqlalchemy import create_engine, event, text
+
+import busqueda_plantillas
+
+SEMILLA = 40
+CONTRASENA_BENCHMARK = 'clave-benchmark'
+
+VOLUMENES = {
+    'items_medicos': 30_000,
+    'plantillas': 3_000,
+    'usuarios': 200,
+    'dispositivos_autorizados': 400,
+    'solicitudes_acceso': 5_000,
+    'sugerencias': 500,
+    'procedimientos': 8_000,
+}
+
+# --- Esquema: las listas de 'plantillas' son TEXT[] en PostgreSQL y JSON en SQLite ---
+_CAMPOS_LISTA = ('actividades_preventivas', 'diagnostico_principal', 'diagnosticos_excluyentes',
+                 'diagnosticos_complementarios', 'medicamentos_relacionados', 'insumos_relacionados',
+                 'procedimientos_obligatorios', 'procedimientos_excluyentes', 'otros_procedimientos')
+
+
+def _esquema(postgres):
+    serial = 'SERIAL PRIMARY KEY' if postgres else 'INTEGER PRIMARY KEY AUTOINCREMENT'
+    lista = 'TEXT[]' if postgres else 'LISTA'
+    fecha = 'TIMESTAMPTZ DEFAULT now()' if postgres else 'TIMESTAMP DEFAULT CURRENT_TIMESTAMP'
+    listas = ',\n'.join(f'            {campo} {lista}' for campo in _CAMPOS_LISTA)
+    return [
+        f"CREATE TABLE usuarios (id {serial}, username TEXT UNIQUE, password_hash TEXT, role TEXT)",
+        f"""CREATE TABLE dispositivos_autorizados (id {serial}, usuario_id INTEGER REFERENCES usuarios(id),
+            huella_dispositivo TEXT, descripcion TEXT, created_at {fecha})""",
+        f"""CREATE TABLE solicitudes_acceso (id {serial}, usuario_id INTEGER REFERENCES usuarios(id),
+            huella_dispositivo TEXT, user_agent_info TEXT, estado TEXT DEFAULT 'pendiente', created_at {fecha})""",
+        f"""CREATE TABLE sugerencias (id {serial}, usuario_id INTEGER REFERENCES usuarios(id), contenido TEXT,
+            estado TEXT DEFAULT 'pendiente', created_at {fecha})""",
+        "CREATE TABLE diagnosticos (codigo TEXT PRIMARY KEY, descripcion TEXT)",
+        "CREATE TABLE items_medicos (codigo TEXT PRIMARY KEY, descripcion TEXT, tipo TEXT)",
+        f"""CREATE TABLE plantillas (id {serial}, tipo_atencion TEXT, codigo_prestacional TEXT,
+            descripcion_prestacional TEXT,
+{listas},
+            observaciones TEXT)""",
+    ]
+
+
+# --- SQLite: adaptaciones mínimas para ejecutar el SQL de index.py tal cual ---
+sqlite3.register_adapter(list, lambda valor: json.dumps(valor, ensure_ascii=False))
+sqlite3.register_converter('LISTA', lambda valor: json.loads(valor))
+sqlite3.register_converter('TIMESTAMP', lambda valor: datetime.fromisoformat(valor.decode()))
+
+_ILIKE = re.compile(r'\bILIKE\b', re.IGNORECASE)
+
+
+def _traducir_a_sqlite(conn, cursor, statement, parameters, context, executemany):
+    # LIKE de SQLite ya ignora mayúsculas/minúsculas (ASCII), como ILIKE.
+    return _ILIKE.sub('LIKE', statement), parameters
+
+
+def crear_motor(url=None):
+    """Motor de la BD de benchmark: SQLite en un archivo temporal, o la URL indicada."""
+    if url and not url.startswith('sqlite'):
+        return create_engine(url, pool_size=10, max_overflow=10)
+    url = url or f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='benchmark_'), 'gestor.db')}"
+    motor = create_engine(url, connect_args={'detect_types': sqlite3.PARSE_DECLTYPES,
+                                             'check_same_thread': False, 'timeout': 30})
+    event.listen(motor, 'before_cursor_execute', _traducir_a_sqlite, retval=True)
+
+    @event.listens_for(motor, 'connect')
+    def _configurar(conexion, _registro):
+        conexion.execute('PRAGMA journal_mode=WAL')
+        conexion.execute('PRAGMA synchronous=NORMAL')
+    return motor
+
+
+# ==============================================================================
+#   Generación de datos
+# ==============================================================================
+_PALABRAS_ITEMS = ('PARACETAMOL', 'AMOXICILINA', 'IBUPROFENO', 'METFORMINA', 'ENALAPRIL', 'SULFATO FERROSO',
+                   'OMEPRAZOL', 'SALBUTAMOL', 'LORATADINA', 'JERINGA', 'GUANTE', 'GASA', 'SONDA', 'CATETER',
+                   'AGUJA', 'ALGODON', 'VENDA', 'SUERO', 'CLORURO DE SODIO', 'ACIDO FOLICO')
+_PRESENTACIONES = ('500 mg TAB', '250 mg/5 mL SUS 60 mL', '10 mg TAB', '1 g INY', '5 mL x 21G', 'N° 7 1/2',
+                   '10 cm x 10 cm', '0.9% x 1 L', '100 mcg/dosis AER 200 D')
+
+_OBSERVACIONES = ('<p>Registrar <b>peso</b>, talla y hemoglobina. Niño/niña: control de crecimiento.</p>',
+                  '<p>Gestante: control prenatal, ácido fólico y sulfato ferroso.</p>',
+                  '<p>Adulto mayor: valoración clínica y tamizaje de <i>hipertensión</i>.</p>',
+                  '<p>Consejería en salud sexual y reproductiva.</p>',
+                  '')
+
+
+def _datos(aleatorio, rondas_bcrypt):
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cie10.json'), encoding='utf-8') as f:
+        diagnosticos = [{'codigo': d['codigo_cie10'], 'descripcion': d['descripcion_oficial']} for d in json.load(f)]
+
+    items = []
+    for i in range(VOLUMENES['items_medicos']):
+        items.append({'codigo': f"{i:05d}", 'tipo': 'MEDICAMENTO' if i % 3 else 'INSUMO',
+                      'descripcion': f"{aleatorio.choice(_PALABRAS_ITEMS)} {aleatorio.choice(_PRESENTACIONES)} #{i}"})
+
+    # Un solo hash para todos: bcrypt es deliberadamente lento y la semilla sería eterna.
+    hash_comun = bcrypt.hashpw(CONTRASENA_BENCHMARK.encode(), bcrypt.gensalt(rounds=rondas_bcrypt)).decode()
+    usuarios = [{'username': 'admin', 'password_hash': hash_comun, 'role': 'administrador'}]
+    usuarios += [{'username': f'usuario{i:03d}', 'password_hash': hash_comun, 'role': 'usuario'}
+                 for i in range(1, VOLUMENES['usuarios'])]
+
+    dispositivos = [{'usuario_id': 2 + i % (VOLUMENES['usuarios'] - 1), 'huella_dispositivo': f'huella-{i}',
+                     'descripcion': 'Chrome / Windows'} for i in range(VOLUMENES['dispositivos_autorizados'])]
+
+    inicio = datetime(2025, 1, 1)
+    solicitudes = [{'usuario_id': aleatorio.randint(2, VOLUMENES['usuarios']), 'huella_dispositivo': f'nueva-{i}',
+                    'user_agent_info': 'Mozilla/5.0 (Linux; Android 14)',
+                    'estado': aleatorio.choice(('pendiente', 'aprobada', 'rechazada', 'aprobada')),
+                    'created_at': inicio + timedelta(minutes=97 * i)} for i in range(VOLUMENES['solicitudes_acceso'])]
+
+    sugerencias = [{'usuario_id': aleatorio.randint(1, VOLUMENES['usuarios']),
+                    'contenido': f"Sugerencia {i}: agregar el diagnóstico {aleatorio.choice(diagnosticos)['codigo']}."}
+                   for i in range(VOLUMENES['sugerencias'])]
+
+    from index import ACTIVIDADES_PREVENTIVAS_MAP, CODIGOS_PRESTACIONALES_CATEGORIZADOS
+    actividades = list(ACTIVIDADES_PREVENTIVAS_MAP.items())
+    prestacionales = CODIGOS_PRESTACIONALES_CATEGORIZADOS
+    plantillas = []
+    for i in range(VOLUMENES['plantillas']):
+        prestacional = aleatorio.choice(prestacionales)
+        plantilla = {
+            'tipo_atencion': f"Atención {prestacional['descripcion'][:40]} #{i}",
+            'codigo_prestacional': prestacional['codigo'],
+            'descripcion_prestacional': prestacional['descripcion'],
+            'actividades_preventivas': [d for _, d in aleatorio.sample(actividades, 5)],
+            'diagnostico_principal': [f"{d['codigo']} - {d['descripcion']}" for d in aleatorio.sample(diagnosticos, 1)],
+            'diagnosticos_excluyentes': [d['codigo'] for d in aleatorio.sample(diagnosticos, 2)],
+            'diagnosticos_complementarios': [d['codigo'] for d in aleatorio.sample(diagnosticos, 3)],
+            'medicamentos_relacionados': [it['descripcion'] for it in aleatorio.sample(items, 4)],
+            'insumos_relacionados': [it['descripcion'] for it in aleatorio.sample(items, 3)],
+            'procedimientos_obligatorios': ['99203', '85018'],
+            'procedimientos_excluyentes': [],
+            'otros_procedimientos': ['90585'],
+            'observaciones': _OBSERVACIONES[i % len(_OBSERVACIONES)],
+        }
+        plantillas.append(plantilla)
+
+    procedimientos = [{'cod_cpms': f"{99000 + i}", 'nombre_prest': f"{aleatorio.choice(_PALABRAS_ITEMS)} PROCEDIMIENTO {i}",
+                       'tarifa_sis': round(aleatorio.uniform(5, 500), 2)} for i in range(VOLUMENES['procedimientos'])]
+
+    return {
+        'usuarios': usuarios, 'dispositivos_autorizados': dispositivos, 'solicitudes_acceso': solicitudes,
+        'sugerencias': sugerencias, 'diagnosticos': diagnosticos, 'items_medicos': items, 'plantillas': plantillas,
+    }, procedimientos
+
+
+def sembrar(motor, rondas_bcrypt=12, semilla=SEMILLA):
+    """Crea las tablas y las llena. Devuelve las filas de 'procedimientos' para el Supabase falso."""
+    aleatorio = random.Random(semilla)
+    tablas, procedimientos = _datos(aleatorio, rondas_bcrypt)
+    postgres = motor.dialect.name == 'postgresql'
+    inicio = time.perf_counter()
+    with motor.begin() as conexion:
+        for tabla in reversed(list(tablas)):
+            conexion.execute(text(f"DROP TABLE IF EXISTS {tabla}" + (" CASCADE" if postgres else "")))
+        for sentencia in _esquema(postgres):
+            conexion.execute(text(sentencia))
+        for tabla, filas in tablas.items():
+            columnas = list(filas[0])
+            conexion.execute(text(f"INSERT INTO {tabla} ({', '.join(columnas)}) VALUES ({', '.join(':' + c for c in columnas)})"),
+                             filas)
+        if postgres:
+            conexion.execute(text("ANALYZE"))
+    busqueda_plantillas.migrar(motor)
+    print(f"INFO: Base de benchmark sembrada en {time.perf_counter() - inicio:.1f} s: "
+          + ", ".join(f"{tabla}={len(filas)}" for tabla, filas in tablas.items()))
+    return procedimientos
+
+
+# ==============================================================================
+#   Supabase falso (tabla 'procedimientos' y Storage)
+# ==============================================================================
+class _Consulta:
+    def __init__(self, filas, latencia, resultados=None):
+        self._filas = filas
+        self._latencia = latencia
+        self._columnas = None
+        self._filtros = []
+        self._expresiones = []
+        self._desde, self._hasta = 0, None
+        self._orden = None
+        # Resultados ya calculados (compartidos por el SupabaseFalso): el filtrado en
+        # Python no debe pesar en las mediciones de la aplicación.
+        self._resultados = resultados if resultados is not None else {}
+
+    def select(self, *columnas):
+        self._columnas = columnas if columnas and columnas != ('*',) else None
+        return self
+
+    def or_(self, expresion):
+        # 'nombre_prest.ilike.%X%,cod_cpms.ilike.%X%' (el único filtro que usa la aplicación).
+        condiciones = []
+        for parte in expresion.split(','):
+            columna, operador, patron = parte.split('.', 2)
+            if operador != 'ilike':
+                raise NotImplementedError(f"Operador no soportado en el Supabase falso: {operador}")
+            condiciones.append((columna, patron.strip('%').lower()))
+        self._expresiones.append(expresion)
+        self._filtros.append(lambda fila: any(p in str(fila[c]).lower() for c, p in condiciones))
+        return self
+
+    def order(self, columna, desc=False):
+        self._orden = (columna, desc)
+        return self
+
+    def limit(self, cantidad):
+        self._hasta = self._desde + cantidad
+        return self
+
+    def range(self, desde, hasta):
+        self._desde, self._hasta = desde, hasta + 1
+        return self
+
+    def execute(self):
+        if self._latencia:
+            time.sleep(self._latencia)
+        clave = (id(self._filas), self._columnas, tuple(self._expresiones), self._orden, self._desde, self._hasta)
+        filas = self._resultados.get(clave)
+        if filas is None:
+            candidatas = (f for f in self._filas if all(filtro(f) for filtro in self._filtros))
+            if self._orden:
+                columna, desc = self._orden
+                candidatas = sorted(candidatas, key=lambda f: f[columna], reverse=desc)
+            filas = list(islice(candidatas, self._desde, self._hasta))
+            if self._columnas:
+                filas = [{c: f[c] for c in self._columnas} for f in filas]
+            self._resultados[clave] = filas
+        return SimpleNamespace(data=[dict(f) for f in filas])
+
+
+class _BucketFalso:
+    def __init__(self, latencia):
+        self._latencia = latencia
+        self._objetos = {}
+        self._lock = threading.Lock()
+
+    def upload(self, path, file, file_options=None):
+        time.sleep(self._latencia)
+        contenido = file if isinstance(file, bytes) else file.read()
+        opciones = file_options or {}
+        with self._lock:
+            self._objetos[path] = {'contenido': contenido, 'metadata': opciones.get('metadata') or {},
+                                   'updated_at': datetime.utcnow().isoformat() + 'Z'}
+        return SimpleNamespace(path=path)
+
+    def info(self, path):
+        time.sleep(self._latencia)
+        objeto = self._objetos.get(path)
+        if objeto is None:
+            raise FileNotFoundError(path)
+        return {'name': path, 'size': len(objeto['contenido']), 'metadata': objeto['metadata']}
+
+    def list(self, path=None, options=None):
+        time.sleep(self._latencia)
+        opciones = options or {}
+        desde, limite = opciones.get('offset', 0), opciones.get('limit', 100)
+        with self._lock:
+            nombres = sorted(self._objetos)[desde:desde + limite]
+            return [{'name': n, 'updated_at': self._objetos[n]['updated_at'],
+                     'metadata': {'size': len(self._objetos[n]['contenido'])}} for n in nombres]
+
+    def download(self, path):
+        time.sleep(self._latencia)
+        return self._objetos[path]['contenido']
+
+
+class SupabaseFalso:
+    """Implementa solo la parte del cliente de Supabase que usa la aplicación."""
+
+    def __init__(self, procedimientos, latencia_ms=0):
+        self._tablas = {'procedimientos': procedimientos}
+        self._latencia = latencia_ms / 1000
+        self._buckets = {}
+        self._resultados = {}
+        self.storage = SimpleNamespace(from_=self._bucket)
+
+    def table(self, nombre):
+        return _Consulta(self._tablas[nombre], self._latencia, self._resultados)
+
+    def _bucket(self, nombre):
+        if nombre not in self._buckets:
+            self._buckets[nombre] = _BucketFalso(self._latencia)
+        return self._buckets[nombre]
+
+
+def transporte_supabase_async(supabase, latencia_ms=0):
+    """Transporte de httpx que responde como la API REST de Supabase (para 'busquedas_async.py')."""
+    import asyncio
+
+    import httpx
+
+    async def responder(peticion):
+        if latencia_ms:
+            await asyncio.sleep(latencia_ms / 1000)
+        tabla = peticion.url.path.rsplit('/', 1)[-1]
+        parametros = peticion.url.params
+        consulta = _Consulta(supabase._tablas[tabla], 0, supabase._resultados).select(*parametros.get('select', '*').split(','))
+        if 'or' in parametros:
+            consulta.or_(parametros['or'].strip('()'))
+        if 'limit' in parametros:
+            consulta.limit(int(parametros['limit']))
+        return httpx.Response(200, json=consulta.execute().data)
+
+    return httpx.MockTransport(responder)
+
+
+# ==============================================================================
+#   Conexión con la aplicación
+# ==============================================================================
+def preparar_app(url_bd=None, rondas_bcrypt=12, latencia_supabase_ms=0, sembrar_bd=True, url_replica=None):
+    """Importa index.py y reemplaza su motor y sus clientes de Supabase por los del entorno local.
+
+    'url_replica' (opcional) es la réplica de lectura de 'url_bd' (p. ej. un segundo
+    PostgreSQL en streaming); no se siembra, se supone que replica al primario.
+
+    Devuelve (modulo_index, motor, supabase_falso).
+    """
+    os.environ.setdefault('DATABASE_URL', 'sqlite://')
+    import index
+
+    motor = crear_motor(url_bd)
+    procedimientos = sembrar(motor, rondas_bcrypt) if sembrar_bd else []
+    supabase = SupabaseFalso(procedimientos, latencia_supabase_ms)
+
+    # Las rutas leen estos nombres globales en cada petición.
+    index.engine = index.RecursoPerezoso(lambda: motor)
+    if url_replica:
+        replica = crear_motor(url_replica)
+        index.engine_replica = index.RecursoPerezoso(lambda: replica)
+    index.SUPABASE_CLIENTE = index.RecursoPerezoso(lambda: supabase)
+    index.SUPABASE_SERVICIO = index.RecursoPerezoso(lambda: supabase)
+    index.app.config['SESSION_COOKIE_SECURE'] = False
+    return index, motor, supabase
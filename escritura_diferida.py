@@ -0,0 +1,344 @@
+# ==============================================================================
+#           ESCRITURA DIFERIDA (WRITE-BEHIND) DE INSERCIONES NO CRÍTICAS
+# ==============================================================================
+#  Las sugerencias y las solicitudes de acceso de un dispositivo nuevo no tienen
+#  que estar en la base de datos antes de responder al usuario. En vez de abrir
+#  una conexión y hacer COMMIT dentro de la petición, se encolan aquí y un hilo
+#  las escribe en lotes:
+#    - un INSERT de varias filas por tabla y un solo COMMIT por lote;
+#    - el lote se escribe al juntar TAMANO_LOTE filas o INTERVALO segundos
+#      después de la primera, lo que ocurra antes;
+#    - si la cola está llena, la fila se escribe en el momento (síncrona);
+#    - si un lote falla se reintenta; si sigue fallando, se escribe fila por fila
+#      para que una fila inválida no arrastre a las demás;
+#    - al terminar el proceso (atexit, que gunicorn ejecuta al recibir SIGTERM)
+#      se vacía la cola antes de salir.
+#
+#  Lo que está en la cola vive en memoria: un 'kill -9' pierde como máximo las
+#  filas de los últimos INTERVALO segundos. Por eso solo se usa para escrituras
+#  que el usuario puede repetir. En Vercel (variable VERCEL) la función se
+#  congela al responder y un hilo de fondo no es fiable: ahí, salvo que se fuerce
+#  ESCRITURA_DIFERIDA=1, las escrituras siguen siendo síncronas.
+#
+#  'python escritura_diferida.py' mide el rendimiento y prueba el vaciado al
+#  apagar (SIGTERM) y la recuperación ante fallos de la base de datos; las
+#  pruebas también corren con pytest (tests/test_escritura_diferida.py).
+# ==============================================================================
+
+import atexit
+import os
+import queue
+import threading
+import time
+
+from sqlalchemy import text
+
+TAMANO_LOTE = int(os.environ.get('ESCRITURA_DIFERIDA_LOTE', '100'))
+INTERVALO = float(os.environ.get('ESCRITURA_DIFERIDA_INTERVALO_S', '1'))
+CAPACIDAD = int(os.environ.get('ESCRITURA_DIFERIDA_CAPACIDAD', '5000'))
+ACTIVA = os.environ.get('ESCRITURA_DIFERIDA', '0' if os.environ.get('VERCEL') else '1') == '1'
+REINTENTOS = (0.2, 1.0, 3.0)
+
+_FIN = object()
+
+
+class ColaEscrituraDiferida:
+    """Cola de inserciones en tablas conocidas, escritas por lotes en segundo plano."""
+
+    def __init__(self, obtener_motor, tablas, tamano_lote=TAMANO_LOTE, intervalo=INTERVALO,
+                 capacidad=CAPACIDAD, activa=ACTIVA, reintentos=REINTENTOS):
+        # 'tablas': {nombre: (columnas...)}. Solo estas tablas y columnas llegan al SQL.
+        self._obtener_motor = obtener_motor
+        self._tablas = {tabla: tuple(columnas) for tabla, columnas in tablas.items()}
+        self.tamano_lote = tamano_lote
+        self.intervalo = intervalo
+        self.activa = activa
+        self._reintentos = reintentos
+        self._cola = queue.Queue(maxsize=capacidad)
+        self._claves = set()            # claves de filas encoladas y aún no escritas
+        self._lock = threading.Lock()
+        self._hilo = None
+        self._pid = None
+        self.estadisticas = {'encoladas': 0, 'sincronas': 0, 'omitidas': 0, 'escritas': 0, 'lotes': 0,
+                             'reintentos': 0, 'perdidas': 0}
+
+    # --------------------------------------------------------------------------
+    #   API para las rutas
+    # --------------------------------------------------------------------------
+    def encolar(self, tabla, fila, clave=None):
+        """Programa la inserción de 'fila' (dict columna -> valor) en 'tabla'.
+
+        Si se indica 'clave' y ya hay una fila pendiente con la misma clave, la nueva
+        se descarta (p. ej. la misma solicitud de acceso enviada dos veces seguidas).
+        Devuelve True si quedó diferida, False si se escribió en el momento. Una
+        escritura síncrona que falla lanza la excepción, como antes.
+        """
+        if tabla not in self._tablas:
+            raise ValueError(f"Tabla no registrada para escritura diferida: {tabla}")
+        if not self.activa:
+            self._escribir_filas(tabla, [fila])
+            self._contar('sincronas')
+            return False
+
+        with self._lock:
+            if clave is not None:
+                clave = (tabla, clave)
+                if clave in self._claves:
+                    self.estadisticas['omitidas'] += 1
+                    return True
+                self._claves.add(clave)
+        self._asegurar_hilo()
+        try:
+            self._cola.put_nowait((tabla, fila, clave))
+        except queue.Full:
+            with self._lock:
+                self._claves.discard(clave)
+            print(f"ADVERTENCIA: Cola de escritura diferida llena; se escribe en '{tabla}' de forma síncrona.")
+            self._escribir_filas(tabla, [fila])
+            self._contar('sincronas')
+            return False
+        self._contar('encoladas')
+        return True
+
+    def cerrar(self, espera=30):
+        """Escribe lo pendiente y detiene el hilo (se llama al terminar el proceso)."""
+        hilo = self._hilo
+        if hilo is None or not hilo.is_alive() or self._pid != os.getpid():
+            return
+        self._cola.put(_FIN)
+        hilo.join(espera)
+        if hilo.is_alive():
+            print(f"ERROR: La escritura diferida no terminó en {espera} s; quedan ~{self._cola.qsize()} filas sin escribir.")
+        self._hilo = None
+
+    def pendientes(self):
+        return self._cola.qsize()
+
+    # --------------------------------------------------------------------------
+    #   Hilo de escritura
+    # --------------------------------------------------------------------------
+    def _asegurar_hilo(self):
+        # Tras un fork (gunicorn --preload) el hilo del padre no existe en el hijo.
+        if self._hilo is not None and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._hilo is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._hilo = threading.Thread(target=self._trabajar, daemon=True, name='escritura-diferida')
+                self._hilo.start()
+                atexit.register(self.cerrar)
+
+    def _trabajar(self):
+        terminar = False
+        while not terminar:
+            elemento = self._cola.get()
+            if elemento is _FIN:
+                break
+            lote = [elemento]
+            limite = time.monotonic() + self.intervalo
+            while len(lote) < self.tamano_lote:
+                restante = limite - time.monotonic()
+                try:
+                    elemento = self._cola.get(timeout=restante) if restante > 0 else self._cola.get_nowait()
+                except queue.Empty:
+                    break
+                if elemento is _FIN:
+                    terminar = True
+                    break
+                lote.append(elemento)
+            self._escribir_lote(lote)
+        # Lo que quedó detrás de la marca de fin también se escribe.
+        resto = []
+        while True:
+            try:
+                elemento = self._cola.get_nowait()
+            except queue.Empty:
+                break
+            if elemento is not _FIN:
+                resto.append(elemento)
+        for inicio in range(0, len(resto), self.tamano_lote):
+            self._escribir_lote(resto[inicio:inicio + self.tamano_lote])
+
+    def _escribir_lote(self, lote):
+        por_tabla = {}
+        for tabla, fila, _ in lote:
+            por_tabla.setdefault(tabla, []).append(fila)
+        try:
+            for espera in (0,) + tuple(self._reintentos):
+                if espera:
+                    self._contar('reintentos')
+                    time.sleep(espera)
+                try:
+                    with self._obtener_motor().begin() as conexion:
+                        for tabla, filas in por_tabla.items():
+                            conexion.execute(*self._insert_varias_filas(tabla, filas))
+                    self._contar('lotes')
+                    self._contar('escritas', len(lote))
+                    return
+                except Exception as e:
+                    print(f"ERROR: Falló la escritura diferida de un lote de {len(lote)} filas: {e}")
+            # El lote sigue fallando: fila por fila, para no perder las válidas.
+            for tabla, filas in por_tabla.items():
+                for fila in filas:
+                    try:
+                        self._escribir_filas(tabla, [fila])
+                        self._contar('escritas')
+                    except Exception as e:
+                        print(f"ERROR: Se descartó una fila diferida de '{tabla}': {e}")
+                        self._contar('perdidas')
+        finally:
+            with self._lock:
+                for _, _, clave in lote:
+                    self._claves.discard(clave)
+
+    def _escribir_filas(self, tabla, filas):
+        with self._obtener_motor().begin() as conexion:
+            conexion.execute(*self._insert_varias_filas(tabla, filas))
+
+    def _insert_varias_filas(self, tabla, filas):
+        """INSERT ... VALUES (...), (...) con parámetros numerados (PostgreSQL y SQLite)."""
+        columnas = self._tablas[tabla]
+        valores, parametros = [], {}
+        for i, fila in enumerate(filas):
+            valores.append('(' + ', '.join(f':{c}_{i}' for c in columnas) + ')')
+            parametros.update({f'{c}_{i}': fila.get(c) for c in columnas})
+        sql = f"INSERT INTO {tabla} ({', '.join(columnas)}) VALUES {', '.join(valores)}"
+        return text(sql), parametros
+
+    def _contar(self, nombre, cantidad=1):
+        with self._lock:
+            self.estadisticas[nombre] += cantidad
+
+
+# ==============================================================================
+#   Verificación ante caídas ('python escritura_diferida.py' y tests/)
+# ==============================================================================
+TABLAS_PRUEBA = {'sugerencias': ('usuario_id', 'contenido')}
+
+
+def contar_sugerencias(motor):
+    with motor.connect() as conexion:
+        return conexion.execute(text("SELECT COUNT(*) FROM sugerencias")).scalar_one()
+
+
+def _proceso_hijo(url, filas):
+    """Encola 'filas' y recibe SIGTERM antes de que el hilo las escriba."""
+    import signal
+    import sys
+    from sqlalchemy import create_engine
+
+    motor = create_engine(url, connect_args={'timeout': 30})
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))   # como un worker de gunicorn
+    cola = ColaEscrituraDiferida(lambda: motor, TABLAS_PRUEBA, tamano_lote=100, intervalo=30, activa=True)
+    for i in range(filas):
+        cola.encolar('sugerencias', {'usuario_id': 1, 'contenido': f'apagado {i}'})
+    print(f"pendientes={cola.pendientes()}", flush=True)
+    os.kill(os.getpid(), signal.SIGTERM)
+    time.sleep(60)
+    sys.exit(1)
+
+
+def verificar_apagado(motor, filas=250):
+    """SIGTERM con filas en cola (intervalo de 30 s, sin lote lleno): se escriben todas."""
+    import subprocess
+    import sys
+
+    antes = contar_sugerencias(motor)
+    salida = subprocess.run([sys.executable, os.path.abspath(__file__), '--hijo', str(motor.url), str(filas)],
+                            capture_output=True, text=True, timeout=60)
+    escritas = contar_sugerencias(motor) - antes
+    print(f"apagado con SIGTERM: {salida.stdout.strip()}, escritas {escritas}/{filas}, código {salida.returncode}")
+    assert escritas == filas and salida.returncode == 0, salida.stderr
+
+
+def verificar_bd_inestable(motor):
+    """La BD falla en los dos primeros intentos del lote: nada se pierde."""
+    class MotorInestable:
+        fallos = 2
+
+        def begin(self):
+            if MotorInestable.fallos:
+                MotorInestable.fallos -= 1
+                raise ConnectionError("BD no disponible (simulado)")
+            return motor.begin()
+
+    antes = contar_sugerencias(motor)
+    cola = ColaEscrituraDiferida(lambda: MotorInestable(), TABLAS_PRUEBA, intervalo=0.05, reintentos=(0.01, 0.01, 0.01))
+    for i in range(30):
+        cola.encolar('sugerencias', {'usuario_id': 1, 'contenido': f'reintento {i}'})
+    cola.cerrar()
+    print(f"BD inestable: escritas {contar_sugerencias(motor) - antes}/30, estadísticas {cola.estadisticas}")
+    assert contar_sugerencias(motor) - antes == 30 and cola.estadisticas['perdidas'] == 0
+
+
+def verificar_fila_invalida(motor):
+    """Una fila inválida (aquí, un id que ya existe) no arrastra al resto del lote."""
+    antes = contar_sugerencias(motor)
+    cola = ColaEscrituraDiferida(lambda: motor, {'sugerencias': ('usuario_id', 'contenido', 'id')},
+                                 intervalo=0.05, reintentos=())
+    cola.encolar('sugerencias', {'usuario_id': 1, 'contenido': 'válida 1'})
+    cola.encolar('sugerencias', {'usuario_id': 1, 'contenido': 'duplicada', 'id': 1})
+    cola.encolar('sugerencias', {'usuario_id': 1, 'contenido': 'válida 2'})
+    cola.cerrar()
+    print(f"fila inválida: escritas {contar_sugerencias(motor) - antes}/2, perdidas {cola.estadisticas['perdidas']}")
+    assert contar_sugerencias(motor) - antes == 2 and cola.estadisticas['perdidas'] == 1
+
+
+def verificar_cola_llena(motor):
+    """Cola llena: la fila se escribe de forma síncrona en la misma llamada."""
+    cola = ColaEscrituraDiferida(lambda: motor, TABLAS_PRUEBA, capacidad=1, intervalo=5)
+    cola._asegurar_hilo = lambda: None          # sin hilo: la cola no se vacía sola
+    antes = contar_sugerencias(motor)
+    diferidas = [cola.encolar('sugerencias', {'usuario_id': 1, 'contenido': f'llena {i}'}) for i in range(3)]
+    print(f"cola llena: diferidas {diferidas}, escritas al instante {contar_sugerencias(motor) - antes}")
+    assert diferidas == [True, False, False] and contar_sugerencias(motor) - antes == 2
+
+
+if __name__ == '__main__':
+    # Rendimiento y pruebas de seguridad ante caídas contra el SQLite de
+    # 'entorno_benchmark.py' (las mismas que corre tests/test_escritura_diferida.py).
+    import sys
+    from concurrent.futures import ThreadPoolExecutor
+
+    from entorno_benchmark import crear_motor, sembrar
+
+    if len(sys.argv) > 2 and sys.argv[1] == '--hijo':
+        _proceso_hijo(sys.argv[2], int(sys.argv[3]))
+
+    motor = crear_motor()
+    sembrar(motor, rondas_bcrypt=4)
+    filas_por_hilo, hilos = 250, 8
+
+    def medir(cola):
+        latencias = []
+
+        def trabajar(h):
+            for i in range(filas_por_hilo):
+                inicio = time.perf_counter()
+                cola.encolar('sugerencias', {'usuario_id': 1 + h, 'contenido': f'sugerencia {h}-{i}'})
+                latencias.append((time.perf_counter() - inicio) * 1000)
+
+        antes = contar_sugerencias(motor)
+        inicio = time.perf_counter()
+        with ThreadPoolExecutor(hilos) as ejecutor:
+            list(ejecutor.map(trabajar, range(hilos)))
+        en_peticion = time.perf_counter() - inicio
+        cola.cerrar()
+        total = time.perf_counter() - inicio
+        latencias.sort()
+        escritas = contar_sugerencias(motor) - antes
+        return escritas, en_peticion, total, latencias[len(latencias) // 2], latencias[int(len(latencias) * 0.95)]
+
+    n = filas_por_hilo * hilos
+    for nombre, cola in (('síncrona (antes)', ColaEscrituraDiferida(lambda: motor, TABLAS_PRUEBA, activa=False)),
+                         ('diferida', ColaEscrituraDiferida(lambda: motor, TABLAS_PRUEBA, activa=True))):
+        escritas, en_peticion, total, p50, p95 = medir(cola)
+        print(f"{nombre:<18} {escritas}/{n} filas  en la petición p50 {p50:.3f} ms p95 {p95:.3f} ms  "
+              f"{n / total:,.0f} filas/s hasta la BD  lotes={cola.estadisticas['lotes']}")
+        assert escritas == n
+
+    verificar_apagado(motor)
+    verificar_bd_inestable(motor)
+    verificar_fila_invalida(motor)
+    verificar_cola_llena(motor)
+    print("OK: escritura diferida verificada.")
@@ -4,44 +4,138 @@
 
 # --- Librerías Estándar de Python ---
 import os
-import re
+import gzip
 import json  # <--- ¡CORRECCIÓN AÑADIDA AQUÍ!
+import threading
+import time
+from collections import namedtuple
+from contextlib import ExitStack
 from datetime import datetime, timedelta
 
+# --- Perfil de arranque (opcional): debe activarse antes de las demás importaciones ---
+import perfil_arranque
+if os.environ.get('PERFIL_ARRANQUE'):
+    perfil_arranque.activar()
+
 # --- Librerías de Terceros (Instaladas) ---
+# Las dependencias pesadas (fpdf, supabase) NO se importan aquí: se importan
+# dentro de las rutas que las usan para que el arranque en frío sea rápido.
 from flask import Flask, render_template, request, jsonify, session, redirect, url_for, Response, flash
 from werkzeug.security import check_password_hash, generate_password_hash
-from sqlalchemy import create_engine, text
 from dotenv import load_dotenv
-from fpdf import FPDF
-from pypdf import PdfReader
 import bcrypt
-import requests
+
+# --- Módulos Propios ---
+from analizador_guias import AnalizadorGuias
+from buscador_conocimiento import IndiceConocimiento
+from indice_plantillas import IndicePlantillas, CAMPOS_POR_GRUPO
+from validador_plantillas import ValidadorPlantillas
+from bitset_actividades import RelacionActividades
+from paquete_datos import abrir_paquete
+from recarga_conocimiento import CargadorVersionado
+from almacen_ejemplos import AlmacenLocal, AlmacenSupabase, ErrorEjemplo, GestorEjemplos
+from metricas import Metricas
+from consultas_lentas import RegistroConsultasLentas
+from escritura_diferida import ColaEscrituraDiferida
+import busqueda_plantillas
+import consultas
+from calentamiento import Calentamiento
+from busquedas_async import normalizar_busqueda_procedimiento
+from paginas_cacheadas import CachePaginas, segundos_hasta_medianoche, version_de
+from catalogos_offline import CatalogosOffline
+from enrutador_bd import EnrutadorBD
 
 # ==============================================================================
 
+
+class RecursoPerezoso:
+    """Crea un recurso costoso (motor de BD, cliente...) la primera vez que se usa.
+
+    Se comporta como el objeto real: `engine.connect()` funciona igual, pero el
+    motor no se construye hasta la primera consulta.
+    """
+
+    _SIN_CREAR = object()
+
+    def __init__(self, fabrica):
+        self._fabrica = fabrica
+        self._objeto = self._SIN_CREAR
+        self._lock = threading.Lock()
+
+    def obtener(self):
+        if self._objeto is self._SIN_CREAR:
+            with self._lock:
+                if self._objeto is self._SIN_CREAR:
+                    self._objeto = self._fabrica()
+        return self._objeto
+
+    def creado(self):
+        return self._objeto is not self._SIN_CREAR
+
+    def __getattr__(self, nombre):
+        return getattr(self.obtener(), nombre)
+
+
 # ==============================================================================
 #           CARGA DEL CONOCIMIENTO PARA EL ASISTENTE DE IA
 # ==============================================================================
 
 
-def cargar_conocimiento_clinico():
-    """Carga la base de conocimiento desde el archivo JSON."""
+# Paquete binario generado por 'compilar_datos.py' (catálogo CIE-10 + guías).
+# Se abre con mmap: no se lee nada del disco hasta que se consulta.
+PAQUETE_DATOS = abrir_paquete()
+
+
+def cargar_conocimiento_clinico(estricto=False):
+    """Carga la base de conocimiento desde el paquete compilado o, si no está al día, desde el JSON.
+
+    Con 'estricto', un JSON ausente o inválido lanza la excepción en vez de devolver
+    una lista vacía (una recarga no debe dejar al asistente sin reglas).
+    """
+    if PAQUETE_DATOS and PAQUETE_DATOS.conocimiento_vigente(RUTA_CONOCIMIENTO):
+        conocimiento = PAQUETE_DATOS.guias()
+        print(f"INFO: Se cargaron {len(conocimiento)} reglas de conocimiento desde el paquete compilado (versión {PAQUETE_DATOS.version_datos}).")
+        return conocimiento
+    if PAQUETE_DATOS:
+        print("ADVERTENCIA: 'datos_compilados.bin' no corresponde a 'conocimiento_clinico.json'. Ejecute compilar_datos.py.")
+
     try:
-        with open('conocimiento_clinico.json', 'r', encoding='utf-8') as f:
+        with open(RUTA_CONOCIMIENTO, 'r', encoding='utf-8') as f:
             print("INFO: Cargando la base de conocimiento clínico...")
             conocimiento = json.load(f)
             print(f"INFO: ¡Éxito! Se cargaron {len(conocimiento)} reglas de conocimiento.")
             return conocimiento
     except FileNotFoundError:
         print("ADVERTENCIA: No se encontró 'conocimiento_clinico.json'. El asistente de IA no funcionará.")
+        if estricto:
+            raise
         return []
     except json.JSONDecodeError:
         print("ERROR: El archivo 'conocimiento_clinico.json' tiene un formato JSON inválido.")
+        if estricto:
+            raise
         return []
 
-# Cargamos el conocimiento UNA SOLA VEZ al iniciar la aplicación.
-CONOCIMIENTO_CLINICO = cargar_conocimiento_clinico()
+
+RUTA_CONOCIMIENTO = 'conocimiento_clinico.json'
+
+# Reglas + índice de búsqueda. 'desde_paquete' indica que el índice CIE-10 -> guía
+# del paquete es válido para esta lista de reglas; 'version' es la huella del JSON.
+BaseConocimiento = namedtuple('BaseConocimiento', ['reglas', 'indice', 'desde_paquete', 'version'])
+
+
+def _construir_base_conocimiento(version):
+    # En las recargas (ya hay una foto) un archivo dañado falla y se conserva la foto anterior.
+    reglas = cargar_conocimiento_clinico(estricto=BASE_CONOCIMIENTO.creado())
+    desde_paquete = bool(PAQUETE_DATOS) and PAQUETE_DATOS.conocimiento_vigente(RUTA_CONOCIMIENTO)
+    return BaseConocimiento(reglas, IndiceConocimiento(reglas), desde_paquete, version)
+
+
+# El conocimiento se carga recién cuando lo pide la primera consulta al asistente
+# (las rutas de login o menú no lo necesitan). Si 'conocimiento_clinico.json'
+# cambia, o un administrador pide recargarlo, se reconstruye en segundo plano y
+# se reemplaza de una sola vez: cada petición usa una foto completa y coherente.
+BASE_CONOCIMIENTO = CargadorVersionado(_construir_base_conocimiento, RUTA_CONOCIMIENTO)
 
 # ==============================================================================
 
@@ -52,42 +146,77 @@ DATABASE_URL = os.environ.get('DATABASE_URL')
 if not DATABASE_URL:
     raise RuntimeError("La variable de entorno DATABASE_URL no está configurada.")
     
-# --- ¡LÍNEA CORREGIDA PARA MANEJAR CARACTERES ESPECIALES! ---
-engine = create_engine(DATABASE_URL, connect_args={'options': '-cclient_encoding=latin1'})
+# UTF-8 de punta a punta: con latin1, '≥', '–' o las comillas tipográficas
+# guardadas en la base no se podían leer ni escribir.
+# El motor (y el driver de PostgreSQL) se crea en la primera consulta.
+engine = RecursoPerezoso(lambda: consultas.crear_motor(DATABASE_URL, {'client_encoding': 'utf8'}))
+
+# Réplica de lectura opcional. Las rutas marcadas con '@ENRUTADOR_BD.lectura' la
+# usan vía 'ENRUTADOR_BD.connect()'; si no está configurada o falla, va al primario.
+DATABASE_REPLICA_URL = os.environ.get('DATABASE_REPLICA_URL')
+engine_replica = RecursoPerezoso(lambda: consultas.crear_motor(
+    DATABASE_REPLICA_URL, {'client_encoding': 'utf8', 'connect_timeout': 3}
+)) if DATABASE_REPLICA_URL else None
+ENRUTADOR_BD = EnrutadorBD(lambda: engine, lambda: engine_replica)
 
 # ---------------------------------------------------------
 
-# ==============================================================================
-#           (¡NUEVO!) INSERTA EL CÓDIGO DE CORRECCIÓN AQUÍ
 # ==============================================================================
 #           CONFIGURACIÓN DEL CLIENTE DE SUPABASE
 # ==============================================================================
 # Este cliente es necesario para las nuevas búsquedas (procedimientos, etc.)
+# Importar 'supabase' cuesta cientos de milisegundos, así que el cliente se crea
+# la primera vez que una ruta lo pide y luego se reutiliza.
 
-# 1. Importamos las librerías necesarias para el cliente de Supabase
-from supabase import create_client, Client
-
-# 2. Inicializamos la variable como None para asegurar que siempre exista
-supabase: Client = None 
-
-try:
-    # 3. Intentamos leer las variables de entorno que configuraste en Vercel
+def _crear_cliente_supabase():
     SUPABASE_URL = os.environ.get('SUPABASE_URL')
     SUPABASE_ANON_KEY = os.environ.get('SUPABASE_ANON_KEY')
-    
-    # 4. Si ambas claves existen, creamos el cliente de Supabase
-    if SUPABASE_URL and SUPABASE_ANON_KEY:
-        supabase = create_client(SUPABASE_URL, SUPABASE_ANON_KEY)
-        print("INFO: Conexión con el cliente de Supabase establecida con éxito.")
-    else:
-        # 5. Si falta alguna clave, lo registramos como un error claro
+
+    if not (SUPABASE_URL and SUPABASE_ANON_KEY):
         print("ERROR: Faltan las variables de entorno SUPABASE_URL o SUPABASE_ANON_KEY. Las búsquedas en tablas nuevas no funcionarán.")
+        return None
+    try:
+        from supabase import create_client
+        cliente = create_client(SUPABASE_URL, SUPABASE_ANON_KEY)
+        print("INFO: Conexión con el cliente de Supabase establecida con éxito.")
+        return cliente
+    except Exception as e:
+        print(f"ERROR: No se pudo inicializar el cliente de Supabase. Error: {e}")
+        return None
+
+SUPABASE_CLIENTE = RecursoPerezoso(_crear_cliente_supabase)
+
+
+def obtener_supabase():
+    """Devuelve el cliente de Supabase (o None si no está configurado)."""
+    return SUPABASE_CLIENTE.obtener()
+
+
+# Cliente con la clave de servicio (solo para escribir en Storage). Antes se creaba
+# uno nuevo en cada subida; ahora se crea en la primera y se reutiliza.
+def _crear_cliente_servicio():
+    SUPABASE_URL = os.environ.get('SUPABASE_URL')
+    SUPABASE_SERVICE_KEY = os.environ.get('SUPABASE_SERVICE_KEY')
+
+    if not (SUPABASE_URL and SUPABASE_SERVICE_KEY):
+        print("ERROR: Faltan las variables de entorno SUPABASE_URL o SUPABASE_SERVICE_KEY. No se podrán subir ejemplos.")
+        return None
+    from supabase import create_client
+    return create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
+
+SUPABASE_SERVICIO = RecursoPerezoso(_crear_cliente_servicio)
+
+
+def _crear_gestor_ejemplos():
+    directorio_local = os.environ.get('ALMACEN_EJEMPLOS_LOCAL')
+    if directorio_local:
+        print(f"INFO: Los PDF de ejemplo se guardan en el directorio local '{directorio_local}'.")
+        return GestorEjemplos(AlmacenLocal(directorio_local))
+    return GestorEjemplos(AlmacenSupabase(SUPABASE_SERVICIO.obtener,
+                                          medir=lambda operacion: METRICAS.medir_llamada('supabase_storage', operacion)))
+
+GESTOR_EJEMPLOS = RecursoPerezoso(_crear_gestor_ejemplos)
 
-except Exception as e:
-    # 6. Si ocurre cualquier otro error, también lo registramos
-    print(f"ERROR: No se pudo inicializar el cliente de Supabase. Error: {e}")
-# ==============================================================================
-#           FIN DEL BLOQUE DE CORRECCIÓN
 # ==============================================================================
 
 
@@ -340,6 +469,22 @@ app = Flask(__name__, template_folder='templates')
 
 app.secret_key = os.environ.get("FLASK_SECRET_KEY", "llave-secreta-de-desarrollo")
 
+# Latencia por endpoint, consultas SQL por petición y llamadas a Supabase (ver /admin/metrics).
+METRICAS = Metricas()
+METRICAS.instalar(app)
+consultas.observar(METRICAS.observar_sentencia)
+
+# Consultas que superan UMBRAL_CONSULTA_LENTA_MS, con su plan (ver /admin/consultas_lentas).
+CONSULTAS_LENTAS = RegistroConsultasLentas()
+CONSULTAS_LENTAS.instalar()
+
+# Inserciones no críticas (sugerencias, solicitudes de acceso): se escriben por
+# lotes en segundo plano. El motor se lee en cada lote (el benchmark lo reemplaza).
+ESCRITURAS_DIFERIDAS = ColaEscrituraDiferida(lambda: engine, {
+    'sugerencias': ('usuario_id', 'contenido'),
+    'solicitudes_acceso': ('usuario_id', 'huella_dispositivo', 'user_agent_info'),
+})
+
 # ==============================================================================
 #           CONFIGURACIÓN DE COOKIES PARA PRODUCCIÓN EN VERCEL
 # ==============================================================================
@@ -390,8 +535,7 @@ def login():
     try:
         with engine.connect() as connection:
             # --- PASO 2: Encontrar al usuario y verificar la contraseña ---
-            sql_query = text("SELECT id, username, password_hash, role FROM usuarios WHERE LOWER(username) = LOWER(:username)")
-            user = connection.execute(sql_query, {'username': username}).first()
+            user = consultas.USUARIO_POR_NOMBRE.primera(connection, username=username)
 
             user_role_cleaned = ""
             if user and user.role:
@@ -407,8 +551,7 @@ def login():
                     return redirect(url_for('menu'))
                 
                 else: # Para 'usuario' y cualquier otro rol por defecto
-                    device_sql = text("SELECT id FROM dispositivos_autorizados WHERE usuario_id = :user_id AND huella_dispositivo = :fingerprint")
-                    authorized_device = connection.execute(device_sql, {'user_id': user.id, 'fingerprint': fingerprint}).first()
+                    authorized_device = consultas.DISPOSITIVO_AUTORIZADO.primera(connection, user_id=user.id, fingerprint=fingerprint)
 
                     if authorized_device:
                         session['user_id'] = user.id
@@ -418,24 +561,15 @@ def login():
                     else:
                         # --- LÓGICA DE CREACIÓN DE SOLICITUD ---
                         # 1. Evitar duplicados: Verificamos si ya existe una solicitud pendiente
-                        check_solicitud_sql = text("""
-                            SELECT id FROM solicitudes_acceso 
-                            WHERE usuario_id = :user_id AND huella_dispositivo = :fingerprint AND estado = 'pendiente'
-                        """)
-                        existing_request = connection.execute(check_solicitud_sql, {'user_id': user.id, 'fingerprint': fingerprint}).first()
+                        existing_request = consultas.SOLICITUD_PENDIENTE.primera(connection, user_id=user.id, fingerprint=fingerprint)
 
                         if not existing_request:
-                            # 2. Si no existe, la creamos
-                            insert_solicitud_sql = text("""
-                                INSERT INTO solicitudes_acceso (usuario_id, huella_dispositivo, user_agent_info)
-                                VALUES (:user_id, :fingerprint, :user_agent)
-                            """)
-                            connection.execute(insert_solicitud_sql, {
-                                'user_id': user.id,
-                                'fingerprint': fingerprint,
-                                'user_agent': user_agent
-                            })
-                            connection.commit()
+                            # 2. Si no existe, la creamos (escritura diferida: no hace falta esperar el COMMIT)
+                            ESCRITURAS_DIFERIDAS.encolar('solicitudes_acceso', {
+                                'usuario_id': user.id,
+                                'huella_dispositivo': fingerprint,
+                                'user_agent_info': user_agent
+                            }, clave=(user.id, fingerprint))
                         
                         # 3. Mostramos un mensaje amigable
                         flash('Dispositivo no reconocido. Se ha enviado una solicitud de acceso al administrador para su aprobación.', 'info')
@@ -483,36 +617,111 @@ def get_actividades_por_codigo(codigo):
     actividades_sugeridas = [{'codigo': c, 'descripcion': ACTIVIDADES_PREVENTIVAS_MAP.get(c, f'Desc no encontrada')} for c in sorted(list(codigos_actividad))]
     return jsonify({'actividades': actividades_sugeridas})
 
+# --- ÁLGEBRA DE ACTIVIDADES SOBRE VARIOS CÓDIGOS PRESTACIONALES ---
+# La relación código -> actividades compilada a bitsets (ver bitset_actividades.py).
+RELACION_ACTIVIDADES = RelacionActividades(RELACION_CODIGO_ACTIVIDADES, ACTIVIDADES_PREVENTIVAS_MAP)
+
+@app.route('/api/actividades/operacion')
+def operacion_actividades():
+    """?op=interseccion|union|diferencia&codigos=001,002,118 -> actividades resultantes."""
+    if 'username' not in session: return jsonify({'actividades': []}), 401
+    operaciones = {
+        'interseccion': RELACION_ACTIVIDADES.interseccion,
+        'union': RELACION_ACTIVIDADES.union,
+        'diferencia': RELACION_ACTIVIDADES.diferencia,
+    }
+    operacion = request.args.get('op', 'interseccion')
+    codigos = [c.strip() for c in request.args.get('codigos', '').split(',') if c.strip()]
+    if operacion not in operaciones:
+        return jsonify({'error': f"Operación no válida: {operacion}"}), 400
+    if not codigos:
+        return jsonify({'error': 'Se requiere al menos un código prestacional'}), 400
+    desconocidos = [c for c in codigos if c not in RELACION_ACTIVIDADES.mascara_codigo]
+    if desconocidos:
+        return jsonify({'error': f"Códigos sin actividades definidas: {', '.join(desconocidos)}"}), 404
+
+    actividades = RELACION_ACTIVIDADES.a_actividades(operaciones[operacion](codigos))
+    return jsonify({'operacion': operacion, 'codigos': codigos, 'actividades': RELACION_ACTIVIDADES.describir(actividades)})
+
+@app.route('/api/actividades/codigos')
+def codigos_por_actividad():
+    """?actividades=407,414&modo=todas|alguna -> códigos prestacionales que las permiten."""
+    if 'username' not in session: return jsonify({'codigos': []}), 401
+    actividades = [a.strip() for a in request.args.get('actividades', '').split(',') if a.strip()]
+    if not actividades:
+        return jsonify({'error': 'Se requiere al menos una actividad'}), 400
+    desconocidas = [a for a in actividades if a not in RELACION_ACTIVIDADES.mascara_actividad]
+    if desconocidas:
+        return jsonify({'error': f"Actividades desconocidas: {', '.join(desconocidas)}"}), 404
+
+    mascara = RELACION_ACTIVIDADES.codigos_con(actividades, todas=request.args.get('modo', 'todas') != 'alguna')
+    return jsonify({'actividades': actividades, 'codigos': RELACION_ACTIVIDADES.a_codigos(mascara)})
+
 # --- RUTAS CRUD CONECTADAS A SUPABASE ---
 
+# Índice inverso código -> plantillas. Se construye con la primera búsqueda y se
+# mantiene al día en 'guardar_plantilla' y 'delete_plantilla'.
+INDICE_PLANTILLAS = IndicePlantillas()
+
+def obtener_indice_plantillas():
+    if not INDICE_PLANTILLAS.vigente():
+        with engine.connect() as connection:
+            INDICE_PLANTILLAS.cargar(consultas.PLANTILLAS_INDICE.dicts(connection))
+        print(f"INFO: Índice de plantillas por código construido ({INDICE_PLANTILLAS.total_plantillas()} plantillas).")
+    return INDICE_PLANTILLAS
+
+
+# Validador de consistencia (actividades, CIE-10, excluyentes). Los catálogos se
+# convierten en conjuntos una sola vez, con la primera plantilla que se guarda.
+def _crear_validador_plantillas():
+    if PAQUETE_DATOS:
+        codigos_cie10 = PAQUETE_DATOS.codigos_cie10()
+    else:
+        with open('cie10.json', 'r', encoding='utf-8') as f:
+            codigos_cie10 = [registro['codigo_cie10'] for registro in json.load(f)]
+    return ValidadorPlantillas(RELACION_CODIGO_ACTIVIDADES, ACTIVIDADES_PREVENTIVAS_MAP,
+                               [c['codigo'] for c in CODIGOS_PRESTACIONALES_CATEGORIZADOS], codigos_cie10)
+
+VALIDADOR_PLANTILLAS = RecursoPerezoso(_crear_validador_plantillas)
+
 @app.route('/get_registros', methods=['GET'])
+@ENRUTADOR_BD.lectura
 def get_registros():
     if 'username' not in session: return jsonify({"error": "No autorizado"}), 401
-    with engine.connect() as connection:
-        result = connection.execute(text("SELECT id, tipo_atencion, codigo_prestacional FROM plantillas ORDER BY id ASC"))
-        registros = [dict(row._mapping) for row in result]
-        return jsonify(registros)
+    with ENRUTADOR_BD.connect() as connection:
+        registros = consultas.PLANTILLAS_REGISTROS.dicts(connection)
+    # Ejemplo PDF de cada plantilla ({tamano, actualizado} o None). El manifiesto se
+    # rearma en segundo plano; si todavía no hay uno (o el bucket no se pudo
+    # listar), se omite el campo y la página no deshabilita nada.
+    manifiesto = GESTOR_EJEMPLOS.manifiesto()
+    if manifiesto is not None:
+        for registro in registros:
+            registro['ejemplo'] = manifiesto.get(registro['id'])
+    return jsonify(registros)
 
 @app.route('/get_plantilla/<int:plantilla_id>', methods=['GET'])
+@ENRUTADOR_BD.lectura
 def get_plantilla(plantilla_id):
     if 'username' not in session: return jsonify({"error": "No autorizado"}), 401
-    with engine.connect() as connection:
-        result = connection.execute(text("SELECT * FROM plantillas WHERE id = :id"), {"id": plantilla_id})
-        plantilla = result.first()
+    with ENRUTADOR_BD.connect() as connection:
+        plantilla = consultas.PLANTILLA_POR_ID.dict(connection, id=plantilla_id)
         if plantilla:
-            return jsonify(dict(plantilla._mapping))
+            return jsonify(plantilla)
         else:
             return jsonify({"error": "Plantilla no encontrada"}), 404
 
 @app.route('/delete_plantilla/<int:plantilla_id>', methods=['DELETE'])
+@ENRUTADOR_BD.escritura
 def delete_plantilla(plantilla_id):
     if session.get('role') != 'administrador': return jsonify({'message': 'No autorizado.'}), 403
     with engine.connect() as connection:
-        connection.execute(text("DELETE FROM plantillas WHERE id = :id"), {"id": plantilla_id})
+        consultas.PLANTILLA_ELIMINAR.ejecutar(connection, id=plantilla_id)
         connection.commit()
+        INDICE_PLANTILLAS.eliminar(plantilla_id)
         return jsonify({'message': f'Plantilla ID {plantilla_id} eliminada con éxito.'}), 200
 
 @app.route('/guardar_plantilla', methods=['POST'])
+@ENRUTADOR_BD.escritura
 def guardar_plantilla():
     if session.get('role') != 'administrador': return jsonify({'message': 'No autorizado.'}), 403
     
@@ -535,39 +744,87 @@ def guardar_plantilla():
         "observaciones": data.get("observaciones"),
     }
 
+    # Solo se revisa la plantilla que se está guardando; los hallazgos se devuelven como advertencias.
+    inicio = time.perf_counter()
+    advertencias = VALIDADOR_PLANTILLAS.validar(params)
+    if advertencias:
+        print(f"INFO: Plantilla '{params['tipo_atencion']}' guardada con {len(advertencias)} advertencia(s) de consistencia ({(time.perf_counter() - inicio) * 1000:.2f} ms).")
+
     with engine.connect() as connection:
         if plantilla_id:
             params['id'] = plantilla_id
-            query = text("""
-                UPDATE plantillas SET
-                    tipo_atencion = :tipo_atencion, codigo_prestacional = :codigo_prestacional,
-                    descripcion_prestacional = :descripcion_prestacional, actividades_preventivas = :actividades_preventivas,
-                    diagnostico_principal = :diagnostico_principal, diagnosticos_excluyentes = :diagnosticos_excluyentes,
-                    diagnosticos_complementarios = :diagnosticos_complementarios, medicamentos_relacionados = :medicamentos_relacionados,
-                    insumos_relacionados = :insumos_relacionados, procedimientos_obligatorios = :procedimientos_obligatorios,
-                    procedimientos_excluyentes = :procedimientos_excluyentes, otros_procedimientos = :otros_procedimientos,
-                    observaciones = :observaciones
-                WHERE id = :id
-            """)
-            connection.execute(query, params)
+            consultas.PLANTILLA_ACTUALIZAR.ejecutar(connection, **params)
             connection.commit()
-            return jsonify({'message': f'Plantilla ID {plantilla_id} actualizada con éxito.'}), 200
+            INDICE_PLANTILLAS.actualizar(dict(params, id=int(plantilla_id)))
+            return jsonify({'message': f'Plantilla ID {plantilla_id} actualizada con éxito.', 'advertencias': advertencias}), 200
         else:
-            query = text("""
-                INSERT INTO plantillas (tipo_atencion, codigo_prestacional, descripcion_prestacional, actividades_preventivas, 
-                                      diagnostico_principal, diagnosticos_excluyentes, diagnosticos_complementarios, 
-                                      medicamentos_relacionados, insumos_relacionados, procedimientos_obligatorios, 
-                                      procedimientos_excluyentes, otros_procedimientos, observaciones)
-                VALUES (:tipo_atencion, :codigo_prestacional, :descripcion_prestacional, :actividades_preventivas, 
-                        :diagnostico_principal, :diagnosticos_excluyentes, :diagnosticos_complementarios, 
-                        :medicamentos_relacionados, :insumos_relacionados, :procedimientos_obligatorios, 
-                        :procedimientos_excluyentes, :otros_procedimientos, :observaciones)
-                RETURNING id
-            """)
-            result = connection.execute(query, params)
-            new_id = result.scalar()
+            new_id = consultas.PLANTILLA_INSERTAR.escalar(connection, **params)
             connection.commit()
-            return jsonify({'message': f'¡Éxito! Plantilla "{params["tipo_atencion"]}" guardada con ID: {new_id}'}), 201
+            INDICE_PLANTILLAS.actualizar(dict(params, id=new_id))
+            return jsonify({'message': f'¡Éxito! Plantilla "{params["tipo_atencion"]}" guardada con ID: {new_id}', 'advertencias': advertencias}), 201
+
+@app.route('/api/buscar_plantillas')
+@ENRUTADOR_BD.lectura
+def buscar_plantillas():
+    """Búsqueda de texto completo en todos los campos de las plantillas (?q=texto&limite=20)."""
+    if 'username' not in session: return jsonify({"error": "No autorizado"}), 401
+
+    texto = request.args.get('q', '').strip()
+    if len(texto) < 3:
+        return jsonify({"resultados": [], "total": 0})
+    limite = max(1, min(request.args.get('limite', busqueda_plantillas.LIMITE, type=int), 100))
+
+    try:
+        inicio = time.perf_counter()
+        with ENRUTADOR_BD.connect() as connection:
+            respuesta = busqueda_plantillas.buscar(connection, texto, limite)
+        respuesta["tiempo_ms"] = round((time.perf_counter() - inicio) * 1000, 2)
+        return jsonify(respuesta)
+    except Exception as e:
+        print(f"ERROR en /api/buscar_plantillas: {e}")
+        return jsonify({"error": "Error interno del servidor"}), 500
+
+@app.route('/api/plantillas_por_codigo')
+def plantillas_por_codigo():
+    """Plantillas que mencionan uno o varios códigos (CIE-10, item o procedimiento).
+
+    ?codigo=E119,E11  &grupos=diagnosticos,medicamentos  &modo=todos (por defecto: alguno)
+    """
+    if 'username' not in session: return jsonify({"error": "No autorizado"}), 401
+
+    codigos = [c for c in request.args.get('codigo', '').split(',') if c.strip()]
+    if not codigos:
+        return jsonify({"error": "Se requiere al menos un código"}), 400
+    grupos = [g for g in request.args.get('grupos', '').split(',') if g]
+    desconocidos = [g for g in grupos if g not in CAMPOS_POR_GRUPO]
+    if desconocidos:
+        return jsonify({"error": f"Grupos no válidos: {', '.join(desconocidos)}"}), 400
+
+    try:
+        indice = obtener_indice_plantillas()
+        plantillas = indice.buscar(codigos, grupos=grupos, todos=request.args.get('modo') == 'todos')
+        return jsonify({"plantillas": plantillas})
+    except Exception as e:
+        print(f"ERROR en /api/plantillas_por_codigo: {e}")
+        return jsonify({"error": "Error interno del servidor"}), 500
+
+@app.route('/admin/validar_plantillas')
+@ENRUTADOR_BD.lectura
+def validar_plantillas():
+    """Reporte de consistencia de toda la biblioteca de plantillas."""
+    if session.get('role') != 'administrador':
+        return jsonify({"error": "No autorizado"}), 403
+
+    try:
+        with ENRUTADOR_BD.connect() as connection:
+            plantillas = consultas.PLANTILLAS_TODAS.dicts(connection)
+        inicio = time.perf_counter()
+        reporte = VALIDADOR_PLANTILLAS.validar_todas(plantillas)
+        reporte["tiempo_ms"] = round((time.perf_counter() - inicio) * 1000, 2)
+        return jsonify(reporte)
+    except Exception as e:
+        print(f"ERROR al validar las plantillas: {e}")
+        return jsonify({"error": "Error interno del servidor"}), 500
 
 @app.route('/ver_plantillas')
 def ver_plantillas():
@@ -575,16 +832,14 @@ def ver_plantillas():
     return render_template('ver_plantillas.html', os=os) # <-- ¡ESTE ES EL CAMBIO!
 
 @app.route('/plantilla/<int:plantilla_id>')
+@ENRUTADOR_BD.lectura
 def detalle_plantilla(plantilla_id):
     if 'username' not in session:
         return redirect(url_for('login'))
 
     plantilla_data = None
-    with engine.connect() as connection:
-        result = connection.execute(text("SELECT * FROM plantillas WHERE id = :id"), {"id": plantilla_id})
-        plantilla_row = result.first()
-        if plantilla_row:
-            plantilla_data = dict(plantilla_row._mapping)
+    with ENRUTADOR_BD.connect() as connection:
+        plantilla_data = consultas.PLANTILLA_POR_ID.dict(connection, id=plantilla_id)
 
     if plantilla_data:
         return render_template('detalle_plantilla.html', plantilla=plantilla_data)
@@ -593,102 +848,22 @@ def detalle_plantilla(plantilla_id):
 
 # --- RUTA DE DESCARGA PDF (TU CÓDIGO + CAPA DE PROTECCIÓN) ---
 @app.route('/plantilla/<int:plantilla_id>/descargar_pdf')
+@ENRUTADOR_BD.lectura
 def descargar_pdf_plantilla(plantilla_id):
     if 'username' not in session:
         return redirect(url_for('login'))
 
     plantilla_data = None
-    with engine.connect() as connection:
-        result = connection.execute(text("SELECT * FROM plantillas WHERE id = :id"), {"id": plantilla_id})
-        plantilla_row = result.first()
-        if plantilla_row:
-            plantilla_data = dict(plantilla_row._mapping)
+    with ENRUTADOR_BD.connect() as connection:
+        plantilla_data = consultas.PLANTILLA_POR_ID.dict(connection, id=plantilla_id)
 
     if not plantilla_data:
         return "Plantilla no encontrada", 404
 
-    # ==================================================================
-    #    (¡NUEVO!) FUNCIÓN PARA LIMPIAR EL TEXTO ANTES DE USARLO
-    # ==================================================================
-    def limpiar_texto_para_pdf(texto):
-        if not texto:
-            return ""
-        # Convierte el texto a un formato seguro para FPDF, reemplazando
-        # caracteres problemáticos en lugar de causar un error.
-        return str(texto).encode('latin-1', 'replace').decode('latin-1')
-
-    class PDF(FPDF):
-        def header(self):
-            self.set_font('Arial', 'B', 16)
-            # (¡MODIFICADO!) Limpiamos el título por si acaso
-            titulo_limpio = limpiar_texto_para_pdf('Detalle de Plantilla')
-            self.cell(0, 10, titulo_limpio, 0, 1, 'C')
-            self.ln(5)
-
-        def footer(self):
-            self.set_y(-15)
-            self.set_font('Arial', 'I', 8)
-            # (¡MODIFICADO!) Limpiamos el número de página
-            pagina_limpia = limpiar_texto_para_pdf(f'Pagina {self.page_no()}')
-            self.cell(0, 10, pagina_limpia, 0, 0, 'C')
-
-        def chapter_title(self, title):
-            self.set_font('Arial', 'B', 12)
-            self.set_fill_color(230, 230, 230)
-            # (¡MODIFICADO!) Limpiamos el título del capítulo
-            titulo_limpio = limpiar_texto_para_pdf(title)
-            self.cell(0, 8, titulo_limpio, 0, 1, 'L', True)
-            self.ln(4)
-
-        def chapter_body(self, content):
-            self.set_font('Arial', '', 10)
-            # (¡MODIFICADO!) Limpiamos el contenido del cuerpo
-            contenido_limpio = limpiar_texto_para_pdf(content)
-            self.multi_cell(0, 5, contenido_limpio)
-            self.ln()
-
-    pdf = PDF()
-    pdf.add_page()
-    
-    pdf.chapter_title('Informacion General')
-    pdf.chapter_body(f"ID de Plantilla: {plantilla_data['id']}")
-    pdf.chapter_body(f"Tipo de Atencion: {plantilla_data['tipo_atencion']}")
-    pdf.chapter_body(f"Codigo Prestacional: {plantilla_data['codigo_prestacional']}")
-    pdf.chapter_body(f"Descripcion: {plantilla_data['descripcion_prestacional']}")
-
-    # Función auxiliar para mostrar secciones de forma segura
-    def display_section(title, data):
-        # (¡MODIFICADO!) Nos aseguramos de que 'data' no sea None
-        if data and len(data) > 0:
-            pdf.chapter_title(title)
-            # Si es una lista, iteramos sobre ella
-            if isinstance(data, list):
-                for item in data:
-                    # Limpiamos cada item de la lista
-                    pdf.chapter_body(f'- {item}')
-            else: # Si no es una lista, lo tratamos como texto simple
-                pdf.chapter_body(data)
-
-    # Usamos la función auxiliar para todas las secciones
-    display_section('Actividades Preventivas', plantilla_data.get('actividades_preventivas'))
-    display_section('Diagnostico Principal', plantilla_data.get('diagnostico_principal'))
-    display_section('Diagnosticos Excluyentes', plantilla_data.get('diagnosticos_excluyentes'))
-    display_section('Diagnosticos Complementarios', plantilla_data.get('diagnosticos_complementarios'))
-    display_section('Medicamentos Relacionados', plantilla_data.get('medicamentos_relacionados'))
-    display_section('Insumos Relacionados', plantilla_data.get('insumos_relacionados'))
-    display_section('Procedimientos Obligatorios', plantilla_data.get('procedimientos_obligatorios'))
-    display_section('Procedimientos Excluyentes', plantilla_data.get('procedimientos_excluyentes'))
-    display_section('Otros Procedimientos', plantilla_data.get('otros_procedimientos'))
-    
-    # (¡MODIFICADO!) Limpieza especial para el campo de observaciones
-    observaciones = plantilla_data.get('observaciones')
-    if observaciones:
-        # Quitamos las etiquetas HTML antes de limpiar y mostrar
-        texto_sin_html = re.sub('<[^<]+?>', '', observaciones)
-        display_section('Observaciones', texto_sin_html)
-
-    pdf_output = pdf.output(dest='S')
-    
+    # Importación diferida: fpdf es la dependencia más pesada de la aplicación.
+    from pdf_plantillas import generar_pdf_plantilla
+    pdf_output = generar_pdf_plantilla(plantilla_data)
+
     return Response(
         pdf_output,
         mimetype='application/pdf',
@@ -707,6 +882,16 @@ def calculadora_gestacional():
         return redirect(url_for('login'))
     return render_template('calculadora_gestacional.html')
 
+# Las páginas de referencia solo dependen de tablas constantes: se renderizan una
+# vez por versión de los datos (y por usuario, por la barra de navegación) y se
+# sirven desde memoria, ya comprimidas, con ETag y Cache-Control.
+CACHE_PAGINAS = CachePaginas()
+VERSION_PAGINAS = {
+    'referencia_codigos': version_de(CODIGOS_PRESTACIONALES_CATEGORIZADOS),
+    'guia_anemia': version_de(DATOS_TABLA_ANEMIA),
+    'guia_peso_talla': version_de(DATOS_PESO_TALLA),
+}
+
 @app.route('/referencia_codigos')
 def referencia_codigos():
     if 'username' not in session:
@@ -719,19 +904,169 @@ def referencia_codigos():
         "regular": (hoy - timedelta(days=30)).strftime('%d/%m/%Y'),
         "no_optima": (hoy - timedelta(days=45)).strftime('%d/%m/%Y')
     }
-    return render_template('referencia_codigos.html', fechas=fechas, codigos=CODIGOS_PRESTACIONALES_CATEGORIZADOS)
+    # Las fechas cambian una vez al día: la fecha forma parte de la versión.
+    return CACHE_PAGINAS.servir(
+        'referencia_codigos', f"{VERSION_PAGINAS['referencia_codigos']}-{hoy.date().isoformat()}",
+        lambda: render_template('referencia_codigos.html', fechas=fechas, codigos=CODIGOS_PRESTACIONALES_CATEGORIZADOS),
+        max_age=min(300, segundos_hasta_medianoche()))
 
 @app.route('/guia_anemia')
 def guia_anemia():
     if 'username' not in session:
         return redirect(url_for('login'))
-    return render_template('guia_anemia.html', datos_anemia=DATOS_TABLA_ANEMIA)
+    return CACHE_PAGINAS.servir('guia_anemia', VERSION_PAGINAS['guia_anemia'],
+                                lambda: render_template('guia_anemia.html', datos_anemia=DATOS_TABLA_ANEMIA))
+
+# --- EVALUACIÓN AUTOMÁTICA CON LA TABLA DE ANEMIA ---
+# La tabla se compila (y NumPy se importa) con la primera evaluación.
+def _crear_motor_anemia():
+    from reglas_anemia import MotorAnemia
+    return MotorAnemia(DATOS_TABLA_ANEMIA)
+
+MOTOR_ANEMIA = RecursoPerezoso(_crear_motor_anemia)
+
+def _regla_a_dict(regla):
+    if regla is None:
+        return {"regla": None, "resultado": "Sin regla aplicable", "accion": None}
+    return {"regla": regla.numero, "resultado": regla.resultado, "accion": regla.accion}
+
+@app.route('/api/evaluar_anemia', methods=['GET', 'POST'])
+def evaluar_anemia():
+    """Clasifica a un paciente: edad ('2a3m') o fecha_nacimiento, sexo, hb y, si aplica,
+    condicion, semanas_gestacion y prematuro."""
+    if 'username' not in session:
+        return jsonify({"error": "No autorizado"}), 401
+    from reglas_anemia import preparar_lote
+    from lotes import ErrorLote
+
+    datos = request.get_json(silent=True) if request.method == 'POST' else request.args.to_dict()
+    if not isinstance(datos, dict):
+        return jsonify({"error": "Se esperaba un objeto JSON con los datos del paciente."}), 400
+    datos = {str(k).lower(): v for k, v in datos.items()}
+
+    try:
+        edad, sexo, condicion, semanas, prematuro, hb = preparar_lote([datos], datetime.now().date())
+    except ErrorLote as e:
+        return jsonify({"error": str(e)}), 400
+    if edad[0] < 0 or sexo[0] < 0 or hb[0] != hb[0]:
+        return jsonify({"error": "Se requieren edad (o fecha_nacimiento), sexo y hb válidos."}), 400
+
+    regla = MOTOR_ANEMIA.evaluar(edad[0], sexo[0], hb[0], condicion[0], semanas[0], prematuro[0])
+    return jsonify(_regla_a_dict(regla))
+
+@app.route('/api/evaluar_anemia/lote', methods=['POST'])
+def evaluar_anemia_lote():
+    """Clasifica un lote (CSV o JSON) de pacientes. Un CSV se responde con un CSV."""
+    if 'username' not in session:
+        return jsonify({"error": "No autorizado"}), 401
+    from reglas_anemia import preparar_lote
+    from lotes import ErrorLote, leer_lote, csv_de_lote
+
+    try:
+        filas, formato = leer_lote(request)
+        columnas = preparar_lote(filas, datetime.now().date())
+    except ErrorLote as e:
+        return jsonify({"error": str(e)}), 400
+
+    inicio = time.perf_counter()
+    reglas = MOTOR_ANEMIA.describir(MOTOR_ANEMIA.evaluar_lote(*columnas))
+    tiempo_ms = (time.perf_counter() - inicio) * 1000
+    print(f"INFO: Lote de anemia: {len(filas)} pacientes clasificados en {tiempo_ms:.1f} ms.")
+
+    resultados = [_regla_a_dict(regla) for regla in reglas]
+    if formato == 'csv':
+        return Response(csv_de_lote(filas, ['regla', 'resultado', 'accion'], resultados), mimetype='text/csv',
+                        headers={'Content-Disposition': 'attachment; filename=evaluacion_anemia.csv'})
+    return jsonify({
+        "resultados": resultados,
+        "total": len(resultados),
+        "sin_regla": sum(1 for regla in reglas if regla is None),
+        "tiempo_ms": round(tiempo_ms, 2)
+    })
 
 @app.route('/guia_peso_talla')
 def guia_peso_talla():
     if 'username' not in session:
         return redirect(url_for('login'))
-    return render_template('guia_peso_talla.html', datos_tabla=DATOS_PESO_TALLA)
+    return CACHE_PAGINAS.servir('guia_peso_talla', VERSION_PAGINAS['guia_peso_talla'],
+                                lambda: render_template('guia_peso_talla.html', datos_tabla=DATOS_PESO_TALLA))
+
+# --- CÁLCULOS DE LAS CALCULADORAS (IMC, EG, FPP) PARA UN PADRÓN COMPLETO ---
+@app.route('/api/calculos/lote', methods=['POST'])
+def calculos_lote():
+    """Recibe un CSV o JSON (peso, talla, edad, fecha_atencion, fpp o semanas_gestacion)
+    y devuelve un CSV con IMC, categorías, edad gestacional y FPP por fila."""
+    if 'username' not in session:
+        return jsonify({"error": "No autorizado"}), 401
+    from calculos_clinicos import COLUMNAS_RESULTADO, calcular_lote
+    from lotes import ErrorLote, leer_lote, csv_de_lote
+
+    try:
+        filas, _ = leer_lote(request)
+        inicio = time.perf_counter()
+        resultados = calcular_lote(filas, datetime.now().date())
+    except ErrorLote as e:
+        return jsonify({"error": str(e)}), 400
+    print(f"INFO: Lote de cálculos: {len(filas)} filas en {(time.perf_counter() - inicio) * 1000:.1f} ms.")
+
+    return Response(csv_de_lote(filas, COLUMNAS_RESULTADO, zip(*resultados)), mimetype='text/csv',
+                    headers={'Content-Disposition': 'attachment; filename=calculos.csv'})
+
+# --- EVALUACIÓN DE PESO Y TALLA CONTRA LOS RANGOS DE LA GUÍA ---
+def _crear_tabla_crecimiento():
+    from rangos_crecimiento import TablaCrecimiento
+    return TablaCrecimiento(DATOS_PESO_TALLA)
+
+TABLA_CRECIMIENTO = RecursoPerezoso(_crear_tabla_crecimiento)
+
+@app.route('/api/evaluar_crecimiento', methods=['GET', 'POST'])
+def evaluar_crecimiento():
+    """Ubica a un niño en la tabla (edad '2a3m' o fecha_nacimiento, sexo, peso, talla) y
+    marca si el peso y la talla están por debajo, dentro o por encima del rango."""
+    if 'username' not in session:
+        return jsonify({"error": "No autorizado"}), 401
+    from rangos_crecimiento import preparar_lote
+    from lotes import ErrorLote
+
+    datos = request.get_json(silent=True) if request.method == 'POST' else request.args.to_dict()
+    if not isinstance(datos, dict):
+        return jsonify({"error": "Se esperaba un objeto JSON con los datos del niño."}), 400
+    datos = {str(k).lower(): v for k, v in datos.items()}
+
+    try:
+        edad, sexo, peso, talla = preparar_lote([datos], datetime.now().date())
+    except ErrorLote as e:
+        return jsonify({"error": str(e)}), 400
+    if edad[0] != edad[0]:
+        return jsonify({"error": "Se requiere edad (o fecha_nacimiento) válida."}), 400
+
+    return jsonify(TABLA_CRECIMIENTO.evaluar(edad[0], sexo[0], peso[0], talla[0]))
+
+@app.route('/api/evaluar_crecimiento/lote', methods=['POST'])
+def evaluar_crecimiento_lote():
+    """Evalúa un lote (CSV o JSON) de niños. Un CSV se responde con un CSV."""
+    if 'username' not in session:
+        return jsonify({"error": "No autorizado"}), 401
+    from rangos_crecimiento import preparar_lote
+    from lotes import ErrorLote, leer_lote, csv_de_lote
+
+    try:
+        filas, formato = leer_lote(request)
+        columnas = preparar_lote(filas, datetime.now().date())
+    except ErrorLote as e:
+        return jsonify({"error": str(e)}), 400
+
+    inicio = time.perf_counter()
+    evaluacion = TABLA_CRECIMIENTO.evaluar_lote(*columnas)
+    tiempo_ms = (time.perf_counter() - inicio) * 1000
+    print(f"INFO: Lote de peso/talla: {len(filas)} niños evaluados en {tiempo_ms:.1f} ms.")
+
+    resultados = [TABLA_CRECIMIENTO.describir(*valores) for valores in zip(*evaluacion)]
+    if formato == 'csv':
+        campos = ['categoria', 'estado_peso', 'estado_talla', 'imc']
+        return Response(csv_de_lote(filas, campos, resultados), mimetype='text/csv',
+                        headers={'Content-Disposition': 'attachment; filename=evaluacion_peso_talla.csv'})
+    return jsonify({"resultados": resultados, "total": len(resultados), "tiempo_ms": round(tiempo_ms, 2)})
 
 @app.route('/buscar_diagnosticos')
 def buscar_diagnosticos():
@@ -740,41 +1075,38 @@ def buscar_diagnosticos():
     return render_template('buscar_diagnosticos.html')
 
 @app.route('/api/search_diagnosticos')
+@ENRUTADOR_BD.lectura
 def search_diagnosticos():
     if 'username' not in session: return jsonify({'error': 'No autorizado'}), 401
     query = request.args.get('q', '')
     if len(query) < 3: return jsonify([])
     try:
-        with engine.connect() as connection:
-            sql_query = text("SELECT codigo, descripcion FROM diagnosticos WHERE codigo ILIKE :query OR descripcion ILIKE :query LIMIT 50;")
-            result = connection.execute(sql_query, {'query': f'%{query}%'})
-            return jsonify([dict(row._mapping) for row in result])
+        with ENRUTADOR_BD.connect() as connection:
+            return jsonify(consultas.DIAGNOSTICOS_BUSCAR.dicts(connection, query=f'%{query}%'))
     except Exception as e:
         print(f"Error en búsqueda asíncrona: {e}")
         return jsonify({'error': 'Error en el servidor'}), 500
 
 @app.route('/api/get_all_diagnosticos')
+@ENRUTADOR_BD.lectura
 def get_all_diagnosticos():
     if 'username' not in session: return jsonify({'error': 'No autorizado'}), 401
     try:
-        with engine.connect() as connection:
-            sql_query = text("SELECT codigo, descripcion FROM diagnosticos ORDER BY codigo;")
-            result = connection.execute(sql_query)
-            return jsonify([dict(row._mapping) for row in result])
+        with ENRUTADOR_BD.connect() as connection:
+            return jsonify(consultas.DIAGNOSTICOS_TODOS.dicts(connection))
     except Exception as e:
         print(f"Error al cargar todos los diagnósticos: {e}")
         return jsonify({'error': 'Error en el servidor'}), 500
 
 @app.route('/admin/usuarios')
+@ENRUTADOR_BD.lectura
 def gestionar_usuarios():
     if 'username' not in session or session.get('role') != 'administrador':
         flash('Acceso no autorizado.', 'danger')
         return redirect(url_for('menu'))
     try:
-        with engine.connect() as connection:
-            sql_query = text("SELECT id, username, role FROM usuarios ORDER BY username ASC")
-            result = connection.execute(sql_query)
-            lista_usuarios = [dict(row._mapping) for row in result]
+        with ENRUTADOR_BD.connect() as connection:
+            lista_usuarios = consultas.USUARIOS_LISTADO.dicts(connection)
     except Exception as e:
         print(f"Error al obtener la lista de usuarios: {e}")
         flash('Error al cargar la lista de usuarios.', 'danger')
@@ -782,6 +1114,7 @@ def gestionar_usuarios():
     return render_template('gestionar_usuarios.html', usuarios=lista_usuarios)
 
 @app.route('/api/add_user', methods=['POST'])
+@ENRUTADOR_BD.escritura
 def add_user():
     if 'username' not in session or session.get('role') != 'administrador':
         return jsonify({'success': False, 'message': 'No autorizado'}), 403
@@ -797,12 +1130,10 @@ def add_user():
         hashed_password_bytes = bcrypt.hashpw(password_bytes, salt)
         hashed_password_str = hashed_password_bytes.decode('utf-8')
         with engine.connect() as connection:
-            check_sql = text("SELECT id FROM usuarios WHERE LOWER(username) = LOWER(:username)")
-            existing_user = connection.execute(check_sql, {'username': new_username}).first()
+            existing_user = consultas.USUARIO_ID_POR_NOMBRE.primera(connection, username=new_username)
             if existing_user:
                 return jsonify({'success': False, 'message': f'El usuario "{new_username}" ya existe.'}), 409
-            insert_sql = text("INSERT INTO usuarios (username, password_hash, role) VALUES (:username, :password_hash, :role)")
-            connection.execute(insert_sql, {'username': new_username, 'password_hash': hashed_password_str, 'role': new_role})
+            consultas.USUARIO_INSERTAR.ejecutar(connection, username=new_username, password_hash=hashed_password_str, role=new_role)
             connection.commit()
         return jsonify({'success': True, 'message': f'Usuario "{new_username}" creado con éxito.'}), 201
     except Exception as e:
@@ -810,17 +1141,17 @@ def add_user():
         return jsonify({'success': False, 'message': 'Error interno del servidor.'}), 500
 
 @app.route('/api/delete_user/<int:user_id>', methods=['DELETE'])
-def delete_user():
+@ENRUTADOR_BD.escritura
+def delete_user(user_id):
     if 'username' not in session or session.get('role') != 'administrador':
         return jsonify({'success': False, 'message': 'No autorizado'}), 403
     with engine.connect() as connection:
-        user_to_delete = connection.execute(text("SELECT username FROM usuarios WHERE id = :id"), {'id': user_id}).scalar()
+        user_to_delete = consultas.USUARIO_NOMBRE_POR_ID.escalar(connection, id=user_id)
         if user_to_delete == session.get('username'):
             return jsonify({'success': False, 'message': 'No puedes eliminar tu propia cuenta de administrador.'}), 400
     try:
         with engine.connect() as connection:
-            sql_query = text("DELETE FROM usuarios WHERE id = :id")
-            connection.execute(sql_query, {'id': user_id})
+            consultas.USUARIO_ELIMINAR.ejecutar(connection, id=user_id)
             connection.commit()
         return jsonify({'success': True, 'message': 'Usuario eliminado con éxito.'}), 200
     except Exception as e:
@@ -834,37 +1165,79 @@ def dashboard():
         return redirect(url_for('menu'))
     return render_template('dashboard.html')
 
+@app.route('/admin/recargar_conocimiento', methods=['POST'])
+def recargar_conocimiento():
+    """Vuelve a cargar 'conocimiento_clinico.json' y avisa al resto de workers."""
+    if session.get('role') != 'administrador':
+        return jsonify({"error": "No autorizado"}), 403
+
+    try:
+        inicio = time.perf_counter()
+        version_anterior, version = BASE_CONOCIMIENTO.recargar()
+        segundos = time.perf_counter() - inicio
+        print(f"INFO: Conocimiento recargado por '{session.get('username')}': {version_anterior} -> {version} ({segundos:.2f} s).")
+        return jsonify({
+            "version_anterior": version_anterior,
+            "version": version,
+            "reglas": len(BASE_CONOCIMIENTO.obtener().reglas),
+            "segundos": round(segundos, 3)
+        })
+    except Exception as e:
+        print(f"ERROR al recargar la base de conocimiento: {e}")
+        return jsonify({"error": "No se pudo recargar la base de conocimiento."}), 500
+
+@app.route('/admin/metrics')
+def admin_metrics():
+    """Métricas del proceso en formato Prometheus (administradores o METRICAS_TOKEN)."""
+    token = os.environ.get('METRICAS_TOKEN')
+    autorizado_por_token = token and request.headers.get('Authorization') == f'Bearer {token}'
+    if session.get('role') != 'administrador' and not autorizado_por_token:
+        return jsonify({"error": "No autorizado"}), 403
+    return Response(METRICAS.exportar(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/admin/consultas_lentas')
+def consultas_lentas():
+    if session.get('role') != 'administrador':
+        flash('Acceso no autorizado.', 'danger')
+        return redirect(url_for('menu'))
+    grupos = CONSULTAS_LENTAS.agrupado()
+    if request.args.get('formato') == 'json':
+        return jsonify(grupos)
+    return render_template('consultas_lentas.html', grupos=grupos, total=CONSULTAS_LENTAS.total(),
+                           capacidad=CONSULTAS_LENTAS.capacidad(), umbral_ms=CONSULTAS_LENTAS.umbral * 1000)
+
+@app.route('/admin/consultas_lentas/vaciar', methods=['POST'])
+def vaciar_consultas_lentas():
+    if session.get('role') != 'administrador':
+        return jsonify({"error": "No autorizado"}), 403
+    CONSULTAS_LENTAS.vaciar()
+    flash('Registro de consultas lentas vaciado.', 'success')
+    return redirect(url_for('consultas_lentas'))
+
 @app.route('/api/dashboard_data')
+@ENRUTADOR_BD.lectura
 def dashboard_data():
     """Proporciona los datos agregados para el dashboard."""
     if session.get('role') != 'administrador':
         return jsonify({"error": "No autorizado"}), 403
 
     try:
-        with engine.connect() as connection:
+        with ENRUTADOR_BD.connect() as connection:
             # 1. Total de Usuarios
-            total_usuarios = connection.execute(text("SELECT COUNT(id) FROM usuarios")).scalar_one()
+            total_usuarios = consultas.USUARIOS_TOTAL.escalar(connection)
 
             # 2. Total de Dispositivos Autorizados
-            total_dispositivos = connection.execute(text("SELECT COUNT(id) FROM dispositivos_autorizados")).scalar_one()
+            total_dispositivos = consultas.DISPOSITIVOS_TOTAL.escalar(connection)
 
             # 3. Total de Solicitudes Pendientes
-            solicitudes_pendientes_count = connection.execute(text("SELECT COUNT(id) FROM solicitudes_acceso WHERE estado = 'pendiente'")).scalar_one()
+            solicitudes_pendientes_count = consultas.SOLICITUDES_PENDIENTES_TOTAL.escalar(connection)
 
             # 4. Desglose de Usuarios por Rol
-            roles_query = text("SELECT role, COUNT(id) as count FROM usuarios GROUP BY role")
-            roles_result = connection.execute(roles_query).fetchall()
+            roles_result = consultas.USUARIOS_POR_ROL.filas(connection)
             desglose_roles = {row.role.strip(): row.count for row in roles_result}
 
             # 5. Actividad Reciente (Últimas 5 solicitudes)
-            actividad_reciente_query = text("""
-                SELECT u.username, s.estado, s.created_at
-                FROM solicitudes_acceso s
-                JOIN usuarios u ON s.usuario_id = u.id
-                ORDER BY s.created_at DESC
-                LIMIT 5
-            """)
-            actividad_reciente_result = connection.execute(actividad_reciente_query).fetchall()
+            actividad_reciente_result = consultas.ACTIVIDAD_RECIENTE.filas(connection)
             # Convertimos las filas a diccionarios para que sean serializables a JSON
             actividad_reciente = [
                 {
@@ -880,7 +1253,8 @@ def dashboard_data():
                 "total_dispositivos_autorizados": total_dispositivos,
                 "solicitudes_pendientes": solicitudes_pendientes_count,
                 "desglose_roles": desglose_roles,
-                "actividad_reciente": actividad_reciente
+                "actividad_reciente": actividad_reciente,
+                "version_conocimiento": BASE_CONOCIMIENTO.version
             }
             
             return jsonify(data)
@@ -891,25 +1265,23 @@ def dashboard_data():
 
 
 @app.route('/admin/dispositivos', methods=['GET'])
+@ENRUTADOR_BD.lectura
 def pagina_admin_dispositivos():
     if 'username' not in session or session.get('role') != 'administrador':
         flash('Acceso no autorizado.', 'danger')
         return redirect(url_for('menu'))
     try:
-        with engine.connect() as connection:
-            usuarios = connection.execute(text("SELECT id, username FROM usuarios ORDER BY username")).fetchall()
+        with ENRUTADOR_BD.connect() as connection:
+            usuarios = consultas.USUARIOS_OPCIONES.filas(connection)
             usuario_seleccionado_id = request.args.get('usuario_id')
             dispositivos_del_usuario = []
             solicitudes_pendientes = []
             usuario_seleccionado = None
             if usuario_seleccionado_id:
-                sql_usuario = text("SELECT id, username FROM usuarios WHERE id = :id")
-                usuario_seleccionado = connection.execute(sql_usuario, {'id': int(usuario_seleccionado_id)}).first()
+                usuario_seleccionado = consultas.USUARIO_POR_ID.primera(connection, id=int(usuario_seleccionado_id))
                 if usuario_seleccionado:
-                    sql_dispositivos = text("SELECT * FROM dispositivos_autorizados WHERE usuario_id = :id ORDER BY created_at DESC")
-                    dispositivos_del_usuario = connection.execute(sql_dispositivos, {'id': int(usuario_seleccionado_id)}).fetchall()
-                    sql_solicitudes = text("SELECT * FROM solicitudes_acceso WHERE usuario_id = :id AND estado = 'pendiente' ORDER BY created_at DESC")
-                    solicitudes_pendientes = connection.execute(sql_solicitudes, {'id': int(usuario_seleccionado_id)}).fetchall()
+                    dispositivos_del_usuario = consultas.DISPOSITIVOS_DE_USUARIO.filas(connection, id=int(usuario_seleccionado_id))
+                    solicitudes_pendientes = consultas.SOLICITUDES_PENDIENTES_DE_USUARIO.filas(connection, id=int(usuario_seleccionado_id))
             return render_template('admin_dispositivos.html', 
                                    usuarios=usuarios, 
                                    dispositivos=dispositivos_del_usuario,
@@ -921,6 +1293,7 @@ def pagina_admin_dispositivos():
         return redirect(url_for('menu'))
 
 @app.route('/admin/autorizar_dispositivo', methods=['POST'])
+@ENRUTADOR_BD.escritura
 def autorizar_dispositivo():
     if 'username' not in session or session.get('role') != 'administrador':
         return jsonify({'success': False, 'message': 'No autorizado'}), 403
@@ -933,11 +1306,9 @@ def autorizar_dispositivo():
         return redirect(url_for('pagina_admin_dispositivos', usuario_id=usuario_id))
     try:
         with engine.connect() as connection:
-            sql_insert = text("INSERT INTO dispositivos_autorizados (usuario_id, huella_dispositivo, descripcion) VALUES (:uid, :huella, :desc)")
-            connection.execute(sql_insert, {'uid': usuario_id, 'huella': huella, 'desc': descripcion})
+            consultas.DISPOSITIVO_INSERTAR.ejecutar(connection, uid=usuario_id, huella=huella, desc=descripcion)
             if solicitud_id:
-                sql_update = text("UPDATE solicitudes_acceso SET estado = 'aprobada' WHERE id = :sid")
-                connection.execute(sql_update, {'sid': solicitud_id})
+                consultas.SOLICITUD_APROBAR.ejecutar(connection, sid=solicitud_id)
             connection.commit()
         flash('¡Dispositivo autorizado con éxito!', 'success')
     except Exception as e:
@@ -945,6 +1316,7 @@ def autorizar_dispositivo():
     return redirect(url_for('pagina_admin_dispositivos', usuario_id=usuario_id))
 
 @app.route('/admin/rechazar_solicitud/<int:solicitud_id>', methods=['POST'])
+@ENRUTADOR_BD.escritura
 def rechazar_solicitud(solicitud_id):
     if 'username' not in session or session.get('role') != 'administrador':
         return jsonify({'success': False, 'message': 'No autorizado'}), 403
@@ -953,8 +1325,7 @@ def rechazar_solicitud(solicitud_id):
         with engine.connect() as connection:
             # En lugar de APROBAR, cambiamos el estado a 'rechazada'
             # Podríamos también borrarla, pero marcarla es mejor para auditoría.
-            sql = text("UPDATE solicitudes_acceso SET estado = 'rechazada' WHERE id = :sid")
-            result = connection.execute(sql, {'sid': solicitud_id})
+            result = consultas.SOLICITUD_RECHAZAR.ejecutar(connection, sid=solicitud_id)
             
             # Verificamos que una fila fue afectada para confirmar que la solicitud existía
             if result.rowcount == 0:
@@ -972,6 +1343,7 @@ def rechazar_solicitud(solicitud_id):
 
 
 @app.route('/admin/eliminar_dispositivo/<int:dispositivo_id>', methods=['POST'])
+@ENRUTADOR_BD.escritura
 def eliminar_dispositivo(dispositivo_id):
     if 'username' not in session or session.get('role') != 'administrador':
         return jsonify({'success': False, 'message': 'No autorizado'}), 403
@@ -979,8 +1351,7 @@ def eliminar_dispositivo(dispositivo_id):
     try:
         with engine.connect() as connection:
             # Aquí sí borramos el registro directamente de la tabla de autorizados
-            sql = text("DELETE FROM dispositivos_autorizados WHERE id = :did")
-            result = connection.execute(sql, {'did': dispositivo_id})
+            result = consultas.DISPOSITIVO_ELIMINAR.ejecutar(connection, did=dispositivo_id)
             
             if result.rowcount == 0:
                 flash('El dispositivo no fue encontrado.', 'warning')
@@ -999,21 +1370,16 @@ def eliminar_dispositivo(dispositivo_id):
 # ==============================================================================
 
 @app.route('/admin/historial_solicitudes')
+@ENRUTADOR_BD.lectura
 def historial_solicitudes():
     if 'username' not in session or session.get('role') != 'administrador':
         flash('Acceso no autorizado.', 'danger')
         return redirect(url_for('menu'))
 
     try:
-        with engine.connect() as connection:
-            # Unimos las tablas para obtener el nombre de usuario en la misma consulta
-            sql = text("""
-                SELECT s.id, s.estado, s.huella_dispositivo, s.user_agent_info, s.created_at, u.username
-                FROM solicitudes_acceso s
-                JOIN usuarios u ON s.usuario_id = u.id
-                ORDER BY s.created_at DESC
-            """)
-            todas_las_solicitudes = connection.execute(sql).fetchall()
+        with ENRUTADOR_BD.connect() as connection:
+            # Las solicitudes con el nombre de usuario, en una sola consulta
+            todas_las_solicitudes = consultas.SOLICITUDES_HISTORIAL.filas(connection)
             
         return render_template('historial_solicitudes.html', solicitudes=todas_las_solicitudes)
 
@@ -1023,14 +1389,14 @@ def historial_solicitudes():
 
 
 @app.route('/admin/borrar_solicitud/<int:solicitud_id>', methods=['POST'])
+@ENRUTADOR_BD.escritura
 def borrar_solicitud_permanente(solicitud_id):
     if 'username' not in session or session.get('role') != 'administrador':
         return jsonify({'success': False, 'message': 'No autorizado'}), 403
 
     try:
         with engine.connect() as connection:
-            sql = text("DELETE FROM solicitudes_acceso WHERE id = :sid")
-            result = connection.execute(sql, {'sid': solicitud_id})
+            result = consultas.SOLICITUD_ELIMINAR.ejecutar(connection, sid=solicitud_id)
             
             if result.rowcount == 0:
                 flash('La solicitud no fue encontrada (probablemente ya fue eliminada).', 'warning')
@@ -1054,10 +1420,9 @@ def inject_pending_requests_count():
     # Solo hacemos la consulta a la BD si el usuario es un administrador
     if session.get('role') == 'administrador':
         try:
-            with engine.connect() as connection:
+            with ENRUTADOR_BD.connect() as connection:
                 # Contamos las solicitudes con estado 'pendiente'
-                sql = text("SELECT COUNT(id) FROM solicitudes_acceso WHERE estado = 'pendiente'")
-                count = connection.execute(sql).scalar_one_or_none() or 0
+                count = consultas.SOLICITUDES_PENDIENTES_TOTAL.escalar(connection) or 0
                 return dict(solicitudes_pendientes_count=count)
         except Exception as e:
             print(f"Error al inyectar el contador de solicitudes: {e}")
@@ -1074,6 +1439,7 @@ def buscar_items():
 
 # --- API INTERNA PARA BÚSQUEDA DE ITEMS (¡NUEVO!) ---
 @app.route('/api/search_items')
+@ENRUTADOR_BD.lectura
 def search_items():
     if 'username' not in session: 
         return jsonify({'error': 'No autorizado'}), 401
@@ -1083,17 +1449,9 @@ def search_items():
         return jsonify([])
 
     try:
-        with engine.connect() as connection:
+        with ENRUTADOR_BD.connect() as connection:
             # Buscamos en la tabla 'items_medicos' por código o descripción
-            sql_query = text("""
-                SELECT codigo, descripcion, tipo 
-                FROM items_medicos 
-                WHERE descripcion ILIKE :query OR codigo ILIKE :query
-                LIMIT 50;
-            """)
-            result = connection.execute(sql_query, {'query': f'%{query}%'})
-            
-            items = [dict(row._mapping) for row in result]
+            items = consultas.ITEMS_BUSCAR.dicts(connection, query=f'%{query}%')
             return jsonify(items)
             
     except Exception as e:
@@ -1102,6 +1460,7 @@ def search_items():
 
 # --- RUTA PARA LA PÁGINA DE SUGERENCIAS (¡NUEVO!) ---
 @app.route('/enviar_sugerencia', methods=['GET', 'POST'])
+@ENRUTADOR_BD.escritura
 def enviar_sugerencia():
     if 'username' not in session:
         return redirect(url_for('login'))
@@ -1112,10 +1471,7 @@ def enviar_sugerencia():
 
         if contenido_sugerencia and user_id:
             try:
-                with engine.connect() as connection:
-                    sql = text("INSERT INTO sugerencias (usuario_id, contenido) VALUES (:uid, :contenido)")
-                    connection.execute(sql, {'uid': user_id, 'contenido': contenido_sugerencia})
-                    connection.commit()
+                ESCRITURAS_DIFERIDAS.encolar('sugerencias', {'usuario_id': user_id, 'contenido': contenido_sugerencia})
                 flash('¡Gracias! Tu sugerencia ha sido enviada con éxito.', 'success')
             except Exception as e:
                 print(f"Error al guardar sugerencia: {e}")
@@ -1128,21 +1484,16 @@ def enviar_sugerencia():
     return render_template('enviar_sugerencia.html')
 # --- RUTA PARA VER LAS SUGERENCIAS (SOLO ADMIN - ¡NUEVO!) ---
 @app.route('/ver_sugerencias')
+@ENRUTADOR_BD.lectura
 def ver_sugerencias():
     if session.get('role') != 'administrador':
         flash('Acceso no autorizado.', 'danger')
         return redirect(url_for('menu'))
 
     try:
-        with engine.connect() as connection:
-            # Unimos la tabla de sugerencias con la de usuarios para obtener el nombre de usuario
-            sql = text("""
-                SELECT s.id, s.contenido, s.estado, s.created_at, u.username
-                FROM sugerencias s
-                JOIN usuarios u ON s.usuario_id = u.id
-                ORDER BY s.created_at DESC;
-            """)
-            lista_sugerencias = connection.execute(sql).fetchall()
+        with ENRUTADOR_BD.connect() as connection:
+            # Sugerencias con el nombre de usuario
+            lista_sugerencias = consultas.SUGERENCIAS_LISTADO.filas(connection)
     except Exception as e:
         print(f"Error al obtener sugerencias: {e}")
         flash('Error al cargar las sugerencias.', 'danger')
@@ -1176,16 +1527,22 @@ def asistente_sugerencias():
         return jsonify({"error": "Se requiere un código CIE-10"}), 400
     
     # Buscamos en el cerebro la guía que coincida con el código CIE-10
-    # Esta lógica no cambia, pero es crucial.
+    # Con el paquete compilado usamos su índice; si no, recorremos las reglas.
+    base = BASE_CONOCIMIENTO.obtener()
     regla_encontrada = None
-    for regla in CONOCIMIENTO_CLINICO:
-        if regla.get('diagnostico_cie10') == codigo_cie10:
-            regla_encontrada = regla
-            break
-        # Añadimos una lógica para manejar también los códigos de referencia
-        elif 'referencias_cie10' in regla and codigo_cie10 in regla['referencias_cie10']:
-            regla_encontrada = regla
-            break
+    if base.desde_paquete:
+        indice = PAQUETE_DATOS.indice_guia_por_cie10(codigo_cie10)
+        if indice is not None:
+            regla_encontrada = base.reglas[indice]
+    else:
+        for regla in base.reglas:
+            if regla.get('diagnostico_cie10') == codigo_cie10:
+                regla_encontrada = regla
+                break
+            # Añadimos una lógica para manejar también los códigos de referencia
+            elif 'referencias_cie10' in regla and codigo_cie10 in regla['referencias_cie10']:
+                regla_encontrada = regla
+                break
 
     if regla_encontrada:
         # ¡ÉXITO! Si la encontramos, simplemente la devolvemos completa.
@@ -1196,6 +1553,24 @@ def asistente_sugerencias():
         return jsonify({"error": "No se encontraron recomendaciones para este diagnóstico."}), 404
 
 
+# --- API DE BÚSQUEDA POR SÍNTOMA O MEDICAMENTO EN LAS GUÍAS ---
+@app.route('/api/asistente_buscar')
+def asistente_buscar():
+    if 'username' not in session:
+        return jsonify({"error": "No autorizado"}), 401
+
+    consulta = request.args.get('q', '').strip()
+    if len(consulta) < 3:
+        return jsonify({"resultados": []})
+
+    limite = min(request.args.get('limite', 10, type=int), 50)
+    inicio = time.perf_counter()
+    resultados = BASE_CONOCIMIENTO.obtener().indice.buscar(consulta, limite=limite)
+    tiempo_ms = (time.perf_counter() - inicio) * 1000
+
+    return jsonify({"resultados": resultados, "tiempo_ms": round(tiempo_ms, 2)})
+
+
 # ==============================================================================
 #           (¡NUEVO!) RUTAS PARA BÚSQUEDA DE PROCEDIMIENTOS
 # ==============================================================================
@@ -1225,24 +1600,26 @@ def api_search_procedimientos():
     if len(query) < 2:
         return jsonify([])
 
+    supabase = obtener_supabase()
     if not supabase:
         return jsonify({'error': 'El servidor no pudo conectar con la base de datos de procedimientos.'}), 503
 
     try:
         # --- ¡LÓGICA SIMPLIFICADA! ---
         # 1. Normalizamos el término de búsqueda del usuario (mayúsculas y sin tildes)
-        query_normalizada = ''.join(c for c in query.upper() if c in 'ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789 ')
+        query_normalizada = normalizar_busqueda_procedimiento(query)
         search_pattern = f'%{query_normalizada}%'
         
         # 2. Buscamos directamente en las columnas ya normalizadas
-        response = supabase.table('procedimientos').select(
-            'cod_cpms', 
-            'nombre_prest', 
-            'tarifa_sis'
-        ).or_(
-            f'nombre_prest.ilike.{search_pattern},'
-            f'cod_cpms.ilike.{search_pattern}'
-        ).limit(50).execute()
+        with METRICAS.medir_llamada('supabase', 'buscar_procedimientos'):
+            response = supabase.table('procedimientos').select(
+                'cod_cpms', 
+                'nombre_prest', 
+                'tarifa_sis'
+            ).or_(
+                f'nombre_prest.ilike.{search_pattern},'
+                f'cod_cpms.ilike.{search_pattern}'
+            ).limit(50).execute()
 
         return jsonify(response.data)
             
@@ -1250,6 +1627,101 @@ def api_search_procedimientos():
         print(f"Error en la búsqueda de procedimientos: {e}")
         return jsonify({'error': 'Error en el servidor al buscar procedimientos.'}), 500
 
+# ==============================================================================
+#           CATÁLOGOS PARA BÚSQUEDA SIN CONEXIÓN (IndexedDB en el navegador)
+# ==============================================================================
+#  Las páginas de búsqueda descargan cada catálogo una vez (gzip, con versión),
+#  buscan localmente y luego solo piden el delta. Si algo falla, siguen usando
+#  las APIs de búsqueda de arriba. Ver catalogos_offline.py.
+
+CATALOGOS_OFFLINE = CatalogosOffline()
+PAGINA_CATALOGO_SUPABASE = 1000
+
+@CATALOGOS_OFFLINE.registrar('diagnosticos', ('codigo', 'descripcion'))
+def _catalogo_diagnosticos():
+    with ENRUTADOR_BD.connect() as connection:
+        return consultas.DIAGNOSTICOS_TODOS.filas(connection)
+
+@CATALOGOS_OFFLINE.registrar('items_medicos', ('codigo', 'descripcion', 'tipo'))
+def _catalogo_items_medicos():
+    with ENRUTADOR_BD.connect() as connection:
+        return consultas.ITEMS_TODOS.filas(connection)
+
+@CATALOGOS_OFFLINE.registrar('procedimientos', ('cod_cpms', 'nombre_prest', 'tarifa_sis'))
+def _catalogo_procedimientos():
+    supabase = obtener_supabase()
+    if not supabase:
+        raise RuntimeError("Supabase no está configurado.")
+    filas, desde = [], 0
+    while True:
+        # PostgREST limita cada respuesta: se pide por páginas, en orden estable.
+        with METRICAS.medir_llamada('supabase', 'catalogo_procedimientos'):
+            pagina = supabase.table('procedimientos').select(
+                'cod_cpms', 'nombre_prest', 'tarifa_sis'
+            ).order('cod_cpms').range(desde, desde + PAGINA_CATALOGO_SUPABASE - 1).execute().data
+        filas.extend((p['cod_cpms'], p['nombre_prest'], p['tarifa_sis']) for p in pagina)
+        if len(pagina) < PAGINA_CATALOGO_SUPABASE:
+            return filas
+        desde += PAGINA_CATALOGO_SUPABASE
+
+@CATALOGOS_OFFLINE.registrar('codigos_prestacionales', ('codigo', 'descripcion', 'categoria', 'actividades'))
+def _catalogo_codigos_prestacionales():
+    return [(c['codigo'], c['descripcion'], c['categoria'], sorted(RELACION_CODIGO_ACTIVIDADES.get(c['codigo'], ())))
+            for c in CODIGOS_PRESTACIONALES_CATEGORIZADOS]
+
+@CATALOGOS_OFFLINE.registrar('actividades_preventivas', ('codigo', 'descripcion'))
+def _catalogo_actividades_preventivas():
+    return list(ACTIVIDADES_PREVENTIVAS_MAP.items())
+
+@app.route('/api/catalogos')
+@ENRUTADOR_BD.lectura
+def api_catalogos():
+    if 'username' not in session:
+        return jsonify({'error': 'No autorizado'}), 401
+    nombres = [n for n in request.args.get('nombres', '').split(',') if n]
+    return jsonify(CATALOGOS_OFFLINE.manifiesto(nombres))
+
+@app.route('/api/catalogos/<nombre>')
+@ENRUTADOR_BD.lectura
+def api_catalogo_paquete(nombre):
+    if 'username' not in session:
+        return jsonify({'error': 'No autorizado'}), 401
+    try:
+        catalogo = CATALOGOS_OFFLINE.obtener(nombre)
+        if catalogo is None:
+            return jsonify({'error': 'Catálogo no encontrado'}), 404
+        datos, version = catalogo.paquete()
+    except Exception as e:
+        print(f"ERROR: No se pudo armar el catálogo '{nombre}': {e}")
+        return jsonify({'error': 'Error en el servidor'}), 500
+
+    usar_gzip = 'gzip' in request.headers.get('Accept-Encoding', '')
+    respuesta = Response(datos if usar_gzip else gzip.decompress(datos), mimetype='application/x-ndjson')
+    if usar_gzip:
+        respuesta.headers['Content-Encoding'] = 'gzip'
+    respuesta.set_etag(version + ('-gz' if usar_gzip else ''))
+    # Con '?v=<versión>' la URL identifica un contenido que ya no cambia.
+    if request.args.get('v') == version:
+        respuesta.headers['Cache-Control'] = 'private, max-age=31536000, immutable'
+    else:
+        respuesta.headers['Cache-Control'] = 'private, no-cache'
+    respuesta.vary.update(('Cookie', 'Accept-Encoding'))
+    return respuesta.make_conditional(request)
+
+@app.route('/api/catalogos/<nombre>/delta')
+@ENRUTADOR_BD.lectura
+def api_catalogo_delta(nombre):
+    if 'username' not in session:
+        return jsonify({'error': 'No autorizado'}), 401
+    try:
+        catalogo = CATALOGOS_OFFLINE.obtener(nombre)
+        if catalogo is None:
+            return jsonify({'error': 'Catálogo no encontrado'}), 404
+        return jsonify(catalogo.delta(request.args.get('desde', '')))
+    except Exception as e:
+        print(f"ERROR: No se pudo calcular el delta del catálogo '{nombre}': {e}")
+        return jsonify({'error': 'Error en el servidor'}), 500
+
 # ==============================================================================
 #      (ARQUITECTURA DEFINITIVA) RUTAS PARA EL ANALIZADOR DE GUÍAS
 # ==============================================================================
@@ -1267,8 +1739,60 @@ def analizar_guia_page():
     return render_template('analizar_guia.html')
 
 
+# --- CATÁLOGOS EN MEMORIA PARA EL ANALIZADOR ---
+# Se cargan la primera vez que se analiza una guía y se reutilizan en el proceso.
+ANALIZADOR_GUIAS = None
+_lock_analizador = threading.Lock()
+
+def obtener_analizador_guias():
+    """Construye el analizador con los catálogos CIE-10, de items y de procedimientos."""
+    global ANALIZADOR_GUIAS
+    if ANALIZADOR_GUIAS is not None:
+        return ANALIZADOR_GUIAS
+
+    with _lock_analizador:
+        if ANALIZADOR_GUIAS is not None:
+            return ANALIZADOR_GUIAS
+
+        with engine.connect() as connection:
+            codigos_cie10 = [row.codigo for row in consultas.DIAGNOSTICOS_TODOS.filas(connection)]
+            items = [(row.codigo, row.descripcion) for row in consultas.ITEMS_TODOS.filas(connection)]
+
+        # Los códigos del catálogo oficial y los de la base de conocimiento también son válidos.
+        if PAQUETE_DATOS:
+            codigos_cie10.extend(PAQUETE_DATOS.codigos_cie10())
+        for regla in BASE_CONOCIMIENTO.obtener().reglas:
+            codigos_cie10.append(regla.get('diagnostico_cie10'))
+            codigos_cie10.extend(regla.get('referencias_cie10', []))
+
+        procedimientos = []
+        supabase = obtener_supabase()
+        if supabase:
+            # Supabase devuelve como máximo 1000 filas por consulta: paginamos.
+            desde = 0
+            while True:
+                with METRICAS.medir_llamada('supabase', 'catalogo_procedimientos'):
+                    response = supabase.table('procedimientos').select('cod_cpms', 'nombre_prest').range(desde, desde + 999).execute()
+                procedimientos.extend((fila['cod_cpms'], fila['nombre_prest']) for fila in response.data)
+                if len(response.data) < 1000:
+                    break
+                desde += 1000
+
+        ANALIZADOR_GUIAS = AnalizadorGuias(codigos_cie10, items, procedimientos)
+        print(f"INFO: Analizador de guías listo con {len(ANALIZADOR_GUIAS.codigos_cie10)} códigos CIE-10 y {ANALIZADOR_GUIAS.total_nombres} nombres de catálogo.")
+        return ANALIZADOR_GUIAS
+
+
+@BASE_CONOCIMIENTO.al_actualizar
+def _descartar_analizador_guias(base):
+    """El analizador incluye los códigos de la base de conocimiento: se reconstruye con la nueva versión."""
+    global ANALIZADOR_GUIAS
+    with _lock_analizador:
+        ANALIZADOR_GUIAS = None
+
+
 # --- RUTA PARA REALIZAR EL ANÁLISIS INTERNO DE MANUS ---
-# Esta ruta recibe el texto y utiliza la inteligencia de Manus para un análisis dinámico.
+# Esta ruta recibe el texto y devuelve un borrador con el esquema de 'conocimiento_clinico.json'.
 @app.route('/api/analizar_con_manus', methods=['POST'])
 def analizar_con_manus_api():
     if session.get('role') != 'administrador':
@@ -1282,31 +1806,14 @@ def analizar_con_manus_api():
 
         print(f"INFO: Manus ha recibido {len(texto_pdf)} caracteres para análisis interno.")
 
-        # 2. ¡ANÁLISIS REAL POR MANUS!
-        # Lógica interna basada en patrones y palabras clave.
-        
-        diagnostico_cie10 = "No encontrado"
-        match = re.search(r'[A-Z][0-9]{2}\.?[0-9]?', texto_pdf)
-        if match:
-            diagnostico_cie10 = match.group(0).replace('.', '').upper()
-
-        nombre_guia = "Guía sin nombre"
-        match_guia = re.search(r'Guía de Práctica Clínica para (.+)', texto_pdf)
-        if match_guia:
-            nombre_guia = match_guia.group(0)
-
-        # Generamos una respuesta JSON dinámica basada en el texto
-        json_resultado = {
-          "diagnostico_cie10": diagnostico_cie10,
-          "nombre_guia": nombre_guia,
-          "notas_clinicas": f"Análisis REAL realizado por Manus. Se procesaron {len(texto_pdf)} caracteres. El diagnóstico principal identificado es {diagnostico_cie10}.",
-          "analisis_bruto": texto_pdf[:500] + "..." # Devolvemos un fragmento del texto para demostrar que es dinámico
-        }
-
-        print("INFO: Manus ha completado el análisis REAL y devuelve el JSON.")
-        
-        # 3. Devolvemos el JSON generado
-        return jsonify(json_resultado)
+        # 2. Un solo recorrido del texto: códigos CIE-10 validados contra el catálogo,
+        #    medicamentos, insumos y procedimientos, y división en secciones.
+        borrador, estadisticas = obtener_analizador_guias().analizar(texto_pdf)
+
+        print(f"INFO: Manus ha completado el análisis: {estadisticas}")
+
+        # 3. Devolvemos el borrador listo para copiar a la base de conocimiento
+        return jsonify(borrador)
 
     except Exception as e:
         print(f"ERROR en el análisis de Manus: {e}")
@@ -1325,12 +1832,12 @@ def gestionar_ejemplo_page(plantilla_id):
     
     try:
         with engine.connect() as connection:
-            sql = text("SELECT id, tipo_atencion FROM plantillas WHERE id = :id")
-            plantilla = connection.execute(sql, {'id': plantilla_id}).first()
+            plantilla = consultas.PLANTILLA_RESUMEN.primera(connection, id=plantilla_id)
             if not plantilla:
                 flash(f"Error: No se encontró la plantilla con ID {plantilla_id}.", "danger")
                 return redirect(url_for('ver_plantillas'))
-            return render_template('gestionar_ejemplo.html', plantilla=plantilla)
+            return render_template('gestionar_ejemplo.html', plantilla=plantilla,
+                                   limite_mb=GESTOR_EJEMPLOS.limite // (1024 * 1024))
     except Exception as e:
         flash(f"Error al cargar la plantilla: {e}", "danger")
         return redirect(url_for('ver_plantillas'))
@@ -1340,10 +1847,16 @@ def gestionar_ejemplo_page(plantilla_id):
 #      (¡VERSIÓN FINAL Y CORREGIDA!) RUTA API PARA SUBIR EJEMPLO
 # ==============================================================================
 @app.route('/api/upload_ejemplo/<int:plantilla_id>', methods=['POST'])
+@ENRUTADOR_BD.escritura
 def upload_ejemplo_api(plantilla_id):
     if session.get('role') != 'administrador':
         return jsonify({'error': 'No autorizado'}), 403
 
+    # Rechazo temprano (antes de leer el formulario): no tiene sentido recibir un cuerpo más grande que el límite.
+    if request.content_length and request.content_length > GESTOR_EJEMPLOS.limite + 64 * 1024:
+        flash(f'El archivo supera el tamaño máximo de {GESTOR_EJEMPLOS.limite // (1024 * 1024)} MB.', 'danger')
+        return redirect(url_for('gestionar_ejemplo_page', plantilla_id=plantilla_id))
+
     if 'ejemploPdf' not in request.files:
         flash('No se encontró el archivo en la solicitud.', 'danger')
         return redirect(url_for('gestionar_ejemplo_page', plantilla_id=plantilla_id))
@@ -1354,40 +1867,137 @@ def upload_ejemplo_api(plantilla_id):
         flash('No se seleccionó ningún archivo.', 'warning')
         return redirect(url_for('gestionar_ejemplo_page', plantilla_id=plantilla_id))
 
-    if file and file.filename.endswith('.pdf'):
-        try:
-            # --- ¡CAMBIO CRÍTICO AQUÍ! ---
-            # 1. Leemos las claves desde las variables de entorno.
-            url = os.environ.get('SUPABASE_URL')
-            service_key = os.environ.get('SUPABASE_SERVICE_KEY') # <-- Usamos la clave de servicio
-
-            # 2. Creamos un cliente de Supabase TEMPORAL solo para esta operación,
-            #    pero esta vez con los superpoderes de la clave de servicio.
-            supabase_admin = create_client(url, service_key)
-            
-            # 3. El resto del código es igual, pero ahora se ejecuta con el cliente "admin".
-            file_path_in_bucket = f"ejemplo_plantilla_{plantilla_id}.pdf"
-            file_bytes = file.read()
-            
-            supabase_admin.storage.from_('ejemplos-plantillas').upload(
-                path=file_path_in_bucket,
-                file=file_bytes,
-                file_options={"content-type": "application/pdf", "upsert": "true"}
-            )
-            
+    try:
+        # Se lee por bloques, se valida la firma %PDF- y, si el contenido es igual
+        # al ejemplo actual (mismo SHA-256), no se vuelve a subir.
+        resultado = GESTOR_EJEMPLOS.guardar(plantilla_id, file.stream)
+        if resultado['subido']:
             flash(f'¡Éxito! El archivo de ejemplo para la plantilla ID {plantilla_id} se ha actualizado.', 'success')
-
-        except Exception as e:
-            error_message = str(e)
-            if hasattr(e, 'message'):
-                error_message = e.message
-            print(f"ERROR al subir a Supabase con clave de servicio: {error_message}")
-            flash(f'Ocurrió un error al subir el archivo a Supabase: {error_message}', 'danger')
-    else:
-        flash('Formato de archivo no válido. Por favor, sube un archivo PDF.', 'danger')
+        else:
+            flash(f'El archivo es idéntico al ejemplo actual de la plantilla ID {plantilla_id}; no fue necesario volver a subirlo.', 'info')
+    except ErrorEjemplo as e:
+        flash(f'Formato de archivo no válido: {e}', 'danger')
+    except Exception as e:
+        error_message = str(e)
+        if hasattr(e, 'message'):
+            error_message = e.message
+        print(f"ERROR al subir a Supabase con clave de servicio: {error_message}")
+        flash(f'Ocurrió un error al subir el archivo a Supabase: {error_message}', 'danger')
 
     return redirect(url_for('gestionar_ejemplo_page', plantilla_id=plantilla_id))
 
 
+# ==============================================================================
+#           SALUD Y CALENTAMIENTO (/healthz, /readyz?warm=1)
+# ==============================================================================
+# '/healthz' solo confirma que el proceso responde. '/readyz' comprueba la base de
+# datos; con '?warm=1' además crea por adelantado todo lo perezoso (conexiones,
+# índices, clientes, plantillas Jinja) y devuelve cuánto tardó cada paso.
+CALENTAMIENTO = Calentamiento()
+CONEXIONES_CALENTAMIENTO = int(os.environ.get('CONEXIONES_CALENTAMIENTO', '2'))
+
+
+def _ping_base_datos(conexiones=1):
+    """Abre 'conexiones' conexiones a la vez (para que el pool las conserve) y ejecuta SELECT 1."""
+    tamano_pool = getattr(engine.pool, 'size', lambda: 1)()
+    with ExitStack() as pila:
+        for _ in range(max(1, min(conexiones, tamano_pool))):
+            connection = pila.enter_context(engine.connect())
+            consultas.PING.ejecutar(connection)
+    return {"conexiones": max(1, min(conexiones, tamano_pool))}
+
+
+@CALENTAMIENTO.paso('base_datos', requerido=True)
+def _calentar_base_datos():
+    return _ping_base_datos(CONEXIONES_CALENTAMIENTO)
+
+@CALENTAMIENTO.paso('cliente_supabase')
+def _calentar_supabase():
+    return {"configurado": obtener_supabase() is not None}
+
+@CALENTAMIENTO.paso('base_conocimiento')
+def _calentar_conocimiento():
+    base = BASE_CONOCIMIENTO.obtener()
+    return {"reglas": len(base.reglas), "version": base.version}
+
+@CALENTAMIENTO.paso('indice_plantillas')
+def _calentar_indice_plantillas():
+    return {"plantillas": obtener_indice_plantillas().total_plantillas()}
+
+@CALENTAMIENTO.paso('motores_clinicos')
+def _calentar_motores_clinicos():
+    for recurso in (VALIDADOR_PLANTILLAS, MOTOR_ANEMIA, TABLA_CRECIMIENTO):
+        recurso.obtener()
+
+@CALENTAMIENTO.paso('analizador_guias')
+def _calentar_analizador_guias():
+    return {"codigos_cie10": len(obtener_analizador_guias().codigos_cie10)}
+
+@CALENTAMIENTO.paso('manifiesto_ejemplos')
+def _calentar_manifiesto_ejemplos():
+    manifiesto = GESTOR_EJEMPLOS.manifiesto(esperar=True)
+    return {"ejemplos": None if manifiesto is None else len(manifiesto)}
+
+@CALENTAMIENTO.paso('modulo_pdf')
+def _calentar_modulo_pdf():
+    # La descarga de PDF no debe pagar la importación ni la lectura de las fuentes.
+    import pdf_plantillas
+    return {"fuentes": len(pdf_plantillas.cargar_fuentes())}
+
+@CALENTAMIENTO.paso('plantillas_jinja')
+def _calentar_plantillas_jinja():
+    nombres = [n for n in app.jinja_env.list_templates() if n.endswith('.html')]
+    for nombre in nombres:
+        app.jinja_env.get_template(nombre)
+    return {"plantillas": len(nombres)}
+
+
+@app.route('/healthz')
+def healthz():
+    return jsonify({"estado": "ok"})
+
+@app.route('/readyz')
+def readyz():
+    if request.args.get('warm') == '1':
+        # Sin sesión, solo la primera llamada del proceso calienta; luego se
+        # devuelve el reporte guardado. Un administrador puede forzar otra pasada.
+        reporte = CALENTAMIENTO.ejecutar(forzar=session.get('role') == 'administrador')
+        return jsonify(reporte), 200 if reporte["listo"] else 503
+
+    inicio = time.perf_counter()
+    try:
+        _ping_base_datos()
+    except Exception as e:
+        print(f"ERROR: /readyz no pudo conectarse a la base de datos: {e}")
+        return jsonify({"listo": False, "error": type(e).__name__}), 503
+    return jsonify({
+        "listo": True,
+        "base_datos_ms": round((time.perf_counter() - inicio) * 1000, 1),
+        "calentado": CALENTAMIENTO.ultimo is not None,
+        "replica": ENRUTADOR_BD.estado(),
+        "recursos": {
+            "supabase": SUPABASE_CLIENTE.creado(),
+            "base_conocimiento": BASE_CONOCIMIENTO.creado(),
+            "indice_plantillas": INDICE_PLANTILLAS.vigente(),
+            "analizador_guias": ANALIZADOR_GUIAS is not None,
+        },
+    })
+
+
+# ==============================================================================
+#           PERFIL DE ARRANQUE (PERFIL_ARRANQUE=1)
+# ==============================================================================
+if perfil_arranque.activo():
+    print(perfil_arranque.reporte())
+
+    @app.after_request
+    def reportar_primera_respuesta(response):
+        # Solo interesa la primera petición del proceso (la del arranque en frío).
+        if perfil_arranque.activo():
+            perfil_arranque.desactivar()
+            print(f"INFO: Primera respuesta ({request.path}) lista.\n{perfil_arranque.reporte()}")
+        return response
+
+
 if __name__ == '__main__':
     app.run(debug=True)
@@ -0,0 +1,135 @@
+# ==============================================================================
+#           ÍNDICE INVERTIDO: CÓDIGO (CIE-10, ITEM, CPMS) -> PLANTILLAS
+# ==============================================================================
+#  Responde "¿qué plantillas mencionan el diagnóstico E119 o el item X?" sin
+#  abrir cada plantilla. Se construye con una sola consulta a 'plantillas' y se
+#  actualiza en memoria cada vez que se guarda o elimina una plantilla.
+#
+#  Las listas de la plantilla se escriben a mano ("E11.9 - Diabetes...", "E119"),
+#  así que la clave de cada entrada es su primer código normalizado: mayúsculas,
+#  sin tildes y sin puntos. Un operador @> / && sobre el arreglo en PostgreSQL
+#  solo encontraría coincidencias exactas del texto completo.
+# ==============================================================================
+
+import threading
+import time
+from functools import lru_cache
+
+from texto_clinico import tokenizar
+
+# Grupo de búsqueda -> columnas de 'plantillas' que lo componen.
+CAMPOS_POR_GRUPO = {
+    'diagnosticos': ('diagnostico_principal', 'diagnosticos_complementarios', 'diagnosticos_excluyentes'),
+    'medicamentos': ('medicamentos_relacionados',),
+    'insumos': ('insumos_relacionados',),
+    'procedimientos': ('procedimientos_obligatorios', 'procedimientos_excluyentes', 'otros_procedimientos'),
+}
+CAMPOS_INDEXADOS = tuple(campo for campos in CAMPOS_POR_GRUPO.values() for campo in campos)
+
+# Entre workers no hay aviso de cambios: cada índice se reconstruye pasado este tiempo.
+VIGENCIA_SEGUNDOS = 300
+
+
+@lru_cache(maxsize=65536)
+def clave_codigo(entrada):
+    """'E11.9 - Diabetes mellitus' -> 'E119'. Devuelve None si la entrada no tiene texto."""
+    tokens = tokenizar(entrada)
+    if not tokens:
+        return None
+    return tokens[0].replace('.', '')
+
+
+class IndicePlantillas:
+    """Índice invertido en memoria: clave de código -> {id_plantilla: {campos}}."""
+
+    def __init__(self, vigencia=VIGENCIA_SEGUNDOS):
+        self.vigencia = vigencia
+        self._lock = threading.Lock()
+        self._indice = {}
+        self._claves_por_plantilla = {}
+        self._resumen = {}
+        self._cargado_en = None
+
+    def vigente(self):
+        return self._cargado_en is not None and time.monotonic() - self._cargado_en < self.vigencia
+
+    def cargar(self, filas):
+        """Reemplaza el índice completo con las filas de 'plantillas' (mappings)."""
+        indice, claves_por_plantilla, resumen = {}, {}, {}
+        for fila in filas:
+            self._agregar(fila, indice, claves_por_plantilla, resumen)
+        with self._lock:
+            self._indice, self._claves_por_plantilla, self._resumen = indice, claves_por_plantilla, resumen
+            self._cargado_en = time.monotonic()
+
+    def actualizar(self, fila):
+        """Vuelve a indexar una plantilla recién guardada (alta o edición)."""
+        with self._lock:
+            self._quitar(fila['id'])
+            self._agregar(fila, self._indice, self._claves_por_plantilla, self._resumen)
+
+    def eliminar(self, plantilla_id):
+        with self._lock:
+            self._quitar(plantilla_id)
+
+    @staticmethod
+    def _agregar(fila, indice, claves_por_plantilla, resumen):
+        plantilla_id = fila['id']
+        claves = set()
+        for campo in CAMPOS_INDEXADOS:
+            for entrada in fila.get(campo) or ():
+                clave = clave_codigo(entrada)
+                if clave:
+                    indice.setdefault(clave, {}).setdefault(plantilla_id, set()).add(campo)
+                    claves.add(clave)
+        claves_por_plantilla[plantilla_id] = claves
+        resumen[plantilla_id] = {
+            "id": plantilla_id,
+            "tipo_atencion": fila.get('tipo_atencion'),
+            "codigo_prestacional": fila.get('codigo_prestacional'),
+        }
+
+    def _quitar(self, plantilla_id):
+        for clave in self._claves_por_plantilla.pop(plantilla_id, ()):
+            plantillas = self._indice.get(clave)
+            if plantillas is not None:
+                plantillas.pop(plantilla_id, None)
+                if not plantillas:
+                    del self._indice[clave]
+        self._resumen.pop(plantilla_id, None)
+
+    def buscar(self, codigos, grupos=None, todos=False):
+        """Plantillas que mencionan alguno (o todos, con todos=True) de los códigos.
+
+        'grupos' limita la búsqueda a 'diagnosticos', 'medicamentos', 'insumos' o
+        'procedimientos'. Cada resultado indica en qué columnas aparece el código.
+        """
+        campos_validos = set(CAMPOS_INDEXADOS) if not grupos else {
+            campo for grupo in grupos for campo in CAMPOS_POR_GRUPO.get(grupo, ())
+        }
+        claves = {clave for clave in map(clave_codigo, codigos) if clave}
+
+        with self._lock:
+            encontrados = None
+            campos_por_plantilla = {}
+            for clave in claves:
+                ids = set()
+                for plantilla_id, campos in self._indice.get(clave, {}).items():
+                    campos = campos & campos_validos
+                    if campos:
+                        ids.add(plantilla_id)
+                        campos_por_plantilla.setdefault(plantilla_id, set()).update(campos)
+                if encontrados is None:
+                    encontrados = ids
+                else:
+                    encontrados = encontrados & ids if todos else encontrados | ids
+
+            resultados = []
+            for plantilla_id in sorted(encontrados or ()):
+                resultado = dict(self._resumen[plantilla_id])
+                resultado["campos"] = sorted(campos_por_plantilla[plantilla_id])
+                resultados.append(resultado)
+        return resultados
+
+    def total_plantillas(self):
+        return len(self._resumen)
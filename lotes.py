@@ -0,0 +1,154 @@
+# ==============================================================================
+#           LECTURA Y RESPUESTA DE LOTES (CSV / JSON) PARA LAS APIS DE CÁLCULO
+# ==============================================================================
+#  Las APIs que clasifican muchos pacientes a la vez reciben un archivo CSV
+#  (campo 'archivo' del formulario o cuerpo text/csv) o una lista JSON, y
+#  convierten cada columna en un arreglo NumPy para evaluarla de una sola vez.
+# ==============================================================================
+
+import csv
+import io
+
+import numpy as np
+
+from texto_clinico import normalizar_texto
+
+LIMITE_FILAS = 200_000
+
+
+class ErrorLote(ValueError):
+    """El lote recibido no se puede leer (formato, columnas o tamaño)."""
+
+
+def _leer_csv(contenido):
+    if isinstance(contenido, bytes):
+        try:
+            contenido = contenido.decode('utf-8-sig')
+        except UnicodeDecodeError:
+            # Los CSV exportados desde Excel en Windows suelen venir en latin-1.
+            contenido = contenido.decode('latin-1')
+    muestra = contenido[:4096]
+    delimitador = ';' if muestra.count(';') > muestra.count(',') else ','
+    lector = csv.DictReader(io.StringIO(contenido), delimiter=delimitador)
+    if not lector.fieldnames:
+        raise ErrorLote("El archivo CSV está vacío.")
+    lector.fieldnames = [c.strip().lower() for c in lector.fieldnames]
+    filas = []
+    for fila in lector:
+        # DictReader deja las celdas de más bajo la clave None. Vacías (';;' al
+        # final, típico de Excel) se descartan; con datos, la fila está corrida.
+        sobrantes = fila.pop(None, None)
+        if sobrantes and any(str(valor).strip() for valor in sobrantes):
+            raise ErrorLote(f"La línea {lector.line_num} tiene más columnas que el encabezado.")
+        filas.append(fila)
+    return filas
+
+
+def leer_lote(peticion):
+    """Filas (lista de dicts) y formato de origen ('csv' o 'json') de una petición Flask."""
+    if 'archivo' in peticion.files:
+        filas, formato = _leer_csv(peticion.files['archivo'].read()), 'csv'
+    elif peticion.mimetype == 'text/csv':
+        filas, formato = _leer_csv(peticion.get_data()), 'csv'
+    elif peticion.is_json:
+        datos = peticion.get_json(silent=True)
+        if isinstance(datos, dict):
+            datos = datos.get('filas')
+        if not isinstance(datos, list) or not all(isinstance(f, dict) for f in datos):
+            raise ErrorLote("Se esperaba una lista JSON de filas (o {\"filas\": [...]}).")
+        filas = [{str(k).strip().lower(): v for k, v in fila.items()} for fila in datos]
+        formato = 'json'
+    else:
+        raise ErrorLote("Envíe un archivo CSV en el campo 'archivo' o una lista JSON.")
+
+    if not filas:
+        raise ErrorLote("El lote no tiene filas.")
+    if len(filas) > LIMITE_FILAS:
+        raise ErrorLote(f"El lote tiene {len(filas)} filas; el máximo es {LIMITE_FILAS}.")
+    return filas, formato
+
+
+def columnas_lote(filas):
+    """Unión de las columnas de todas las filas, en orden de aparición (las filas JSON pueden diferir)."""
+    return list(dict.fromkeys(nombre for fila in filas for nombre in fila))
+
+
+def columna(filas, *nombres):
+    """Valores de la primera columna presente entre 'nombres' (None si falta en una fila)."""
+    presentes = set().union(*filas)
+    for nombre in nombres:
+        if nombre in presentes:
+            return [fila.get(nombre) for fila in filas]
+    return [None] * len(filas)
+
+
+def a_numeros(valores):
+    """Arreglo float64; los vacíos o inválidos quedan como NaN. Acepta coma decimal."""
+    try:
+        # Camino rápido: todas las celdas son números (o textos numéricos con punto).
+        return np.array(valores, dtype=float)
+    except (TypeError, ValueError):
+        pass
+    resultado = np.full(len(valores), np.nan)
+    for i, valor in enumerate(valores):
+        if valor is None or valor == '':
+            continue
+        if isinstance(valor, (int, float)):
+            resultado[i] = valor
+            continue
+        try:
+            resultado[i] = float(str(valor).strip().replace(',', '.'))
+        except ValueError:
+            pass
+    return resultado
+
+
+def a_fechas(valores):
+    """Arreglo datetime64[D] desde 'AAAA-MM-DD' o 'DD/MM/AAAA'; los vacíos quedan como NaT."""
+    iso = []
+    for valor in valores:
+        valor = str(valor or '').strip()[:10]
+        if len(valor) == 10 and valor[2] == '/' and valor[5] == '/':
+            valor = f"{valor[6:]}-{valor[3:5]}-{valor[:2]}"
+        iso.append(valor or 'NaT')
+    try:
+        return np.array(iso, dtype='datetime64[D]')
+    except ValueError as e:
+        raise ErrorLote(f"Fecha inválida en el lote: {e}")
+
+
+def a_codigos(valores, equivalencias, por_defecto=-1):
+    """Convierte textos a códigos enteros según 'equivalencias' (texto normalizado -> código)."""
+    return np.array([equivalencias.get(normalizar_texto(v).strip(), por_defecto) for v in valores], dtype=np.int8)
+
+
+def csv_de_lote(filas, columnas_resultado, resultados):
+    """CSV de respuesta: las columnas de entrada (todas) y luego las del resultado.
+
+    Cada fila se escribe por nombre de columna, así que filas con claves distintas
+    o en otro orden no corren las celdas. 'resultados' trae, por fila, un dict o
+    una secuencia alineada con 'columnas_resultado'.
+    """
+    entrada = columnas_lote(filas)
+
+    def salida():
+        for fila, resultado in zip(filas, resultados):
+            if isinstance(resultado, dict):
+                resultado = [resultado.get(c, '') for c in columnas_resultado]
+            yield [fila.get(c, '') for c in entrada] + list(resultado)
+
+    return csv_en_partes(entrada + list(columnas_resultado), salida())
+
+
+def csv_en_partes(columnas, filas, tamano_parte=2000):
+    """Generador de texto CSV por bloques, para devolver lotes grandes con una respuesta en streaming."""
+    salida = io.StringIO()
+    escritor = csv.writer(salida)
+    escritor.writerow(columnas)
+    for i, fila in enumerate(filas, 1):
+        escritor.writerow(fila)
+        if i % tamano_parte == 0:
+            yield salida.getvalue()
+            salida.seek(0)
+            salida.truncate()
+    yield salida.getvalue()
@@ -0,0 +1,202 @@
+# ==============================================================================
+#           MÉTRICAS DE RENDIMIENTO (FORMATO PROMETHEUS)
+# ==============================================================================
+#  Sin dependencias nuevas y con un costo de microsegundos por petición:
+#    - histograma de latencia y conteo de códigos de estado por endpoint;
+#    - número de consultas SQL y tiempo en la base de datos por petición, con
+#      los eventos before/after_cursor_execute de SQLAlchemy (aplican a todo
+#      motor, también al que se crea de forma perezosa);
+#    - tiempo de las llamadas externas (Supabase) con 'medir_llamada'.
+#  'exportar()' devuelve el texto que lee Prometheus en /admin/metrics.
+#
+#  Los contadores son por proceso: con varios workers cada uno expone los suyos.
+# ==============================================================================
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LIMITES_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LIMITES_CONSULTAS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+
+class _Histograma:
+    __slots__ = ('conteos', 'suma', 'total')
+
+    def __init__(self, limites):
+        self.conteos = [0] * (len(limites) + 1)
+        self.suma = 0.0
+        self.total = 0
+
+    def observar(self, limites, valor):
+        self.conteos[bisect_left(limites, valor)] += 1
+        self.suma += valor
+        self.total += 1
+
+
+def _etiquetas(**valores):
+    partes = []
+    for nombre, valor in valores.items():
+        valor = str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        partes.append(f'{nombre}="{valor}"')
+    return '{' + ','.join(partes) + '}'
+
+
+class Metricas:
+    """Acumula las métricas del proceso; 'instalar(app)' engancha Flask y SQLAlchemy."""
+
+    def __init__(self, prefijo='gestor'):
+        self.prefijo = prefijo
+        self._lock = threading.Lock()
+        self._latencia = {}     # (endpoint, metodo) -> _Histograma
+        self._estados = {}      # (endpoint, metodo, estado) -> conteo
+        self._consultas = {}    # endpoint -> _Histograma de consultas por petición
+        self._sql = {}          # endpoint -> [consultas, segundos]
+        self._externas = {}     # (servicio, operacion) -> _Histograma
+        self._errores_externos = {}
+        self._sentencias = {}   # nombre -> _Histograma (ver consultas.py)
+        self.inicio = time.time()
+
+    # --------------------------------------------------------------------------
+    #   Registro
+    # --------------------------------------------------------------------------
+    def observar_peticion(self, endpoint, metodo, estado, segundos, consultas, segundos_sql):
+        with self._lock:
+            histograma = self._latencia.get((endpoint, metodo))
+            if histograma is None:
+                histograma = self._latencia[(endpoint, metodo)] = _Histograma(LIMITES_LATENCIA)
+            histograma.observar(LIMITES_LATENCIA, segundos)
+            clave = (endpoint, metodo, estado)
+            self._estados[clave] = self._estados.get(clave, 0) + 1
+
+            histograma = self._consultas.get(endpoint)
+            if histograma is None:
+                histograma = self._consultas[endpoint] = _Histograma(LIMITES_CONSULTAS)
+            histograma.observar(LIMITES_CONSULTAS, consultas)
+            acumulado = self._sql.setdefault(endpoint, [0, 0.0])
+            acumulado[0] += consultas
+            acumulado[1] += segundos_sql
+
+    @contextmanager
+    def medir_llamada(self, servicio, operacion):
+        """Mide una llamada externa: `with METRICAS.medir_llamada('supabase', 'procedimientos'):`."""
+        inicio = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            with self._lock:
+                clave = (servicio, operacion)
+                self._errores_externos[clave] = self._errores_externos.get(clave, 0) + 1
+            raise
+        finally:
+            segundos = time.perf_counter() - inicio
+            with self._lock:
+                histograma = self._externas.get((servicio, operacion))
+                if histograma is None:
+                    histograma = self._externas[(servicio, operacion)] = _Histograma(LIMITES_LATENCIA)
+                histograma.observar(LIMITES_LATENCIA, segundos)
+
+    def observar_sentencia(self, nombre, segundos):
+        """Tiempo de una sentencia del repositorio de consultas (se registra con consultas.observar)."""
+        with self._lock:
+            histograma = self._sentencias.get(nombre)
+            if histograma is None:
+                histograma = self._sentencias[nombre] = _Histograma(LIMITES_LATENCIA)
+            histograma.observar(LIMITES_LATENCIA, segundos)
+
+    # --------------------------------------------------------------------------
+    #   Enganches con Flask y SQLAlchemy
+    # --------------------------------------------------------------------------
+    def instalar(self, app):
+        @app.before_request
+        def _iniciar_medicion():
+            g.metricas_inicio = time.perf_counter()
+            g.metricas_consultas = 0
+            g.metricas_segundos_sql = 0.0
+
+        @app.after_request
+        def _registrar_medicion(response):
+            inicio = g.get('metricas_inicio')
+            if inicio is not None:
+                endpoint = request.url_rule.rule if request.url_rule else 'sin_ruta'
+                self.observar_peticion(endpoint, request.method, response.status_code,
+                                       time.perf_counter() - inicio,
+                                       g.metricas_consultas, g.metricas_segundos_sql)
+            return response
+
+        event.listen(Engine, 'before_cursor_execute', _antes_de_consulta)
+        event.listen(Engine, 'after_cursor_execute', _despues_de_consulta)
+        event.listen(Engine, 'handle_error', _consulta_fallida)
+
+    # --------------------------------------------------------------------------
+    #   Exportación
+    # --------------------------------------------------------------------------
+    def exportar(self):
+        """Texto en el formato de exposición de Prometheus (versión 0.0.4)."""
+        p = self.prefijo
+        lineas = []
+
+        def histograma(nombre, ayuda, limites, datos):
+            lineas.append(f"# HELP {nombre} {ayuda}")
+            lineas.append(f"# TYPE {nombre} histogram")
+            for etiquetas, h in datos:
+                acumulado = 0
+                for limite, conteo in zip(limites + ('+Inf',), h.conteos):
+                    acumulado += conteo
+                    lineas.append(f"{nombre}_bucket{_etiquetas(**etiquetas, le=limite)} {acumulado}")
+                lineas.append(f"{nombre}_sum{_etiquetas(**etiquetas)} {h.suma:.6f}")
+                lineas.append(f"{nombre}_count{_etiquetas(**etiquetas)} {h.total}")
+
+        def contador(nombre, ayuda, datos):
+            lineas.append(f"# HELP {nombre} {ayuda}")
+            lineas.append(f"# TYPE {nombre} counter")
+            for etiquetas, valor in datos:
+                lineas.append(f"{nombre}{_etiquetas(**etiquetas)} {valor}")
+
+        with self._lock:
+            histograma(f"{p}_peticion_segundos", "Latencia de las peticiones por endpoint.", LIMITES_LATENCIA,
+                       [({'endpoint': e, 'metodo': m}, h) for (e, m), h in sorted(self._latencia.items())])
+            contador(f"{p}_peticiones_total", "Peticiones atendidas por endpoint y código de estado.",
+                     [({'endpoint': e, 'metodo': m, 'estado': s}, n) for (e, m, s), n in sorted(self._estados.items())])
+            histograma(f"{p}_sql_consultas_por_peticion", "Consultas SQL ejecutadas en cada petición.", LIMITES_CONSULTAS,
+                       [({'endpoint': e}, h) for e, h in sorted(self._consultas.items())])
+            contador(f"{p}_sql_consultas_total", "Consultas SQL por endpoint.",
+                     [({'endpoint': e}, v[0]) for e, v in sorted(self._sql.items())])
+            contador(f"{p}_sql_segundos_total", "Tiempo en la base de datos por endpoint.",
+                     [({'endpoint': e}, f"{v[1]:.6f}") for e, v in sorted(self._sql.items())])
+            histograma(f"{p}_externo_segundos", "Latencia de las llamadas a servicios externos.", LIMITES_LATENCIA,
+                       [({'servicio': s, 'operacion': o}, h) for (s, o), h in sorted(self._externas.items())])
+            contador(f"{p}_externo_errores_total", "Llamadas a servicios externos que fallaron.",
+                     [({'servicio': s, 'operacion': o}, n) for (s, o), n in sorted(self._errores_externos.items())])
+            histograma(f"{p}_sentencia_segundos", "Latencia de cada sentencia SQL del repositorio de consultas.", LIMITES_LATENCIA,
+                       [({'sentencia': n}, h) for n, h in sorted(self._sentencias.items())])
+        lineas.append(f"# HELP {p}_inicio_segundos Momento de arranque del proceso (epoch).")
+        lineas.append(f"# TYPE {p}_inicio_segundos gauge")
+        lineas.append(f"{p}_inicio_segundos {self.inicio:.0f}")
+        return '\n'.join(lineas) + '\n'
+
+
+# --- Eventos de SQLAlchemy: el inicio se guarda en la conexión, el total en 'g' ---
+def _antes_de_consulta(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('metricas_inicios', []).append(time.perf_counter())
+
+
+def _despues_de_consulta(conn, cursor, statement, parameters, context, executemany):
+    inicios = conn.info.get('metricas_inicios')
+    if not inicios:
+        return
+    segundos = time.perf_counter() - inicios.pop()
+    if has_request_context() and 'metricas_consultas' in g:
+        g.metricas_consultas += 1
+        g.metricas_segundos_sql += segundos
+
+
+def _consulta_fallida(contexto):
+    # Una consulta que falla no llega a after_cursor_execute: se descarta su inicio.
+    if contexto.connection is not None and contexto.connection.info.get('metricas_inicios'):
+        contexto.connection.info['metricas_inicios'].pop()
@@ -0,0 +1,124 @@
+# ==============================================================================
+#           CACHÉ DE PÁGINAS PRE-RENDERIZADAS (ETag, Last-Modified, gzip)
+# ==============================================================================
+#  Las guías y tablas de referencia solo cambian cuando cambian sus datos (o, en
+#  'referencia_codigos', una vez al día). Aquí se guarda el HTML ya renderizado,
+#  en bytes y también comprimido con gzip, junto con su ETag y su fecha:
+#    - una visita repetida del mismo usuario no vuelve a ejecutar Jinja ni el
+#      context processor (que consulta la base de datos);
+#    - el navegador recibe Cache-Control/ETag/Last-Modified, así que dentro de
+#      'max_age' no pide nada y después solo revalida (304 sin cuerpo).
+#
+#  La barra de navegación muestra el usuario: la clave incluye usuario y rol, y
+#  la respuesta es 'private'. Si hay mensajes flash pendientes no se usa la caché.
+# ==============================================================================
+
+import gzip
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from flask import Response, request, session
+
+CAPACIDAD = 512
+MAX_AGE = 300
+
+
+def version_de(*datos):
+    """Huella corta de estructuras de datos (listas/dicts de constantes)."""
+    return hashlib.sha256(repr(datos).encode('utf-8')).hexdigest()[:12]
+
+
+class _Pagina:
+    __slots__ = ('cuerpo', 'cuerpo_gzip', 'etag', 'modificada')
+
+    def __init__(self, html):
+        self.cuerpo = html.encode('utf-8')
+        self.cuerpo_gzip = gzip.compress(self.cuerpo, compresslevel=9, mtime=0)
+        self.etag = hashlib.sha256(self.cuerpo).hexdigest()[:20]
+        self.modificada = datetime.now(timezone.utc).replace(microsecond=0)
+
+
+class CachePaginas:
+    """LRU en memoria de páginas renderizadas, por (página, versión, usuario, rol)."""
+
+    def __init__(self, capacidad=CAPACIDAD):
+        self.capacidad = capacidad
+        self._paginas = OrderedDict()
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+
+    def servir(self, nombre, version, renderizar, max_age=MAX_AGE):
+        """Respuesta para la página 'nombre'; 'renderizar()' solo se llama si no está en caché."""
+        if session.get('_flashes'):
+            return renderizar()
+
+        clave = (nombre, version, session.get('username'), session.get('role'))
+        with self._lock:
+            pagina = self._paginas.get(clave)
+            if pagina is not None:
+                self._paginas.move_to_end(clave)
+                self.aciertos += 1
+        if pagina is None:
+            pagina = _Pagina(renderizar())
+            with self._lock:
+                self.fallos += 1
+                self._paginas[clave] = pagina
+                # Las versiones anteriores de la misma página ya no se van a pedir.
+                for vieja in [c for c in self._paginas if c[0] == nombre and c[1] != version]:
+                    del self._paginas[vieja]
+                while len(self._paginas) > self.capacidad:
+                    self._paginas.popitem(last=False)
+        return self._respuesta(pagina, max_age)
+
+    @staticmethod
+    def _respuesta(pagina, max_age):
+        usar_gzip = 'gzip' in request.headers.get('Accept-Encoding', '')
+        respuesta = Response(pagina.cuerpo_gzip if usar_gzip else pagina.cuerpo, mimetype='text/html')
+        if usar_gzip:
+            respuesta.headers['Content-Encoding'] = 'gzip'
+        # Cada codificación tiene su propia ETag (los bytes enviados son distintos).
+        respuesta.set_etag(pagina.etag + ('-gz' if usar_gzip else ''))
+        respuesta.last_modified = pagina.modificada
+        respuesta.headers['Cache-Control'] = f'private, max-age={int(max_age)}'
+        respuesta.vary.update(('Cookie', 'Accept-Encoding'))
+        return respuesta.make_conditional(request)
+
+    def vaciar(self):
+        with self._lock:
+            self._paginas.clear()
+
+
+def segundos_hasta_medianoche():
+    ahora = datetime.now()
+    return max(1, int(86400 - (ahora.hour * 3600 + ahora.minute * 60 + ahora.second)))
+
+
+if __name__ == '__main__':
+    # Comparación: render completo (caché vacía) contra respuesta desde la caché.
+    from entorno_benchmark import preparar_app
+    index, _, _ = preparar_app(rondas_bcrypt=4)
+
+    cliente = index.app.test_client()
+    with cliente.session_transaction() as sesion:
+        sesion['username'], sesion['role'] = 'medico', 'usuario'
+    gz = {'Accept-Encoding': 'gzip'}
+
+    def medir(ruta, vaciar, repeticiones=200):
+        inicio = time.perf_counter()
+        for _ in range(repeticiones):
+            if vaciar:
+                index.CACHE_PAGINAS.vaciar()
+            respuesta = cliente.get(ruta, headers=gz)
+        return (time.perf_counter() - inicio) / repeticiones * 1000, respuesta
+
+    for ruta in ('/guia_anemia', '/guia_peso_talla', '/referencia_codigos'):
+        t_render, _ = medir(ruta, True)
+        t_cache, respuesta = medir(ruta, False)
+        condicional = cliente.get(ruta, headers=dict(gz, **{'If-None-Match': respuesta.headers['ETag']}))
+        html = cliente.get(ruta)
+        print(f"{ruta:<20} render {t_render:6.2f} ms  caché {t_cache:5.2f} ms  "
+              f"html {len(html.data)} B  gzip {len(respuesta.data)} B  revalidación: {condicional.status_code}")
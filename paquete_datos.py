@@ -0,0 +1,193 @@
+# ==============================================================================
+#           LECTOR DEL PAQUETE DE DATOS COMPILADO (datos_compilados.bin)
+# ==============================================================================
+#  En lugar de parsear 'cie10.json' (4 MB) y 'conocimiento_clinico.json' en cada
+#  arranque en frío, la aplicación abre el paquete binario que genera
+#  'compilar_datos.py'. El archivo se mapea en memoria (mmap) y cada registro se
+#  decodifica solo cuando se pide, así que abrirlo no cuesta casi nada.
+#
+#  Formato (versión FORMATO_PAQUETE):
+#    cabecera  : MAGIA, versión, orden de bytes, número de secciones
+#    directorio: por sección -> nombre (16 bytes), desplazamiento y largo
+#    secciones : arreglos uint32 (columnas) y bloques UTF-8 (cadenas y guías)
+#  Todas las cadenas del catálogo CIE-10 están internadas en una sola tabla; las
+#  columnas guardan el índice de la cadena, no el texto.
+# ==============================================================================
+
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+
+MAGIA = b'GPCD'
+FORMATO_PAQUETE = 1
+CABECERA = struct.Struct('<4sHBxI')
+ENTRADA_DIRECTORIO = struct.Struct('<16sQQ')
+ORDEN_BYTES = {'little': 0, 'big': 1}
+
+# Índice de cadena que significa "sin valor" (p. ej. una nota de exclusión sin código).
+SIN_CADENA = 0xFFFFFFFF
+
+RUTA_PAQUETE = 'datos_compilados.bin'
+
+
+class PaqueteInvalido(Exception):
+    """El archivo no es un paquete compilado o es de otra versión del formato."""
+
+
+class PaqueteDatos:
+    """Acceso de solo lectura, perezoso, a los datos compilados."""
+
+    def __init__(self, ruta=RUTA_PAQUETE):
+        self.ruta = ruta
+        self._archivo = open(ruta, 'rb')
+        try:
+            self._mapa = mmap.mmap(self._archivo.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self._archivo.close()
+            raise PaqueteInvalido(f"El paquete '{ruta}' está vacío.")
+
+        if len(self._mapa) < CABECERA.size:
+            self.cerrar()
+            raise PaqueteInvalido(f"El paquete '{ruta}' está truncado.")
+        magia, version, orden, n_secciones = CABECERA.unpack_from(self._mapa, 0)
+        if magia != MAGIA:
+            self.cerrar()
+            raise PaqueteInvalido(f"'{ruta}' no es un paquete de datos compilado.")
+        if version != FORMATO_PAQUETE:
+            self.cerrar()
+            raise PaqueteInvalido(f"'{ruta}' usa el formato {version}; se esperaba {FORMATO_PAQUETE}. Ejecute compilar_datos.py.")
+        if orden != ORDEN_BYTES[sys.byteorder]:
+            self.cerrar()
+            raise PaqueteInvalido(f"'{ruta}' fue compilado con otro orden de bytes.")
+
+        vista = memoryview(self._mapa)
+        self._secciones = {}
+        for i in range(n_secciones):
+            nombre, desplazamiento, largo = ENTRADA_DIRECTORIO.unpack_from(self._mapa, CABECERA.size + i * ENTRADA_DIRECTORIO.size)
+            self._secciones[nombre.rstrip(b'\0').decode('ascii')] = vista[desplazamiento:desplazamiento + largo]
+
+        self.meta = json.loads(bytes(self._secciones['meta']).decode('utf-8'))
+        self.version_datos = self.meta['version_datos']
+
+        self._cadenas = self._secciones['cadenas']
+        self._cadenas_off = self._columna('cadenas_off')
+        self._cie10_codigo = self._columna('cie10_codigo')
+        self._guias = self._secciones['guias']
+        self._guias_off = self._columna('guias_off')
+        self._guia_idx_codigo = self._columna('guia_idx_codigo')
+
+    def _columna(self, nombre):
+        return self._secciones[nombre].cast('I')
+
+    def cerrar(self):
+        self._secciones = {}
+        self._cadenas = self._cadenas_off = self._cie10_codigo = None
+        self._guias = self._guias_off = self._guia_idx_codigo = None
+        try:
+            self._mapa.close()
+        except BufferError:
+            # Aún hay vistas en uso; el mapa se libera cuando desaparezcan.
+            pass
+        self._archivo.close()
+
+    # --------------------------------------------------------------------------
+    #   Tabla de cadenas
+    # --------------------------------------------------------------------------
+    def cadena(self, indice):
+        if indice == SIN_CADENA:
+            return None
+        return str(self._cadenas[self._cadenas_off[indice]:self._cadenas_off[indice + 1]], 'utf-8')
+
+    def _buscar_ordenado(self, columna, clave):
+        """Búsqueda binaria sobre una columna de índices de cadena ordenada por texto."""
+        bajo, alto = 0, len(columna)
+        while bajo < alto:
+            medio = (bajo + alto) // 2
+            if self.cadena(columna[medio]) < clave:
+                bajo = medio + 1
+            else:
+                alto = medio
+        if bajo < len(columna) and self.cadena(columna[bajo]) == clave:
+            return bajo
+        return None
+
+    # --------------------------------------------------------------------------
+    #   Catálogo CIE-10 (columnas ordenadas por código)
+    # --------------------------------------------------------------------------
+    def total_cie10(self):
+        return len(self._cie10_codigo)
+
+    def codigos_cie10(self):
+        return [self.cadena(i) for i in self._cie10_codigo]
+
+    def buscar_cie10(self, codigo):
+        """Registro CIE-10 con el mismo esquema que 'cie10.json', o None."""
+        fila = self._buscar_ordenado(self._cie10_codigo, str(codigo).replace('.', '').upper())
+        if fila is None:
+            return None
+        return self.registro_cie10(fila)
+
+    def registro_cie10(self, fila):
+        incl_off = self._columna('cie10_incl_off')
+        excl_off = self._columna('cie10_excl_off')
+        inclusiones = self._columna('cie10_incl')
+        exclusiones = self._columna('cie10_excl')
+
+        notas_exclusion = []
+        for i in range(excl_off[fila], excl_off[fila + 1]):
+            codigo, descripcion = exclusiones[2 * i], exclusiones[2 * i + 1]
+            if codigo == SIN_CADENA:
+                notas_exclusion.append(self.cadena(descripcion))
+            else:
+                notas_exclusion.append({"codigo": self.cadena(codigo), "descripcion": self.cadena(descripcion)})
+
+        return {
+            "codigo_cie10": self.cadena(self._cie10_codigo[fila]),
+            "descripcion_oficial": self.cadena(self._columna('cie10_desc')[fila]),
+            "capitulo": self.cadena(self._columna('cie10_capitulo')[fila]),
+            "grupo": self.cadena(self._columna('cie10_grupo')[fila]),
+            "notas_inclusion": [self.cadena(inclusiones[i]) for i in range(incl_off[fila], incl_off[fila + 1])],
+            "notas_exclusion": notas_exclusion,
+        }
+
+    # --------------------------------------------------------------------------
+    #   Base de conocimiento clínico (una guía = un bloque JSON compacto)
+    # --------------------------------------------------------------------------
+    def total_guias(self):
+        return len(self._guias_off) - 1
+
+    def guia(self, indice):
+        return json.loads(str(self._guias[self._guias_off[indice]:self._guias_off[indice + 1]], 'utf-8'))
+
+    def guias(self):
+        return [self.guia(i) for i in range(self.total_guias())]
+
+    def conocimiento_vigente(self, ruta_fuente):
+        """True si las guías del paquete corresponden al JSON fuente actual."""
+        try:
+            with open(ruta_fuente, 'rb') as f:
+                huella = hashlib.sha256(f.read()).hexdigest()[:16]
+        except FileNotFoundError:
+            return True
+        return huella == self.meta.get('huella_conocimiento')
+
+    def indice_guia_por_cie10(self, codigo):
+        """Índice de la primera guía cuyo diagnóstico o referencias incluyen el código."""
+        fila = self._buscar_ordenado(self._guia_idx_codigo, codigo)
+        if fila is None:
+            return None
+        return self._columna('guia_idx_guia')[fila]
+
+
+def abrir_paquete(ruta=RUTA_PAQUETE):
+    """Abre el paquete si existe y es válido; si no, devuelve None."""
+    if not os.path.exists(ruta):
+        return None
+    try:
+        return PaqueteDatos(ruta)
+    except (PaqueteInvalido, KeyError, ValueError) as e:
+        print(f"ADVERTENCIA: No se pudo abrir '{ruta}': {e}")
+        return None
@@ -0,0 +1,208 @@
+# ==============================================================================
+#           PDF DE PLANTILLAS CON FUENTE UNICODE (DejaVu Sans incrustada)
+# ==============================================================================
+#  El PDF usaba Arial (fuente base del PDF, solo Latin-1) y pasaba el texto por
+#  encode('latin-1', 'replace'): '≥', '–', '…' o las comillas tipográficas que
+#  vienen de la base de datos salían como '?'. Ahora se incrusta DejaVu Sans
+#  (carpeta fuentes/, va dentro del despliegue) y el texto se escribe tal cual.
+#
+#  Incrustar una TTF cuesta leerla (cmap, anchos, métricas): ~40 ms por estilo.
+#  Se hace una sola vez por proceso; cada documento recibe una copia liviana que
+#  comparte las métricas y tiene su propio mapa de glifos usados y su propio
+#  TTFont, que fpdf recorta al subconjunto del documento al guardar.
+#
+#  La copia usa atributos internos de la fuente de fpdf (SubsetMap, desc,
+#  _hbfont): requirements.txt fija la versión de fpdf2 con la que se verificó.
+# ==============================================================================
+
+import copy
+import os
+import re
+import threading
+from io import BytesIO
+
+from fontTools import ttLib
+from fpdf import FPDF
+from fpdf.enums import XPos, YPos
+from fpdf.fonts import SubsetMap
+
+RUTA_FUENTES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fuentes')
+FAMILIA = 'DejaVu'
+ARCHIVOS_FUENTE = {'': 'DejaVuSans.ttf', 'B': 'DejaVuSans-Bold.ttf'}
+
+
+class _FuenteCompartida:
+    """Un estilo de la fuente leído una sola vez; entrega copias por documento."""
+
+    def __init__(self, estilo, ruta):
+        self.estilo = estilo
+        with open(ruta, 'rb') as archivo:
+            self.datos = archivo.read()
+        lector = FPDF()
+        lector.add_font(FAMILIA, estilo, ruta)
+        self.plantilla = lector.fonts[FAMILIA.lower() + estilo]
+        self.plantilla.ttfont.close()
+        self.plantilla.ttfont = None  # cada documento usa su propio TTFont (fpdf lo recorta en el sitio)
+
+    def para(self, pdf):
+        """Copia para 'pdf': métricas compartidas, glifos usados y descriptor propios."""
+        fuente = copy.copy(self.plantilla)
+        fuente.i = len(pdf.fonts) + 1
+        fuente.desc = copy.copy(self.plantilla.desc)
+        fuente.missing_glyphs = []
+        fuente.biggest_size_pt = 0
+        fuente._hbfont = None
+        fuente.subset = SubsetMap(fuente)
+        fuente.ttfont = ttLib.TTFont(BytesIO(self.datos), recalcTimestamp=False, lazy=True)
+        return fuente
+
+
+_FUENTES = {}
+_LOCK_FUENTES = threading.Lock()
+
+
+def cargar_fuentes():
+    """Lee los estilos de la fuente (una vez por proceso). Lo usa también el calentamiento."""
+    if len(_FUENTES) < len(ARCHIVOS_FUENTE):
+        with _LOCK_FUENTES:
+            for estilo, archivo in ARCHIVOS_FUENTE.items():
+                if estilo not in _FUENTES:
+                    _FUENTES[estilo] = _FuenteCompartida(estilo, os.path.join(RUTA_FUENTES, archivo))
+    return _FUENTES
+
+
+class PDFPlantilla(FPDF):
+    def __init__(self):
+        super().__init__()
+        for estilo, compartida in cargar_fuentes().items():
+            self.fonts[FAMILIA.lower() + estilo] = compartida.para(self)
+
+    def header(self):
+        self.set_font(FAMILIA, 'B', 16)
+        self.cell(0, 10, 'Detalle de Plantilla', align='C', new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+        self.ln(5)
+
+    def footer(self):
+        self.set_y(-15)
+        self.set_font(FAMILIA, '', 8)
+        self.cell(0, 10, f'Página {self.page_no()}', align='C')
+
+    def chapter_title(self, title):
+        self.set_font(FAMILIA, 'B', 12)
+        self.set_fill_color(230, 230, 230)
+        self.cell(0, 8, str(title), align='L', fill=True, new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+        self.ln(4)
+
+    def chapter_body(self, content):
+        self.set_font(FAMILIA, '', 10)
+        self.multi_cell(0, 5, str(content))
+        self.ln()
+
+
+def generar_pdf_plantilla(plantilla):
+    """Bytes del PDF de detalle de una plantilla (dict con las columnas de 'plantillas')."""
+    pdf = PDFPlantilla()
+    pdf.add_page()
+
+    pdf.chapter_title('Información General')
+    pdf.chapter_body(f"ID de Plantilla: {plantilla['id']}")
+    pdf.chapter_body(f"Tipo de Atención: {plantilla['tipo_atencion']}")
+    pdf.chapter_body(f"Código Prestacional: {plantilla['codigo_prestacional']}")
+    pdf.chapter_body(f"Descripción: {plantilla['descripcion_prestacional']}")
+
+    # Función auxiliar para mostrar secciones de forma segura
+    def display_section(title, data):
+        if data and len(data) > 0:
+            pdf.chapter_title(title)
+            if isinstance(data, list):
+                for item in data:
+                    pdf.chapter_body(f'- {item}')
+            else:
+                pdf.chapter_body(data)
+
+    display_section('Actividades Preventivas', plantilla.get('actividades_preventivas'))
+    display_section('Diagnóstico Principal', plantilla.get('diagnostico_principal'))
+    display_section('Diagnósticos Excluyentes', plantilla.get('diagnosticos_excluyentes'))
+    display_section('Diagnósticos Complementarios', plantilla.get('diagnosticos_complementarios'))
+    display_section('Medicamentos Relacionados', plantilla.get('medicamentos_relacionados'))
+    display_section('Insumos Relacionados', plantilla.get('insumos_relacionados'))
+    display_section('Procedimientos Obligatorios', plantilla.get('procedimientos_obligatorios'))
+    display_section('Procedimientos Excluyentes', plantilla.get('procedimientos_excluyentes'))
+    display_section('Otros Procedimientos', plantilla.get('otros_procedimientos'))
+
+    observaciones = plantilla.get('observaciones')
+    if observaciones:
+        # Quitamos las etiquetas HTML antes de mostrar
+        display_section('Observaciones', re.sub('<[^<]+?>', '', observaciones))
+
+    return bytes(pdf.output())
+
+
+# ==============================================================================
+#   Verificación de regresión ('python pdf_plantillas.py' y tests/)
+# ==============================================================================
+MUESTRA = {
+    'id': 42,
+    'tipo_atencion': 'Atención integral — niño/niña',
+    'codigo_prestacional': '001',
+    'descripcion_prestacional': 'Control de crecimiento y desarrollo “CRED” en menores de 5 años',
+    'actividades_preventivas': ['Tamizaje de anemia: Hb ≥ 11,0 g/dL', 'Peso–talla ±2 DE', 'Suplementación 2–3 mg/kg/día'],
+    'diagnostico_principal': ['Z00.1 – Control de salud de rutina del niño'],
+    'diagnosticos_excluyentes': [],
+    'diagnosticos_complementarios': ['D50.9 Anemia por deficiencia de hierro, sin otra especificación'],
+    'medicamentos_relacionados': ['Sulfato ferroso 25 mg/mL — gotas', 'Vitamina A 200 000 UI'],
+    'insumos_relacionados': ['Jeringa 1 mL', 'Lanceta retráctil ≤ 2,0 mm'],
+    'procedimientos_obligatorios': ['‘Dosaje de hemoglobina’ (µmol/L)'],
+    'procedimientos_excluyentes': None,
+    'otros_procedimientos': ['Consejería nutricional… 30 min'],
+    'observaciones': '<p>Temperatura ≥ 37,5 °C: reevaluar. Niño “pequeño” para la edad; ñandú, pingüino.</p>',
+}
+ESPERADOS = ['Información General', 'Página 1', 'Hb ≥ 11,0', 'Peso–talla ±2', '“CRED”',
+             '‘Dosaje de hemoglobina’', 'µmol/L', '37,5 °C', 'ñandú, pingüino', 'Consejería nutricional…']
+
+
+def texto_pdf(datos):
+    """Texto extraíble del PDF, con los espacios normalizados."""
+    from pypdf import PdfReader
+
+    texto = ''.join(p.extract_text() for p in PdfReader(BytesIO(datos)).pages)
+    return re.sub(r'\s+', ' ', texto)
+
+
+def verificar_pdf(datos, esperados=ESPERADOS):
+    """Tildes y símbolos salen tal cual (sin '?'), extraíbles y con la fuente incrustada."""
+    texto = texto_pdf(datos)
+    faltan = [e for e in esperados if e not in texto]
+    assert not faltan, f"No aparecen en el PDF: {faltan}"
+    assert '?' not in texto, "Hay caracteres reemplazados por '?'"
+    assert b'FontFile2' in datos, "La fuente no quedó incrustada"
+
+
+def verificar_documentos_independientes():
+    """Un documento con otros glifos no se mezcla con los anteriores (cada uno recorta su fuente)."""
+    otra = dict(MUESTRA, observaciones='Fórmula: Σ dosis ∝ peso; ver ⚠ en ficha.')
+    assert 'Σ dosis ∝ peso' in texto_pdf(generar_pdf_plantilla(otra)), "Los glifos de un segundo documento no se incrustaron"
+    verificar_pdf(generar_pdf_plantilla(MUESTRA))
+
+
+if __name__ == '__main__':
+    # Verificación de regresión y medición: el segundo PDF reusa las fuentes ya leídas.
+    import time
+
+    inicio = time.perf_counter()
+    primero = generar_pdf_plantilla(MUESTRA)
+    t_primero = (time.perf_counter() - inicio) * 1000
+    verificar_pdf(primero)
+
+    tiempos = []
+    for _ in range(20):
+        inicio = time.perf_counter()
+        siguiente = generar_pdf_plantilla(MUESTRA)
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    tiempos.sort()
+    verificar_documentos_independientes()
+
+    print(f"Primer PDF (lee las fuentes): {t_primero:.1f} ms, {len(primero)} B")
+    print(f"PDF siguientes: mediana {tiempos[len(tiempos) // 2]:.1f} ms, p95 {tiempos[int(len(tiempos) * 0.95)]:.1f} ms, "
+          f"{len(siguiente)} B")
+    print("OK: tildes, '≥', '–', '…' y comillas tipográficas salen tal cual y son extraíbles.")
@@ -0,0 +1,99 @@
+# ==============================================================================
+#           PERFIL DE ARRANQUE (TIEMPO DE IMPORTACIÓN POR MÓDULO)
+# ==============================================================================
+#  Equivalente integrado a 'python -X importtime': mide cuánto tarda cada
+#  importación mientras se carga la aplicación.
+#
+#  - En la app: definir PERFIL_ARRANQUE=1 y el reporte se imprime al terminar de
+#    importar index.py y al responder la primera petición.
+#  - Desde la consola:
+#      python perfil_arranque.py             -> reporte + tiempo hasta el primer /login
+#      python perfil_arranque.py --verificar -> falla si vuelven las importaciones pesadas
+#                                               (lo corre tests/test_perfil_arranque.py)
+# ==============================================================================
+
+import builtins
+import sys
+import time
+
+# Dependencias que NO deben importarse al arrancar: solo se cargan al usarse.
+MODULOS_DIFERIDOS = ('fpdf', 'pypdf', 'requests', 'supabase', 'postgrest', 'storage3', 'httpx', 'numpy')
+
+_import_original = builtins.__import__
+_tiempos = {}          # módulo -> [segundos_inclusivos, segundos_propios]
+_pila = []
+_inicio = None
+
+
+def _import_medido(nombre, globals=None, locals=None, fromlist=(), level=0):
+    # Solo medimos la primera importación real; las siguientes salen de sys.modules.
+    if level or nombre in sys.modules:
+        return _import_original(nombre, globals, locals, fromlist, level)
+
+    _pila.append(0.0)
+    inicio = time.perf_counter()
+    try:
+        return _import_original(nombre, globals, locals, fromlist, level)
+    finally:
+        total = time.perf_counter() - inicio
+        hijos = _pila.pop()
+        if _pila:
+            _pila[-1] += total
+        if nombre not in _tiempos:
+            _tiempos[nombre] = [total, total - hijos]
+
+
+def activar():
+    """Empieza a medir las importaciones (idempotente)."""
+    global _inicio
+    if builtins.__import__ is _import_medido:
+        return
+    _inicio = time.perf_counter()
+    builtins.__import__ = _import_medido
+
+
+def desactivar():
+    builtins.__import__ = _import_original
+
+
+def activo():
+    return builtins.__import__ is _import_medido
+
+
+def reporte(limite=25):
+    """Texto con los módulos que más tardaron en importarse (tiempo inclusivo)."""
+    lineas = [f"PERFIL DE ARRANQUE: {(time.perf_counter() - _inicio) * 1000:.1f} ms desde la activación",
+              f"{'inclusivo (ms)':>15} {'propio (ms)':>12}  módulo"]
+    ordenados = sorted(_tiempos.items(), key=lambda par: -par[1][0])[:limite]
+    for nombre, (total, propio) in ordenados:
+        lineas.append(f"{total * 1000:15.1f} {propio * 1000:12.1f}  {nombre}")
+    return '\n'.join(lineas)
+
+
+def modulos_diferidos_cargados():
+    """Dependencias pesadas que ya están en sys.modules (deberían estar vacías al arrancar)."""
+    return [m for m in MODULOS_DIFERIDOS if m in sys.modules]
+
+
+if __name__ == '__main__':
+    activar()
+    inicio = time.perf_counter()
+    import index
+    tiempo_importacion = time.perf_counter() - inicio
+
+    cliente = index.app.test_client()
+    inicio = time.perf_counter()
+    respuesta = cliente.get('/login')
+    tiempo_login = time.perf_counter() - inicio
+    desactivar()
+
+    print(reporte())
+    print(f"\nImportar index.py: {tiempo_importacion * 1000:.1f} ms")
+    print(f"Primera respuesta de /login: {tiempo_login * 1000:.1f} ms (HTTP {respuesta.status_code})")
+
+    cargados = modulos_diferidos_cargados()
+    if '--verificar' in sys.argv:
+        if cargados:
+            print(f"ERROR: se importaron al arrancar dependencias que deben ser diferidas: {', '.join(cargados)}")
+            sys.exit(1)
+        print("OK: ninguna dependencia pesada se importó al arrancar.")
@@ -0,0 +1,193 @@
+# ==============================================================================
+#           RANGOS DE PESO Y TALLA POR EDAD (DATOS_PESO_TALLA COMPILADA)
+# ==============================================================================
+#  La tabla de la guía guarda textos ("4.0 - 8.0 kg", "1 - 6 meses", "18+ años").
+#  Aquí se convierten a intervalos numéricos (edad en meses, peso en kg, talla en
+#  cm) y se arma un índice de intervalos por sexo: cada niño se ubica en su fila
+#  con una búsqueda binaria sobre el inicio de los rangos de edad.
+#
+#  Los rangos de edad de la tabla se escriben en unidades cumplidas: "3 - 5 años"
+#  llega hasta el día antes de cumplir 6, salvo cuando la fila siguiente empieza
+#  en el mismo límite ("0 - 1 mes", "1 - 6 meses"), donde el límite es exclusivo.
+# ==============================================================================
+
+import re
+
+import numpy as np
+
+from reglas_anemia import DIAS_POR_MES, SEXOS, duracion_en_dias, edad_en_dias
+
+MESES_POR_UNIDAD = {'MES': 1, 'MESES': 1, 'AÑO': 12, 'AÑOS': 12}
+SEXO_TABLA = {'Ambos': (0, 1, -1), 'Masculino': (0,), 'Femenino': (1,)}
+
+# Resultado de comparar un valor con su rango.
+POR_DEBAJO, DENTRO, POR_ENCIMA, SIN_DATO = -1, 0, 1, 2
+ESTADOS = {POR_DEBAJO: 'por debajo', DENTRO: 'dentro', POR_ENCIMA: 'por encima', SIN_DATO: None}
+
+_PATRON_EDAD = re.compile(r'^(\d+)\s*(?:-\s*(\d+)|(\+))\s*(\w+)$')
+_PATRON_RANGO = re.compile(r'^(\d+(?:\.\d+)?)\s*-\s*(\d+(?:\.\d+)?)')
+_PATRON_IMC = re.compile(r'IMC\s*(\d+(?:\.\d+)?)\s*-\s*(\d+(?:\.\d+)?)')
+
+
+def rango_numerico(texto):
+    """'4.0 - 8.0 kg' -> (4.0, 8.0); 'Ver nota' -> (nan, nan)."""
+    coincidencia = _PATRON_RANGO.match(texto.strip())
+    if not coincidencia:
+        return np.nan, np.nan
+    return float(coincidencia.group(1)), float(coincidencia.group(2))
+
+
+def rango_edad(texto):
+    """'1 - 6 meses' -> (1, 6, 1); '18+ años' -> (216, inf, 12): inicio, último valor y unidad en meses."""
+    coincidencia = _PATRON_EDAD.match(texto.strip())
+    if not coincidencia:
+        raise ValueError(f"Rango de edad no válido: '{texto}'")
+    inicio, fin, abierto, unidad = coincidencia.groups()
+    meses = MESES_POR_UNIDAD[unidad.upper()]
+    if abierto:
+        return int(inicio) * meses, np.inf, meses
+    return int(inicio) * meses, int(fin) * meses, meses
+
+
+class TablaCrecimiento:
+    """DATOS_PESO_TALLA como intervalos: ubica a cada niño en su fila y marca peso y talla."""
+
+    def __init__(self, tabla):
+        self.filas = list(tabla)
+        n = len(self.filas)
+        self.edad_inicio = np.empty(n)
+        self.edad_fin = np.empty(n)
+        self.peso = np.empty((n, 2))
+        self.talla = np.empty((n, 2))
+        self.imc = np.full((n, 2), np.nan)
+        for i, (_, edad, _, peso, talla, nota) in enumerate(self.filas):
+            inicio, ultimo, unidad = rango_edad(edad)
+            self.edad_inicio[i] = inicio
+            self.edad_fin[i] = ultimo + unidad  # exclusivo: hasta cumplir la unidad siguiente
+            self.peso[i] = rango_numerico(peso)
+            self.talla[i] = rango_numerico(talla)
+            imc = _PATRON_IMC.search(nota or '')
+            if imc:
+                self.imc[i] = float(imc.group(1)), float(imc.group(2))
+
+        # Índice por sexo: inicios ordenados y el fin ajustado al inicio de la fila siguiente.
+        self.indice = {}
+        for sexo in (0, 1, -1):
+            filas = sorted((i for i, fila in enumerate(self.filas) if sexo in SEXO_TABLA[fila[2]]),
+                           key=lambda i: self.edad_inicio[i])
+            inicios = self.edad_inicio[filas]
+            fines = self.edad_fin[filas].copy()
+            fines[:-1] = np.minimum(fines[:-1], inicios[1:])
+            self.indice[sexo] = (inicios, fines, np.array(filas, dtype=int))
+
+    def ubicar(self, edad_meses, sexo):
+        """Fila de la tabla para cada niño (-1 si su edad no tiene rango)."""
+        edad_meses = np.asarray(edad_meses, dtype=float)
+        sexo = np.asarray(sexo)
+        filas = np.full(len(edad_meses), -1)
+        for clave, (inicios, fines, ids) in self.indice.items():
+            seleccion = (sexo == clave) & ~np.isnan(edad_meses) & (edad_meses >= 0)
+            if not seleccion.any():
+                continue
+            edades = edad_meses[seleccion]
+            posicion = np.searchsorted(inicios, edades, side='right') - 1
+            valida = (posicion >= 0) & (edades < fines[np.maximum(posicion, 0)])
+            filas[seleccion] = np.where(valida, ids[np.maximum(posicion, 0)], -1)
+        return filas
+
+    @staticmethod
+    def _comparar(valores, rangos):
+        minimo, maximo = rangos[:, 0], rangos[:, 1]
+        estado = np.where(valores < minimo, POR_DEBAJO, np.where(valores > maximo, POR_ENCIMA, DENTRO))
+        return np.where(np.isnan(valores) | np.isnan(minimo), SIN_DATO, estado)
+
+    def evaluar_lote(self, edad_meses, sexo, peso, talla):
+        """(filas, estado_peso, estado_talla, imc) para arreglos del mismo largo.
+
+        Donde la tabla no da rango de peso (adultos) el peso se evalúa con el IMC de la nota.
+        """
+        peso = np.asarray(peso, dtype=float)
+        talla = np.asarray(talla, dtype=float)
+        filas = self.ubicar(edad_meses, sexo)
+        con_fila = filas >= 0
+        fila_segura = np.where(con_fila, filas, 0)
+
+        sin_rango = np.full((len(filas), 2), np.nan)
+        rango_peso = np.where(con_fila[:, None], self.peso[fila_segura], sin_rango)
+        rango_talla = np.where(con_fila[:, None], self.talla[fila_segura], sin_rango)
+        rango_imc = np.where(con_fila[:, None], self.imc[fila_segura], sin_rango)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            imc = peso / (talla / 100) ** 2
+        estado_peso = self._comparar(peso, rango_peso)
+        por_imc = np.isnan(rango_peso[:, 0]) & ~np.isnan(rango_imc[:, 0])
+        estado_peso = np.where(por_imc, self._comparar(imc, rango_imc), estado_peso)
+        return filas, estado_peso, self._comparar(talla, rango_talla), imc
+
+    def evaluar(self, edad_meses, sexo, peso, talla):
+        """Resultado para un solo niño, como diccionario."""
+        filas, estado_peso, estado_talla, imc = self.evaluar_lote([edad_meses], [sexo], [peso], [talla])
+        return self.describir(filas[0], estado_peso[0], estado_talla[0], imc[0])
+
+    def describir(self, fila, estado_peso, estado_talla, imc):
+        if fila < 0:
+            return {"categoria": None, "rango_peso": None, "rango_talla": None,
+                    "estado_peso": None, "estado_talla": None, "imc": None, "nota": "Sin rango para esta edad y sexo"}
+        categoria, edad, _, peso, talla, nota = self.filas[fila]
+        return {
+            "categoria": f"{categoria} ({edad})",
+            "rango_peso": peso,
+            "rango_talla": talla,
+            "estado_peso": ESTADOS[int(estado_peso)],
+            "estado_talla": ESTADOS[int(estado_talla)],
+            "imc": None if np.isnan(imc) else round(float(imc), 1),
+            "nota": nota,
+        }
+
+
+def preparar_lote(filas, hoy):
+    """Columnas (edad en meses, sexo, peso, talla) a partir de filas con: edad ('2a3m') o
+    fecha_nacimiento (+ fecha_evaluacion, por defecto 'hoy'), sexo, peso (kg) y talla (cm)."""
+    from lotes import a_codigos, a_fechas, a_numeros, columna
+
+    edad = np.full(len(filas), np.nan)
+    nacimiento = a_fechas(columna(filas, 'fecha_nacimiento'))
+    if not np.isnat(nacimiento).all():
+        evaluacion = a_fechas(columna(filas, 'fecha_evaluacion', 'fecha'))
+        evaluacion[np.isnat(evaluacion)] = np.datetime64(hoy, 'D')
+        dias = edad_en_dias(nacimiento, evaluacion)
+        edad = np.where(dias >= 0, dias / DIAS_POR_MES, np.nan)
+    for i, texto in enumerate(columna(filas, 'edad')):
+        if texto and np.isnan(edad[i]):
+            try:
+                edad[i] = duracion_en_dias(texto) / DIAS_POR_MES
+            except ValueError:
+                pass
+
+    return (
+        edad,
+        a_codigos(columna(filas, 'sexo'), SEXOS),
+        a_numeros(columna(filas, 'peso')),
+        a_numeros(columna(filas, 'talla')),
+    )
+
+
+if __name__ == '__main__':
+    # Referencia de rendimiento: 100 000 niños sintéticos.
+    import time
+    from index import DATOS_PESO_TALLA
+
+    tabla = TablaCrecimiento(DATOS_PESO_TALLA)
+    generador = np.random.default_rng(33)
+    n = 100_000
+    edad = generador.uniform(0, 18 * 12, n)
+    sexo = generador.integers(0, 2, n)
+    peso = generador.uniform(2, 80, n)
+    talla = generador.uniform(45, 180, n)
+
+    inicio = time.perf_counter()
+    filas, estado_peso, estado_talla, _ = tabla.evaluar_lote(edad, sexo, peso, talla)
+    segundos = time.perf_counter() - inicio
+    print(f"{n} niños en {segundos * 1000:.1f} ms ({n / segundos:,.0f} filas/s); sin rango: {(filas < 0).sum()}")
+    for estado, nombre in ESTADOS.items():
+        print(f"  peso {nombre}: {(estado_peso == estado).sum()}")
@@ -0,0 +1,185 @@
+# ==============================================================================
+#           RECARGA EN CALIENTE DE LA BASE DE CONOCIMIENTO
+# ==============================================================================
+#  Mantiene una "foto" (snapshot) versionada de las reglas y sus índices. Las
+#  peticiones leen la foto actual con una sola referencia, así que una recarga
+#  nunca les cambia los datos a mitad de camino: la nueva foto se construye
+#  aparte (fuera del camino de la petición) y se intercambia de forma atómica.
+#
+#  Coordinación entre workers (gunicorn): al recargar, un worker escribe la nueva
+#  versión en un archivo "sello" compartido. Los demás solo hacen un stat() del
+#  sello y del JSON fuente, como máximo una vez cada INTERVALO_REVISION segundos,
+#  y reconstruyen en segundo plano si la versión cambió.
+# ==============================================================================
+
+import hashlib
+import os
+import tempfile
+import threading
+import time
+
+INTERVALO_REVISION = 2.0
+RUTA_SELLO = os.environ.get('SELLO_CONOCIMIENTO',
+                            os.path.join(tempfile.gettempdir(), 'conocimiento_clinico.version'))
+
+
+def huella_archivo(ruta):
+    """Versión de un archivo: los primeros 16 caracteres de su SHA-256 (o None si no existe)."""
+    try:
+        with open(ruta, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()[:16]
+    except FileNotFoundError:
+        return None
+
+
+def _firma(ruta):
+    """(mtime, tamaño) de un archivo; cambia cuando el archivo se reescribe."""
+    try:
+        estado = os.stat(ruta)
+        return (estado.st_mtime_ns, estado.st_size)
+    except FileNotFoundError:
+        return None
+
+
+class CargadorVersionado:
+    """Carga perezosa + recarga atómica de un recurso construido desde un archivo.
+
+    - construir(version): crea la foto nueva (reglas, índices...). Se llama
+      fuera del camino de las peticiones salvo en la primera carga.
+    - obtener(): devuelve la foto vigente; como mucho cada `intervalo` segundos
+      revisa si el archivo fuente o el sello compartido cambiaron.
+    - recargar(): reconstruye ya y publica la versión en el sello para que el
+      resto de workers la tomen.
+
+    Si 'construir' lanza una excepción, la foto y la versión vigentes no cambian.
+    """
+
+    def __init__(self, construir, ruta_fuente, ruta_sello=RUTA_SELLO, intervalo=INTERVALO_REVISION):
+        self._construir = construir
+        self.ruta_fuente = ruta_fuente
+        self.ruta_sello = ruta_sello
+        self.intervalo = intervalo
+
+        self._actual = None
+        self.version = None
+        self._lock = threading.Lock()
+        self._recarga_en_curso = False
+        self._proxima_revision = 0.0
+        self._firma_fuente = None
+        self._firma_sello = None
+        self._oyentes = []
+
+    # --------------------------------------------------------------------------
+    #   Lectura (camino de las peticiones)
+    # --------------------------------------------------------------------------
+    def obtener(self):
+        actual = self._actual
+        if actual is None:
+            return self._carga_inicial()
+
+        ahora = time.monotonic()
+        if ahora >= self._proxima_revision:
+            self._proxima_revision = ahora + self.intervalo
+            if self._hay_cambios():
+                self._recargar_en_segundo_plano()
+        # Devolvemos la referencia leída al inicio: la petición trabaja con una foto consistente.
+        return actual
+
+    def creado(self):
+        return self._actual is not None
+
+    def al_actualizar(self, funcion):
+        """Registra una función que se llama (con la foto nueva) después de cada intercambio."""
+        self._oyentes.append(funcion)
+        return funcion
+
+    def _carga_inicial(self):
+        with self._lock:
+            if self._actual is None:
+                self._reconstruir()
+        return self._actual
+
+    # --------------------------------------------------------------------------
+    #   Detección de cambios (barata: dos stat())
+    # --------------------------------------------------------------------------
+    def _hay_cambios(self):
+        firma_fuente = _firma(self.ruta_fuente)
+        if firma_fuente != self._firma_fuente:
+            return True
+        firma_sello = _firma(self.ruta_sello)
+        if firma_sello != self._firma_sello:
+            self._firma_sello = firma_sello
+            return self._leer_sello() not in (None, self.version)
+        return False
+
+    def _leer_sello(self):
+        try:
+            with open(self.ruta_sello, 'r', encoding='utf-8') as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def _publicar_sello(self):
+        temporal = f"{self.ruta_sello}.{os.getpid()}.tmp"
+        try:
+            with open(temporal, 'w', encoding='utf-8') as f:
+                f.write(self.version or '')
+            os.replace(temporal, self.ruta_sello)
+            self._firma_sello = _firma(self.ruta_sello)
+        except OSError as e:
+            print(f"ADVERTENCIA: No se pudo publicar la versión del conocimiento en '{self.ruta_sello}': {e}")
+
+    # --------------------------------------------------------------------------
+    #   Reconstrucción e intercambio atómico
+    # --------------------------------------------------------------------------
+    def _reconstruir(self):
+        """Construye la foto nueva si la versión cambió. Debe llamarse con el lock tomado."""
+        firma_fuente = _firma(self.ruta_fuente)
+        version = huella_archivo(self.ruta_fuente)
+        if self._actual is not None and version == self.version:
+            self._firma_fuente = firma_fuente
+            return False
+
+        try:
+            nueva = self._construir(version)
+        except Exception:
+            # Un JSON a medio escribir o inválido no reemplaza la foto vigente. Se
+            # guarda la firma para no reintentar cada pocos segundos: el archivo
+            # vuelve a cambiar cuando se termina de guardar (o se corrige).
+            self._firma_fuente = firma_fuente
+            raise
+        # Intercambio atómico: una sola asignación de referencia.
+        self._actual = nueva
+        self.version = version
+        self._firma_fuente = firma_fuente
+        for oyente in self._oyentes:
+            try:
+                oyente(nueva)
+            except Exception as e:
+                print(f"ERROR: Falló una acción posterior a la recarga del conocimiento: {e}")
+        return True
+
+    def _recargar_en_segundo_plano(self):
+        if self._recarga_en_curso:
+            return
+        self._recarga_en_curso = True
+
+        def tarea():
+            try:
+                with self._lock:
+                    if self._reconstruir():
+                        print(f"INFO: Base de conocimiento recargada en segundo plano (versión {self.version}).")
+            except Exception as e:
+                print(f"ERROR: No se pudo recargar la base de conocimiento (se mantiene la versión {self.version}): {e}")
+            finally:
+                self._recarga_en_curso = False
+
+        threading.Thread(target=tarea, name='recarga-conocimiento', daemon=True).start()
+
+    def recargar(self):
+        """Recarga inmediata (acción del administrador). Devuelve (versión anterior, versión nueva)."""
+        with self._lock:
+            anterior = self.version
+            self._reconstruir()
+            self._publicar_sello()
+        return anterior, self.version
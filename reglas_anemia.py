@@ -0,0 +1,289 @@
+# ==============================================================================
+#           MOTOR DE REGLAS DE ANEMIA (TABLA RC: 61 COMPILADA)
+# ==============================================================================
+#  DATOS_TABLA_ANEMIA guarda textos para mostrar ('<=7d', '8d - 28d', '> 13',
+#  'EG 14-28'...). Aquí se interpretan una sola vez como intervalos numéricos y
+#  se agrupan en un índice de decisión:
+#
+#    1. Grupo: edad, sexo, condición (gestante/puérpera), edad gestacional y
+#       prematuridad. Si varios grupos aplican gana el más específico.
+#    2. Regla: dentro del grupo, la Hb se ubica con una búsqueda binaria sobre
+#       los puntos de corte (np.searchsorted), para miles de filas a la vez.
+#
+#  La edad se mide en "días de edad": meses cumplidos x 30 + días restantes
+#  (como máximo 29), que es la escala en la que está escrita la tabla
+#  ('5m29d' -> 179, '6m' -> 180, '4a11m29d' -> 1799, '5a' -> 1800).
+# ==============================================================================
+
+import re
+from collections import namedtuple
+
+import numpy as np
+
+DIAS_POR_MES = 30
+MESES_POR_ANIO = 12
+SIN_LIMITE = 10 ** 9
+NO_APLICA = 'NO APLICA'
+
+SEXOS = {'M': 0, 'MASCULINO': 0, 'H': 0, 'HOMBRE': 0, 'F': 1, 'FEMENINO': 1, 'MUJER': 1}
+CONDICIONES = {'NO GESTANTE/NO PUERPERA': 0, 'NINGUNA': 0, 'GESTANTE': 1, 'PUERPERA': 2}
+RESPUESTAS_SI_NO = {'SI': 1, 'S': 1, '1': 1, 'TRUE': 1, 'NO': 0, 'N': 0, '0': 0, 'FALSE': 0}
+
+Regla = namedtuple('Regla', ['numero', 'resultado', 'accion'])
+
+_PATRON_DURACION = re.compile(r'(\d+)([amd])')
+_PATRON_COTA = re.compile(r'^(<=|>=|<|>)?(.+)$')
+_UNIDADES = {'a': MESES_POR_ANIO * DIAS_POR_MES, 'm': DIAS_POR_MES, 'd': 1}
+
+
+class ErrorTablaAnemia(ValueError):
+    """Una fila de la tabla de anemia no se pudo interpretar."""
+
+
+# ------------------------------------------------------------------------------
+#   Interpretación de los textos de la tabla
+# ------------------------------------------------------------------------------
+def duracion_en_dias(texto):
+    """'4a11m29d' -> 1799 (días de edad). Acepta cualquier combinación de a/m/d."""
+    texto = str(texto).replace(' ', '').lower()
+    partes = _PATRON_DURACION.findall(texto)
+    if not partes or ''.join(n + u for n, u in partes) != texto:
+        raise ErrorTablaAnemia(f"Duración no válida: '{texto}'")
+    return sum(int(n) * _UNIDADES[u] for n, u in partes)
+
+
+def intervalo_edad(texto):
+    """Texto de la columna EDAD -> (mínimo, máximo) en días de edad, ambos inclusive."""
+    texto = texto.replace(' ', '')
+    if '-' in texto:
+        izquierda, derecha = texto.split('-')
+        minimo = duracion_en_dias(izquierda)
+        if derecha.startswith('<'):
+            return minimo, duracion_en_dias(derecha[1:]) - 1
+        return minimo, duracion_en_dias(derecha)
+
+    operador, valor = _PATRON_COTA.match(texto).groups()
+    dias = duracion_en_dias(valor)
+    return {
+        '<=': (0, dias),
+        '<': (0, dias - 1),
+        '>=': (dias, SIN_LIMITE),
+        '>': (dias + 1, SIN_LIMITE),
+    }.get(operador, (dias, dias))
+
+
+def intervalo_hb(texto):
+    """Texto de VALOR HB -> (mínimo, mínimo_inclusive, máximo, máximo_inclusive) en g/dL."""
+    texto = texto.replace(' ', '')
+    if '-' in texto:
+        minimo, maximo = texto.split('-')
+        return float(minimo), True, float(maximo), True
+    operador, valor = _PATRON_COTA.match(texto).groups()
+    valor = float(valor)
+    if operador == '>':
+        return valor, False, np.inf, False
+    if operador == '>=':
+        return valor, True, np.inf, False
+    if operador == '<':
+        return -np.inf, False, valor, False
+    if operador == '<=':
+        return -np.inf, False, valor, True
+    raise ErrorTablaAnemia(f"Valor de Hb no válido: '{texto}'")
+
+
+def intervalo_semanas(texto):
+    """'EG <14' -> (0, 13); 'EG 14-28' -> (14, 28); 'NO APLICA' -> None. Semanas cumplidas."""
+    if texto == NO_APLICA:
+        return None
+    texto = texto.replace('EG', '').replace(' ', '')
+    if '-' in texto:
+        minimo, maximo = texto.split('-')
+        return int(minimo), int(maximo)
+    operador, valor = _PATRON_COTA.match(texto).groups()
+    valor = int(valor)
+    return {'<': (0, valor - 1), '<=': (0, valor), '>': (valor + 1, SIN_LIMITE), '>=': (valor, SIN_LIMITE)}[operador]
+
+
+# ------------------------------------------------------------------------------
+#   Índice de decisión
+# ------------------------------------------------------------------------------
+class _Grupo:
+    """Filas de la tabla que comparten las mismas condiciones del paciente."""
+
+    def __init__(self, orden, edad, sexo, condicion, semanas, prematuro):
+        self.orden = orden
+        self.edad_min, self.edad_max = intervalo_edad(edad)
+        self.sexo = None if sexo == 'A' else SEXOS[sexo]
+        self.condicion = None if condicion == NO_APLICA else CONDICIONES[condicion]
+        self.semanas = intervalo_semanas(semanas)
+        self.prematuro = None if prematuro == NO_APLICA else RESPUESTAS_SI_NO[prematuro]
+        self.reglas = []  # (intervalo_hb, índice global de la regla)
+
+    @property
+    def especificidad(self):
+        return sum(c is not None for c in (self.sexo, self.condicion, self.semanas, self.prematuro))
+
+    def compilar(self):
+        """Ordena las reglas por Hb y deja los puntos de corte para np.searchsorted."""
+        self.reglas.sort(key=lambda r: r[0][0])
+        siguientes = [intervalo for intervalo, _ in self.reglas[1:]]
+        lados = {incluye for _, incluye, _, _ in siguientes}
+        if len(lados) > 1:
+            raise ErrorTablaAnemia(f"El grupo {self.orden} mezcla cortes '>' y '>=' en la Hb.")
+        self.cortes = np.array([minimo for minimo, _, _, _ in siguientes])
+        # '>=' corte: un valor igual al corte pasa a la regla superior.
+        self.lado = 'right' if (not lados or lados.pop()) else 'left'
+        self.hb_min = self.reglas[0][0][0]
+        self.hb_max, self.hb_max_inclusive = self.reglas[-1][0][2], self.reglas[-1][0][3]
+        self.indices = np.array([indice for _, indice in self.reglas])
+
+    def mascara(self, edad, sexo, condicion, semanas, prematuro):
+        mascara = (edad >= self.edad_min) & (edad <= self.edad_max)
+        if self.sexo is not None:
+            mascara &= sexo == self.sexo
+        if self.condicion is not None:
+            mascara &= condicion == self.condicion
+        if self.semanas is not None:
+            mascara &= (semanas >= self.semanas[0]) & (semanas <= self.semanas[1])
+        if self.prematuro is not None:
+            mascara &= prematuro == self.prematuro
+        return mascara
+
+    def ubicar(self, hb):
+        """Índice global de la regla para cada valor de Hb (-1 si queda fuera de los rangos)."""
+        posicion = np.searchsorted(self.cortes, hb, side=self.lado)
+        resultado = self.indices[posicion]
+        fuera = np.isnan(hb) | (hb < self.hb_min)
+        fuera |= (hb > self.hb_max) if self.hb_max_inclusive else (hb >= self.hb_max)
+        resultado[fuera] = -1
+        return resultado
+
+
+class MotorAnemia:
+    """Tabla de anemia compilada: evalúa un paciente o un lote completo."""
+
+    def __init__(self, tabla):
+        self.reglas = []
+        grupos = {}
+        for numero, edad, sexo, condicion, semanas, prematuro, hb, resultado, accion in tabla:
+            clave = (edad, sexo, condicion, semanas, prematuro)
+            try:
+                if clave not in grupos:
+                    grupos[clave] = _Grupo(len(grupos), *clave)
+                grupos[clave].reglas.append((intervalo_hb(hb), len(self.reglas)))
+            except (KeyError, ValueError) as e:
+                raise ErrorTablaAnemia(f"Regla {numero}: {e}")
+            self.reglas.append(Regla(numero, resultado, accion))
+
+        for grupo in grupos.values():
+            grupo.compilar()
+        # Primero los grupos más específicos (p. ej. gestante antes que "ambos sexos").
+        self.grupos = sorted(grupos.values(), key=lambda g: (-g.especificidad, g.orden))
+
+    def evaluar_lote(self, edad, sexo, condicion, semanas, prematuro, hb):
+        """Índice de la regla aplicable a cada fila (-1 si ninguna aplica).
+
+        Todos los argumentos son arreglos del mismo largo: edad en días de edad,
+        sexo (0=M, 1=F), condición (0 ninguna, 1 gestante, 2 puérpera), semanas
+        de gestación cumplidas (NaN si no aplica), prematuro (0/1) y Hb en g/dL.
+        """
+        edad = np.asarray(edad)
+        hb = np.asarray(hb, dtype=float)
+        grupo_fila = np.full(len(hb), -1)
+        for posicion, grupo in enumerate(self.grupos):
+            libres = grupo_fila == -1
+            if not libres.any():
+                break
+            grupo_fila[libres & grupo.mascara(edad, sexo, condicion, np.floor(semanas), prematuro)] = posicion
+
+        reglas = np.full(len(hb), -1)
+        for posicion, grupo in enumerate(self.grupos):
+            filas = grupo_fila == posicion
+            if filas.any():
+                reglas[filas] = grupo.ubicar(hb[filas])
+        return reglas
+
+    def evaluar(self, edad, sexo, hb, condicion=0, semanas=np.nan, prematuro=0):
+        """Regla aplicable a un solo paciente, o None."""
+        indice = self.evaluar_lote(np.array([edad]), np.array([sexo]), np.array([condicion]),
+                                   np.array([semanas], dtype=float), np.array([prematuro]), np.array([hb]))[0]
+        return self.reglas[indice] if indice >= 0 else None
+
+    def describir(self, indices):
+        """Lista de Regla (o None) para el resultado de evaluar_lote."""
+        return [self.reglas[i] if i >= 0 else None for i in indices]
+
+
+def edad_en_dias(nacimiento, referencia):
+    """Días de edad (meses cumplidos x 30 + días, máx. 29) entre dos arreglos datetime64[D]."""
+    mes_nacimiento = nacimiento.astype('datetime64[M]')
+    mes_referencia = referencia.astype('datetime64[M]')
+    meses = (mes_referencia - mes_nacimiento).astype(int)
+    dias = (referencia - mes_referencia).astype(int) - (nacimiento - mes_nacimiento).astype(int)
+
+    # Si aún no se cumple el día del mes, se toma prestado el mes anterior.
+    prestamo = dias < 0
+    dias_mes_anterior = (mes_referencia.astype('datetime64[D]') - (mes_referencia - 1).astype('datetime64[D]')).astype(int)
+    meses = meses - prestamo
+    dias = np.where(prestamo, dias + dias_mes_anterior, dias)
+
+    # Nacidos el 29-31 pueden quedar en negativo tras un mes corto: se cuenta como 0 días.
+    resultado = meses * DIAS_POR_MES + np.clip(dias, 0, DIAS_POR_MES - 1)
+    return np.where(np.isnat(nacimiento) | np.isnat(referencia), -1, resultado)
+
+
+def preparar_lote(filas, hoy):
+    """Columnas del motor a partir de filas con: edad ('2a3m') o fecha_nacimiento
+    (+ fecha_evaluacion, por defecto 'hoy'), sexo, hb, condicion, semanas_gestacion y prematuro."""
+    from lotes import a_codigos, a_fechas, a_numeros, columna
+
+    edad = np.full(len(filas), -1)
+    nacimiento = a_fechas(columna(filas, 'fecha_nacimiento'))
+    if not np.isnat(nacimiento).all():
+        evaluacion = a_fechas(columna(filas, 'fecha_evaluacion', 'fecha'))
+        evaluacion[np.isnat(evaluacion)] = np.datetime64(hoy, 'D')
+        edad = edad_en_dias(nacimiento, evaluacion)
+    for i, texto in enumerate(columna(filas, 'edad')):
+        if texto and edad[i] < 0:
+            try:
+                edad[i] = duracion_en_dias(texto)
+            except ErrorTablaAnemia:
+                pass
+
+    return (
+        edad,
+        a_codigos(columna(filas, 'sexo'), SEXOS),
+        a_codigos(columna(filas, 'condicion'), CONDICIONES, por_defecto=0),
+        a_numeros(columna(filas, 'semanas_gestacion', 'semanas')),
+        a_codigos(columna(filas, 'prematuro'), RESPUESTAS_SI_NO, por_defecto=0),
+        a_numeros(columna(filas, 'hb', 'hemoglobina')),
+    )
+
+
+if __name__ == '__main__':
+    # Referencia de rendimiento: 100 000 pacientes sintéticos.
+    import time
+    from index import DATOS_TABLA_ANEMIA
+
+    inicio = time.perf_counter()
+    motor = MotorAnemia(DATOS_TABLA_ANEMIA)
+    print(f"Tabla compilada: {len(motor.reglas)} reglas en {len(motor.grupos)} grupos ({(time.perf_counter() - inicio) * 1000:.2f} ms)")
+
+    generador = np.random.default_rng(61)
+    n = 100_000
+    edad = generador.integers(0, 60 * 360, n)
+    sexo = generador.integers(0, 2, n)
+    condicion = np.where((sexo == 1) & (edad >= 9 * 360), generador.integers(0, 3, n), 0)
+    semanas = np.where(condicion == 1, generador.integers(4, 29, n), np.nan)
+    prematuro = generador.integers(0, 2, n)
+    hb = np.round(generador.uniform(5.0, 19.0, n), 1)
+
+    inicio = time.perf_counter()
+    indices = motor.evaluar_lote(edad, sexo, condicion, semanas, prematuro, hb)
+    segundos = time.perf_counter() - inicio
+    print(f"{n} pacientes en {segundos * 1000:.1f} ms ({n / segundos:,.0f} filas/s); sin regla: {(indices < 0).sum()}")
+
+    inicio = time.perf_counter()
+    for i in range(1000):
+        motor.evaluar(edad[i], sexo[i], hb[i], condicion[i], semanas[i], prematuro[i])
+    print(f"Evaluación individual: {(time.perf_counter() - inicio):.3f} ms por paciente")
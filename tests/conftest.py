@@ -0,0 +1,48 @@
+# ==============================================================================
+#           CONFIGURACIÓN COMÚN DE LAS PRUEBAS (pytest)
+# ==============================================================================
+#  Las pruebas corren contra el SQLite de 'entorno_benchmark.py'; no hace falta
+#  PostgreSQL ni Supabase. Desde la raíz del repositorio:
+#
+#      python -m pytest -q
+# ==============================================================================
+
+import os
+import sys
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if RAIZ not in sys.path:
+    sys.path.insert(0, RAIZ)
+
+
+@pytest.fixture(scope='session')
+def motor():
+    """BD de benchmark sembrada (SQLite temporal), compartida por la sesión."""
+    from entorno_benchmark import crear_motor, sembrar
+
+    motor = crear_motor()
+    sembrar(motor, rondas_bcrypt=4)
+    return motor
+
+
+
+@pytest.fixture(scope='session')
+def app_benchmark():
+    """index.py con el motor y los clientes de Supabase del entorno local."""
+    from entorno_benchmark import preparar_app
+
+    index, _, _ = preparar_app(rondas_bcrypt=4)
+    return index
+
+
+@pytest.fixture
+def cliente(app_benchmark):
+    """Cliente de prueba con la sesión de un usuario ya autenticado."""
+    cliente = app_benchmark.app.test_client()
+    with cliente.session_transaction() as sesion:
+        sesion['user_id'] = 2
+        sesion['username'] = 'usuario001'
+        sesion['role'] = 'usuario'
+    return cliente
@@ -0,0 +1,45 @@
+# Paridad de los cálculos en lote con el JavaScript de las calculadoras y CSV
+# de respuesta de /api/calculos/lote.
+
+import csv
+import io
+import shutil
+
+import pytest
+
+import calculos_clinicos
+
+
+@pytest.mark.skipif(shutil.which('node') is None, reason="La paridad con el JavaScript necesita Node.js.")
+def test_paridad_con_javascript():
+    assert calculos_clinicos.verificar_paridad(casos=2000) == 0
+
+
+def _filas_csv(respuesta):
+    assert respuesta.status_code == 200, respuesta.get_data(as_text=True)
+    return list(csv.DictReader(io.StringIO(respuesta.get_data(as_text=True))))
+
+
+def test_lote_json_con_claves_distintas_por_fila(cliente):
+    filas = [
+        {'peso': 60, 'talla': 160, 'fecha_atencion': '2025-03-01', 'semanas_gestacion': 20},
+        {'talla': 170, 'peso': 80, 'nombre': 'Ana', 'fecha_atencion': '2025-03-01'},
+    ]
+    salida = _filas_csv(cliente.post('/api/calculos/lote', json=filas))
+    assert [f['peso'] for f in salida] == ['60', '80']
+    assert [f['nombre'] for f in salida] == ['', 'Ana']
+    assert [f['imc'] for f in salida] == ['23.4', '27.7']
+    assert salida[0]['fpp_calculada'] == '2025-07-19'
+
+
+def test_lote_csv_con_celdas_vacias_de_mas(cliente):
+    contenido = "peso;talla;fecha_atencion;;\n55,5;158;01/03/2025;;\n"
+    salida = _filas_csv(cliente.post('/api/calculos/lote', data=contenido.encode('utf-8'), content_type='text/csv'))
+    assert salida[0]['imc'] == '22.2'
+
+
+def test_lote_csv_con_fila_corrida(cliente):
+    contenido = "peso;talla\n55;158;01/03/2025\n"
+    respuesta = cliente.post('/api/calculos/lote', data=contenido.encode('utf-8'), content_type='text/csv')
+    assert respuesta.status_code == 400
+    assert 'más columnas' in respuesta.get_json()['error']
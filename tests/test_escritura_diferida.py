@@ -0,0 +1,20 @@
+# Seguridad ante caídas de la escritura diferida (las mismas verificaciones que
+# 'python escritura_diferida.py').
+
+import escritura_diferida
+
+
+def test_apagado_con_sigterm_escribe_lo_pendiente(motor):
+    escritura_diferida.verificar_apagado(motor)
+
+
+def test_bd_inestable_no_pierde_filas(motor):
+    escritura_diferida.verificar_bd_inestable(motor)
+
+
+def test_fila_invalida_no_arrastra_al_lote(motor):
+    escritura_diferida.verificar_fila_invalida(motor)
+
+
+def test_cola_llena_escribe_sincrono(motor):
+    escritura_diferida.verificar_cola_llena(motor)
@@ -0,0 +1,41 @@
+# Los motores reales de index.py: se arman desde DATABASE_URL (y la réplica)
+# sin el reemplazo que hace 'entorno_benchmark.preparar_app'.
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+import consultas
+from conftest import RAIZ
+
+PROGRAMA = """
+import consultas, index
+with index.engine.connect() as conexion:
+    assert consultas.USUARIO_POR_NOMBRE.dict(conexion, username='admin')['role'] == 'administrador'
+with index.engine_replica.connect() as conexion:
+    assert consultas.USUARIO_ID_POR_NOMBRE.escalar(conexion, username='usuario001') == 2
+with index.ENRUTADOR_BD.connect() as conexion:
+    assert conexion.exec_driver_sql('SELECT COUNT(*) FROM plantillas').scalar() > 0
+print('OK')
+"""
+
+
+def test_index_conecta_con_database_url(motor):
+    url = str(motor.url)
+    entorno = dict(os.environ, DATABASE_URL=url, DATABASE_REPLICA_URL=url)
+    salida = subprocess.run([sys.executable, '-c', PROGRAMA], cwd=RAIZ, env=entorno,
+                            capture_output=True, text=True, timeout=120)
+    assert salida.returncode == 0, salida.stdout[-2000:] + salida.stderr[-2000:]
+    assert salida.stdout.strip().endswith('OK')
+
+
+@pytest.mark.parametrize('preparadas', ['0', '1'])
+@pytest.mark.parametrize('url', ['postgresql://u:p@localhost:5432/bd', 'postgresql://u:p@localhost:6543/bd'])
+def test_crear_motor_postgresql(monkeypatch, preparadas, url):
+    monkeypatch.setenv('BD_SENTENCIAS_PREPARADAS', preparadas)
+    connect_args = {'client_encoding': 'utf8', 'connect_timeout': 3}
+    assert consultas.crear_motor(url, connect_args).dialect.name == 'postgresql'
+    _, args = consultas.configurar_url(url, connect_args)
+    assert ('prepare_threshold' in args) == (preparadas == '1' and ':5432/' in url)
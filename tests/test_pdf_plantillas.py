@@ -0,0 +1,29 @@
+# Regresión del PDF de plantillas con texto acentuado y símbolos (las mismas
+# verificaciones que 'python pdf_plantillas.py').
+
+from sqlalchemy import text
+
+import pdf_plantillas
+
+
+def test_pdf_con_tildes_y_simbolos():
+    pdf_plantillas.verificar_pdf(pdf_plantillas.generar_pdf_plantilla(pdf_plantillas.MUESTRA))
+
+
+def test_documentos_no_comparten_glifos():
+    pdf_plantillas.verificar_documentos_independientes()
+
+
+def test_descarga_desde_la_base_de_datos(app_benchmark, cliente):
+    muestra = dict(pdf_plantillas.MUESTRA)
+    del muestra['id']
+    columnas = ', '.join(muestra)
+    valores = ', '.join(f':{c}' for c in muestra)
+    with app_benchmark.engine.begin() as conexion:
+        plantilla_id = conexion.execute(
+            text(f"INSERT INTO plantillas ({columnas}) VALUES ({valores}) RETURNING id"), muestra).scalar_one()
+
+    respuesta = cliente.get(f'/plantilla/{plantilla_id}/descargar_pdf')
+    assert respuesta.status_code == 200
+    assert respuesta.mimetype == 'application/pdf'
+    pdf_plantillas.verificar_pdf(respuesta.data)
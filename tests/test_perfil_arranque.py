@@ -0,0 +1,16 @@
+# Regresión del arranque en frío: importar index.py y responder /login no debe
+# cargar las dependencias pesadas ('python perfil_arranque.py --verificar').
+
+import os
+import subprocess
+import sys
+
+from conftest import RAIZ
+
+
+def test_arranque_no_importa_dependencias_pesadas():
+    entorno = dict(os.environ, DATABASE_URL=os.environ.get('DATABASE_URL', 'sqlite://'))
+    salida = subprocess.run([sys.executable, os.path.join(RAIZ, 'perfil_arranque.py'), '--verificar'],
+                            cwd=RAIZ, env=entorno, capture_output=True, text=True, timeout=120)
+    assert salida.returncode == 0, salida.stdout[-2000:] + salida.stderr[-2000:]
+    assert "OK: ninguna dependencia pesada se importó al arrancar." in salida.stdout
@@ -0,0 +1,39 @@
+# ==============================================================================
+#           UTILIDADES DE TEXTO PARA LOS MÓDULOS CLÍNICOS
+# ==============================================================================
+#  Normalización compartida (mayúsculas y sin tildes) para que el analizador de
+#  guías y los buscadores comparen el texto siempre de la misma forma.
+# ==============================================================================
+
+import re
+import unicodedata
+
+# Palabras que no aportan información para buscar o emparejar nombres.
+PALABRAS_VACIAS = frozenset("""
+A AL ANTE BAJO CON CONTRA DE DEL DESDE EL EN ENTRE HACIA HASTA LA LAS LO LOS O
+PARA POR SEGUN SIN SOBRE TRAS U UN UNA UNAS UNOS Y E NI QUE SE SU SUS ES SON
+COMO MAS MENOS NO SI YA EJ
+""".split())
+
+PATRON_PALABRA = re.compile(r'[A-Z0-9]+(?:\.[0-9]+)?')
+
+
+def quitar_tildes(texto):
+    """Elimina tildes y diacríticos conservando la longitud de cada letra base."""
+    descompuesto = unicodedata.normalize('NFD', texto)
+    return ''.join(c for c in descompuesto if unicodedata.category(c) != 'Mn')
+
+
+def normalizar_texto(texto):
+    """Devuelve el texto en mayúsculas y sin tildes (la forma de comparación)."""
+    if not texto:
+        return ""
+    return quitar_tildes(str(texto)).upper()
+
+
+def tokenizar(texto, quitar_vacias=False):
+    """Divide un texto (normalizado o no) en palabras de comparación."""
+    tokens = PATRON_PALABRA.findall(normalizar_texto(texto))
+    if quitar_vacias:
+        return [t for t in tokens if t not in PALABRAS_VACIAS]
+    return tokens
@@ -0,0 +1,157 @@
+# ==============================================================================
+#           VALIDADOR DE CONSISTENCIA DE PLANTILLAS
+# ==============================================================================
+#  Revisa cada plantilla contra los catálogos de la aplicación:
+#    - las actividades preventivas marcadas deben estar permitidas para su
+#      código prestacional (RELACION_CODIGO_ACTIVIDADES, o 'DEFAULT');
+#    - los diagnósticos deben existir en el catálogo CIE-10;
+#    - un diagnóstico excluyente no puede figurar también como principal o
+#      complementario (lo mismo para procedimientos obligatorios/excluyentes).
+#
+#  Los catálogos son conjuntos (hash sets) y cada regla es una operación de
+#  conjuntos sobre los arreglos de la plantilla, así que validar una plantilla
+#  toma microsegundos: 'guardar_plantilla' la revisa en cada guardado y la
+#  biblioteca completa se revisa en una pasada (en varios procesos si es grande).
+# ==============================================================================
+
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from indice_plantillas import clave_codigo
+
+# A partir de este número de plantillas la revisión completa se reparte en procesos.
+UMBRAL_PROCESOS = 20_000
+
+MENSAJES = {
+    'codigo_prestacional_desconocido': "El código prestacional no existe en el catálogo.",
+    'actividad_desconocida': "Actividades que no existen en el catálogo de actividades preventivas.",
+    'actividad_no_permitida': "Actividades no permitidas para este código prestacional.",
+    'diagnostico_inexistente': "Códigos que no existen en el catálogo CIE-10.",
+    'diagnostico_excluyente_incluido': "Diagnósticos excluyentes que también figuran como principal o complementario.",
+    'procedimiento_excluyente_obligatorio': "Procedimientos marcados a la vez como obligatorios y excluyentes.",
+}
+
+
+def _claves(entradas):
+    return {clave for clave in map(clave_codigo, entradas or ()) if clave}
+
+
+class ValidadorPlantillas:
+    """Reglas de consistencia con los catálogos ya convertidos en conjuntos."""
+
+    def __init__(self, relacion_actividades, actividades_map, codigos_prestacionales, codigos_cie10):
+        self.relacion = {codigo: frozenset(actividades) for codigo, actividades in relacion_actividades.items()}
+        self.permitidas_por_defecto = self.relacion.get('DEFAULT', frozenset())
+        self.codigos_prestacionales = frozenset(codigos_prestacionales)
+        self.codigos_cie10 = frozenset(str(c).replace('.', '').upper() for c in codigos_cie10)
+        # Las plantillas guardan la descripción ("003: Peso (Kg)"); también aceptamos el código.
+        self.actividad_por_texto = {descripcion: codigo for codigo, descripcion in actividades_map.items()}
+        self.actividad_por_texto.update({codigo: codigo for codigo in actividades_map})
+
+    def validar(self, plantilla):
+        """Lista de hallazgos ({regla, mensaje, valores}) de una plantilla; vacía si es consistente."""
+        hallazgos = []
+
+        def reportar(regla, valores):
+            if valores:
+                hallazgos.append({"regla": regla, "mensaje": MENSAJES[regla], "valores": sorted(valores)})
+
+        codigo = (plantilla.get('codigo_prestacional') or '').strip()
+        if codigo and codigo not in self.codigos_prestacionales:
+            reportar('codigo_prestacional_desconocido', {codigo})
+
+        actividades = set(plantilla.get('actividades_preventivas') or ())
+        codigos_actividad = {self.actividad_por_texto[a] for a in actividades if a in self.actividad_por_texto}
+        reportar('actividad_desconocida', {a for a in actividades if a not in self.actividad_por_texto})
+        permitidas = self.relacion.get(codigo, self.permitidas_por_defecto)
+        reportar('actividad_no_permitida', codigos_actividad - permitidas)
+
+        principal = _claves(plantilla.get('diagnostico_principal'))
+        complementarios = _claves(plantilla.get('diagnosticos_complementarios'))
+        excluyentes = _claves(plantilla.get('diagnosticos_excluyentes'))
+        reportar('diagnostico_inexistente', (principal | complementarios | excluyentes) - self.codigos_cie10)
+        reportar('diagnostico_excluyente_incluido', excluyentes & (principal | complementarios))
+
+        reportar('procedimiento_excluyente_obligatorio',
+                 _claves(plantilla.get('procedimientos_obligatorios')) & _claves(plantilla.get('procedimientos_excluyentes')))
+        return hallazgos
+
+    def validar_todas(self, plantillas, procesos=None):
+        """Reporte de toda la biblioteca: totales por regla y el detalle de cada plantilla con hallazgos."""
+        plantillas = list(plantillas)
+        if len(plantillas) >= UMBRAL_PROCESOS and (procesos or os.cpu_count() or 1) > 1:
+            procesos = procesos or os.cpu_count()
+            tamano = -(-len(plantillas) // procesos)
+            partes = [plantillas[i:i + tamano] for i in range(0, len(plantillas), tamano)]
+            with ProcessPoolExecutor(max_workers=procesos, initializer=_iniciar_proceso, initargs=(self,)) as ejecutor:
+                resultados = [h for parte in ejecutor.map(_validar_parte, partes) for h in parte]
+        else:
+            resultados = [self.validar(plantilla) for plantilla in plantillas]
+
+        por_regla = Counter()
+        detalle = []
+        for plantilla, hallazgos in zip(plantillas, resultados):
+            if hallazgos:
+                por_regla.update(h['regla'] for h in hallazgos)
+                detalle.append({
+                    "id": plantilla.get('id'),
+                    "tipo_atencion": plantilla.get('tipo_atencion'),
+                    "codigo_prestacional": plantilla.get('codigo_prestacional'),
+                    "hallazgos": hallazgos,
+                })
+        return {
+            "total_plantillas": len(plantillas),
+            "plantillas_con_hallazgos": len(detalle),
+            "por_regla": dict(por_regla),
+            "plantillas": detalle,
+        }
+
+
+# --- Ejecución en procesos: cada proceso recibe el validador una sola vez ---
+_validador_proceso = None
+
+
+def _iniciar_proceso(validador):
+    global _validador_proceso
+    _validador_proceso = validador
+
+
+def _validar_parte(plantillas):
+    return [_validador_proceso.validar(plantilla) for plantilla in plantillas]
+
+
+if __name__ == '__main__':
+    # Referencia de rendimiento con una biblioteca sintética.
+    import random
+    import time
+    from index import (ACTIVIDADES_PREVENTIVAS_MAP, CODIGOS_PRESTACIONALES_CATEGORIZADOS,
+                       PAQUETE_DATOS, RELACION_CODIGO_ACTIVIDADES)
+
+    validador = ValidadorPlantillas(RELACION_CODIGO_ACTIVIDADES, ACTIVIDADES_PREVENTIVAS_MAP,
+                                    [c['codigo'] for c in CODIGOS_PRESTACIONALES_CATEGORIZADOS],
+                                    PAQUETE_DATOS.codigos_cie10())
+    aleatorio = random.Random(35)
+    codigos = list(validador.codigos_cie10)
+    descripciones = list(ACTIVIDADES_PREVENTIVAS_MAP.values())
+    prestacionales = list(validador.codigos_prestacionales)
+    biblioteca = [{
+        "id": i,
+        "tipo_atencion": f"Plantilla {i}",
+        "codigo_prestacional": aleatorio.choice(prestacionales),
+        "actividades_preventivas": aleatorio.sample(descripciones, 6),
+        "diagnostico_principal": [f"{c} - Descripción" for c in aleatorio.sample(codigos, 2)],
+        "diagnosticos_complementarios": aleatorio.sample(codigos, 3),
+        "diagnosticos_excluyentes": aleatorio.sample(codigos, 3) + ['X999'],
+        "procedimientos_obligatorios": ['99203', '85018'],
+        "procedimientos_excluyentes": ['85018'] if i % 10 == 0 else [],
+    } for i in range(100_000)]
+
+    inicio = time.perf_counter()
+    validador.validar(biblioteca[0])
+    print(f"Una plantilla: {(time.perf_counter() - inicio) * 1000:.3f} ms")
+
+    for procesos in sorted({1, os.cpu_count() or 1}):
+        inicio = time.perf_counter()
+        reporte = validador.validar_todas(biblioteca, procesos=procesos)
+        print(f"{len(biblioteca)} plantillas, {procesos} proceso(s): {time.perf_counter() - inicio:.2f} s  {reporte['por_regla']}")